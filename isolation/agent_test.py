@@ -3,10 +3,36 @@ tests to run and debug your minimax and alphabeta agents locally.  The test
 cases used by the project assistant are not public.
 """
 
+import asyncio
+import contextlib
+import io
+import math
+import multiprocessing
+import os
+import pickle
+import random
+import tempfile
+import time
+import timeit
 import unittest
 
+import numpy as np
+
 import isolation
+import batch_eval
+import benchmark
+import competition_agent
+import endgame
+import fused_eval
 import game_agent
+import match_server
+import opening_book
+import retrograde
+import sample_players
+import search_stats
+import selfplay
+import time_manager
+import tournament
 
 from importlib import reload
 
@@ -21,5 +47,911 @@ class IsolationTest(unittest.TestCase):
         self.game = isolation.Board(self.player1, self.player2)
 
 
+class BitBoardTest(unittest.TestCase):
+    """Check that the bitboard engine is a drop-in replacement for Board"""
+
+    def test_random_games_match_board(self):
+        rng = random.Random(0)
+        for width, height in [(7, 7), (5, 7), (8, 6)]:
+            board = isolation.Board("Player1", "Player2", width, height)
+            bitboard = isolation.BitBoard("Player1", "Player2", width, height)
+            while True:
+                for player in ["Player1", "Player2"]:
+                    self.assertEqual(sorted(board.get_legal_moves(player)),
+                                     sorted(bitboard.get_legal_moves(player)))
+                    self.assertEqual(board.get_player_location(player),
+                                     bitboard.get_player_location(player))
+                    self.assertEqual(board.utility(player),
+                                     bitboard.utility(player))
+                self.assertEqual(board.to_string(), bitboard.to_string())
+                self.assertEqual(board.hash(), bitboard.hash())
+                moves = board.get_legal_moves()
+                if not moves:
+                    break
+                move = rng.choice(moves)
+                self.assertEqual(bitboard.forecast_move(move).hash(),
+                                 bitboard.copy().forecast_move(move).hash())
+                board.apply_move(move)
+                bitboard.apply_move(move)
+
+
+class LargeBoardTest(unittest.TestCase):
+    """Check the engines against each other on a large board"""
+
+    def test_engines_agree(self):
+        rng = random.Random(25)
+        board = isolation.Board("Player1", "Player2", 25, 25)
+        bitboard = isolation.BitBoard("Player1", "Player2", 25, 25)
+        for _ in range(60):
+            self.assertEqual(board.to_string(), bitboard.to_string())
+            self.assertEqual(board.get_blank_spaces(),
+                             bitboard.get_blank_spaces())
+            for player in ("Player1", "Player2"):
+                self.assertEqual(board.mobility(player),
+                                 bitboard.mobility(player))
+            moves = sorted(board.get_legal_moves())
+            if not moves:
+                break
+            move = rng.choice(moves)
+            board = board.forecast_move(move)
+            bitboard = bitboard.forecast_move(move)
+
+
+class PushPopTest(unittest.TestCase):
+    """Check that push_move/pop_move restore the board exactly"""
+
+    def test_pop_restores_state(self):
+        for board_class in [isolation.Board, isolation.BitBoard]:
+            game = board_class("Player1", "Player2")
+            history = []
+            rng = random.Random(1)
+            while game.get_legal_moves():
+                history.append((game.to_string(), game.hash(), game.move_count,
+                                game.active_player))
+                game.push_move(rng.choice(game.get_legal_moves()))
+            while history:
+                game.pop_move()
+                self.assertEqual(history.pop(), (game.to_string(), game.hash(),
+                                                 game.move_count,
+                                                 game.active_player))
+
+    def test_in_place_search_leaves_board_unchanged(self):
+        player = game_agent.AlphaBetaPlayer(in_place=True)
+        game = isolation.BitBoard(player, self.__class__)
+        game.apply_move((3, 3))
+        game.apply_move((2, 2))
+        before = game.to_string()
+        deadline = timeit.default_timer() + 0.15
+        time_left = lambda: 1000 * (deadline - timeit.default_timer())
+        move = player.get_move(game, time_left)
+        self.assertIn(move, game.get_legal_moves())
+        self.assertEqual(before, game.to_string())
+
+
+class CompactStateTest(unittest.TestCase):
+    """Check that boards without an attribute dict copy and pickle exactly"""
+
+    def test_copies_are_independent(self):
+        for board_class in [isolation.Board, isolation.BitBoard]:
+            game = board_class("Player1", "Player2", 5, 5)
+            self.assertFalse(hasattr(game, "__dict__"))
+            game.apply_move((2, 2))
+            copy = game.copy()
+            restored = pickle.loads(pickle.dumps(game))
+            game.apply_move((0, 0))
+            for other in (copy, restored):
+                self.assertEqual(other.get_player_location("Player1"), (2, 2))
+                self.assertIsNone(other.get_player_location("Player2"))
+                self.assertEqual(other.mobility("Player2"), 24)
+                other.apply_move((0, 0))
+                self.assertEqual((other.to_string(), other.hash()),
+                                 (game.to_string(), game.hash()))
+
+
+class SymmetryTest(unittest.TestCase):
+    """Check the canonical form of symmetric positions"""
+
+    def test_symmetric_positions_share_key(self):
+        rng = random.Random(20)
+        for engine, width, height in ((isolation.Board, 7, 7),
+                                      (isolation.BitBoard, 7, 7),
+                                      (isolation.Board, 5, 7)):
+            history = []
+            game = engine("Player1", "Player2", width, height)
+            while len(history) < 12 and game.get_legal_moves():
+                history.append(rng.choice(sorted(game.get_legal_moves())))
+                game.apply_move(history[-1])
+            key, transform = game.canonical()
+            self.assertEqual(game.transformed(transform).hash(), key)
+            for symmetry in range(8 if width == height else 4):
+                # Replaying the transformed moves reaches the same canonical
+                # form, with the transformed legal moves
+                replay = engine("Player1", "Player2", width, height)
+                for move in history:
+                    replay.apply_move(game.transform_move(move, symmetry))
+                self.assertEqual(replay.canonical()[0], key)
+                self.assertEqual(replay.hash(),
+                                 game.transformed(symmetry).hash())
+                self.assertEqual(
+                    sorted(replay.get_legal_moves()),
+                    sorted(game.transform_move(move, symmetry)
+                           for move in game.get_legal_moves()))
+                for move in game.get_blank_spaces():
+                    self.assertEqual(game.transform_move(
+                        game.transform_move(move, symmetry), symmetry,
+                        inverse=True), move)
+
+
+class ZobristHashTest(unittest.TestCase):
+    """Check the incremental Zobrist hash of board states"""
+
+    def test_transpositions_share_hash(self):
+        for board_class in [isolation.Board, isolation.BitBoard]:
+            game_1 = board_class("Player1", "Player2")
+            game_2 = board_class("Player1", "Player2")
+            for move in [(0, 0), (6, 6), (1, 2), (5, 4), (2, 0)]:
+                game_1.apply_move(move)
+            for move in [(2, 0), (6, 6), (1, 2), (5, 4), (0, 0)]:
+                game_2.apply_move(move)
+            self.assertNotEqual(game_1.hash(), game_2.hash())
+            game_2 = board_class("Player1", "Player2")
+            for move in [(1, 2), (6, 6), (0, 0), (5, 4), (2, 0)]:
+                game_2.apply_move(move)
+            self.assertEqual(game_1.hash(), game_2.hash())
+
+    def test_hash_matches_after_pop(self):
+        game = isolation.Board("Player1", "Player2")
+        empty_hash = game.hash()
+        game.push_move((0, 0))
+        self.assertNotEqual(empty_hash, game.hash())
+        game.pop_move()
+        self.assertEqual(empty_hash, game.hash())
+
+
+class TranspositionTableTest(unittest.TestCase):
+    """Check that the transposition table does not change search results"""
+
+    def test_values_match_plain_alphabeta(self):
+        inf = float("inf")
+        for replacement in ["depth", "two-tier"]:
+            plain = game_agent.AlphaBetaPlayer()
+            cached = game_agent.AlphaBetaPlayer(tt_size=2**10,
+                                                tt_replacement=replacement)
+            for player in [plain, cached]:
+                player.time_left = lambda: inf
+                player.TIMER_THRESHOLD = 0
+                game = isolation.BitBoard(player, "Player2")
+                for move in [(3, 3), (2, 2), (1, 4), (4, 3)]:
+                    game.apply_move(move)
+                player.values = [player.ab_max_value(game, depth, -inf, inf)
+                                 for depth in range(1, 7)]
+            self.assertEqual(plain.values, cached.values)
+            self.assertGreater(cached.tt.hit_rate, 0)
+
+
+class MoveOrderingTest(unittest.TestCase):
+    """Check that move ordering changes search effort but not results"""
+
+    def test_values_match_unordered_search(self):
+        from move_ordering import MoveOrderer
+        inf = float("inf")
+        plain = game_agent.AlphaBetaPlayer()
+        ordered = game_agent.AlphaBetaPlayer(
+            move_ordering=MoveOrderer(static="mobility"))
+        for player in [plain, ordered]:
+            player.time_left = lambda: inf
+            player.TIMER_THRESHOLD = 0
+            game = isolation.BitBoard(player, "Player2")
+            for move in [(3, 3), (2, 2), (1, 4), (4, 3)]:
+                game.apply_move(move)
+            player.values = []
+            for depth in range(1, 7):
+                player.alphabeta(game, depth)
+                if player.move_ordering is not None:
+                    player.move_ordering.end_iteration()
+                player.values.append(player.ab_max_value(game, depth, -inf, inf))
+        self.assertEqual(plain.values, ordered.values)
+        pv = ordered.move_ordering.principal_variation
+        self.assertIn(pv[0], game.get_legal_moves())
+
+
+class SearchModeTest(unittest.TestCase):
+    """Check that PVS and aspiration windows return the alpha-beta values"""
+
+    def test_root_values_match_alphabeta(self):
+        players = [game_agent.AlphaBetaPlayer(),
+                   game_agent.AlphaBetaPlayer(search_mode="pvs"),
+                   game_agent.AlphaBetaPlayer(search_mode="pvs", aspiration=1.)]
+        for player in players:
+            player.time_left = lambda: float("inf")
+            player.TIMER_THRESHOLD = 0
+            game = isolation.BitBoard(player, "Player2")
+            for move in [(3, 3), (2, 2), (1, 4), (4, 3)]:
+                game.apply_move(move)
+            player.values = []
+            for depth in range(1, 7):
+                player.aspiration_search(game, depth)
+                player.values.append(player.root_value)
+        self.assertEqual(players[0].values, players[1].values)
+        self.assertEqual(players[0].values, players[2].values)
+
+    def test_unknown_search_mode(self):
+        with self.assertRaises(ValueError):
+            game_agent.AlphaBetaPlayer(search_mode="mtdf")
+
+
+class DeadlineTest(unittest.TestCase):
+    """Check the amortized move timer"""
+
+    def test_expires_before_deadline(self):
+        deadline = isolation.Deadline(50)
+        checks = 0
+        while not deadline.expired(10):
+            checks += 1
+        self.assertGreater(deadline(), 0)
+        self.assertGreater(checks, 0)
+
+    def test_player_wraps_callable(self):
+        player = game_agent.MinimaxPlayer()
+        player.time_left = lambda: 5.
+        self.assertIsInstance(player.time_left, isolation.Deadline)
+        self.assertEqual(player.time_left(), 5.)
+        self.assertTrue(player.time_left.expired(player.TIMER_THRESHOLD))
+
+
+class EndgameTest(unittest.TestCase):
+    """Check the endgame solver against exhaustive search"""
+
+    def active_wins(self, game):
+        return any(not self.active_wins(game.forecast_move(move))
+                   for move in game.get_legal_moves())
+
+    def test_solver_matches_exhaustive_search(self):
+        rng = random.Random(9)
+        solver = endgame.EndgameSolver()
+        solved = 0
+        while solved < 20:
+            game = isolation.Board("Player1", "Player2", 5, 5)
+            while game.get_legal_moves() and (
+                    len(game.get_blank_spaces()) > 13 or not game.is_partitioned()):
+                game.apply_move(rng.choice(game.get_legal_moves()))
+            if not game.get_legal_moves():
+                continue
+            move, own_length, opp_length = solver.solve(game, game.active_player)
+            self.assertIn(move, game.get_legal_moves())
+            self.assertEqual(own_length > opp_length, self.active_wins(game))
+            solved += 1
+
+    def test_not_partitioned(self):
+        game = isolation.Board("Player1", "Player2")
+        game.apply_move((2, 3))
+        game.apply_move((0, 5))
+        self.assertIsNone(endgame.EndgameSolver().solve(game, game.active_player))
+
+
+class OpeningBookTest(unittest.TestCase):
+    """Check that book moves survive the round trip through a book file"""
+
+    def test_book_round_trip(self):
+        searcher = game_agent.AlphaBetaPlayer()
+        entries = opening_book.build_book(searcher, "Opponent", 2, plies=2,
+                                          width=5, height=5)
+        # The empty board and the 6 classes of symmetric first moves
+        self.assertEqual(len(entries), 7)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        opening_book.write_book(path, entries, 5, 5)
+
+        player = game_agent.AlphaBetaPlayer(book=path)
+        book = pickle.loads(pickle.dumps(player)).book
+        self.addCleanup(player.book.close)
+        self.addCleanup(book.close)
+        self.assertEqual(len(book), len(entries))
+
+        def book_move(game):
+            key, transform = game.canonical()
+            return game.transform_move(entries[key], transform, inverse=True)
+
+        game = isolation.Board(player, "Player2", 5, 5)
+        self.assertEqual(player.get_move(game, lambda: 1.), book_move(game))
+        for move in [(1, 2), (3, 1), (2, 3)]:
+            first_move = game.forecast_move(move)
+            self.assertEqual(book.lookup(first_move), book_move(first_move))
+            self.assertIn(book.lookup(first_move), first_move.get_legal_moves())
+        game.apply_move((1, 2))
+        game.apply_move((3, 3))
+        self.assertIsNone(book.lookup(game))
+        self.assertIsNone(book.lookup(isolation.Board(player, "Player2")))
+
+
+class MCTSPlayerTest(unittest.TestCase):
+    """Check the Monte Carlo tree search competition agent"""
+
+    def test_finds_winning_move(self):
+        # (2, 0) is the only one of the three legal moves that wins
+        player = competition_agent.CustomPlayer()
+        game = isolation.Board("Player1", player, 4, 4)
+        for move in [(1, 3), (1, 1), (2, 1), (2, 3), (0, 2), (3, 1), (1, 0),
+                     (1, 2), (2, 2)]:
+            game.apply_move(move)
+        self.assertEqual(player.get_move(game, isolation.Deadline(50)), (2, 0))
+        self.assertGreater(player.playouts, 0)
+        self.assertGreater(player.playouts_per_second, 0)
+
+    def test_reuses_tree_after_reply(self):
+        player = competition_agent.CustomPlayer()
+        game = isolation.Board(player, "Player2", 5, 5)
+        game.apply_move((2, 2))
+        game.apply_move((0, 0))
+        game.apply_move(player.get_move(game, isolation.Deadline(50)))
+        tree = player._tree
+        game.apply_move(game.get_legal_moves()[0])
+        player.get_move(game, isolation.Deadline(50))
+        self.assertIs(player._tree, tree)
+        self.assertGreater(player._root, 0)
+
+    def test_no_time_left(self):
+        player = competition_agent.CustomPlayer()
+        game = isolation.Board(player, "Player2")
+        game.apply_move((3, 3))
+        game.apply_move((2, 4))
+        self.assertIn(player.get_move(game, lambda: 0.5),
+                      game.get_legal_moves())
+        self.assertEqual(player.playouts, 0)
+
+
+class BatchEvalTest(unittest.TestCase):
+    """Check the batched heuristics against their scalar versions"""
+
+    def test_children_scores_match(self):
+        pairs = [(game_agent.custom_score, batch_eval.custom_score),
+                 (game_agent.custom_score_2, batch_eval.custom_score_2),
+                 (game_agent.custom_score_3, batch_eval.custom_score_3),
+                 (sample_players.improved_score, batch_eval.improved_score)]
+        rng = random.Random(12)
+        for _ in range(50):
+            game = isolation.Board("Player1", "Player2")
+            for _ in range(rng.randrange(1, 40)):
+                if not game.get_legal_moves():
+                    break
+                game.apply_move(rng.choice(game.get_legal_moves()))
+            moves = game.get_legal_moves()
+            if not moves:
+                continue
+            for player in ("Player1", "Player2"):
+                batch = batch_eval.PositionBatch.children(game, moves, player)
+                for score_fn, batch_fn in pairs:
+                    self.assertEqual(batch_fn(batch).tolist(),
+                                     [score_fn(game.forecast_move(move), player)
+                                      for move in moves])
+
+    def test_search_values_unchanged(self):
+        values = []
+        for batch_fn in (None, batch_eval.custom_score):
+            player = game_agent.AlphaBetaPlayer(batch_score_fn=batch_fn)
+            player.time_left = lambda: float("inf")
+            player.TIMER_THRESHOLD = 0
+            game = isolation.Board(player, "Player2")
+            for move in [(3, 3), (2, 2), (1, 4), (4, 3)]:
+                game.apply_move(move)
+            values.append([])
+            for depth in range(1, 6):
+                player.alphabeta(game, depth)
+                values[-1].append(player.root_value)
+        self.assertEqual(values[0], values[1])
+
+
+class MobilityTest(unittest.TestCase):
+    """Check the cached mobility counts and the fused heuristics"""
+
+    def test_mobility_matches_legal_moves(self):
+        rng = random.Random(17)
+        for engine in (isolation.Board, isolation.BitBoard):
+            game = engine("Player1", "Player2", 5, 5)
+            while True:
+                for player in ("Player1", "Player2"):
+                    self.assertEqual(game.mobility(player),
+                                     len(game.get_legal_moves(player)))
+                moves = game.get_legal_moves()
+                if not moves:
+                    break
+                game.push_move(rng.choice(moves))
+            while game.move_count:
+                game.pop_move()
+                self.assertEqual(game.mobility(),
+                                 len(game.get_legal_moves()))
+
+    def test_fused_scores_match(self):
+        score_fns = [sample_players.open_move_score,
+                     sample_players.improved_score,
+                     sample_players.center_score, game_agent.custom_score,
+                     game_agent.custom_score_2, game_agent.custom_score_3]
+        rng = random.Random(18)
+        for _ in range(50):
+            game = isolation.Board("Player1", "Player2")
+            # center_score needs both players on the board
+            while game.get_legal_moves() and (game.move_count < 2 or
+                                              rng.random() < 0.95):
+                game.apply_move(rng.choice(game.get_legal_moves()))
+            for score_fn in score_fns:
+                fused_fn = getattr(fused_eval, score_fn.__name__)
+                for player in ("Player1", "Player2"):
+                    self.assertEqual(fused_fn(game.copy(), player),
+                                     score_fn(game, player))
+
+
+class ParallelSearchTest(unittest.TestCase):
+    """Check that the parallel root search agrees with the serial search"""
+
+    def test_root_value_matches_serial(self):
+        player = game_agent.AlphaBetaPlayer(workers=2)
+        self.addCleanup(player.close)
+        game = isolation.Board(player, "Player2")
+        for move in [(3, 3), (2, 2), (1, 4), (4, 3)]:
+            game.apply_move(move)
+        move = player.get_move(game, isolation.Deadline(1000))
+        self.assertIn(move, game.get_legal_moves())
+        self.assertGreater(player.root_depth, 0)
+
+        serial = game_agent.AlphaBetaPlayer()
+        serial.time_left = lambda: float("inf")
+        serial.TIMER_THRESHOLD = 0
+        game = game.copy_with_players(serial, "Player2")
+        serial.alphabeta(game, player.root_depth)
+        self.assertEqual(serial.root_value, player.root_value)
+
+    def test_uses_most_of_the_budget(self):
+        # Without iteration predictions the workers search until their
+        # deadline, which only leaves the margins and the round trip
+        player = game_agent.AlphaBetaPlayer(
+            workers=2, time_manager=time_manager.TimeManager(predict=False))
+        self.addCleanup(player.close)
+        game = isolation.Board(player, "Player2")
+        game.apply_move((3, 3))
+        game.apply_move((2, 2))
+        player.get_move(game, isolation.Deadline(150))
+        self.assertLess(player.last_stats.time_left, 50)
+        self.assertGreaterEqual(player.last_stats.time_left, 0)
+
+    @unittest.skipIf((os.cpu_count() or 1) < 3,
+                     "needs a core for each worker and one for the player")
+    def test_depth_at_least_serial(self):
+        rng = random.Random(13)
+        positions = []
+        for _ in range(4):
+            game = isolation.Board("Player1", "Player2")
+            for _ in range(rng.randrange(2, 12, 2)):
+                game.apply_move(rng.choice(game.get_legal_moves()))
+            positions.append(game)
+        depths = []
+        for workers in (1, 2):
+            player = game_agent.AlphaBetaPlayer(workers=workers)
+            self.addCleanup(player.close)
+            total = 0
+            for position in positions:
+                game = position.copy_with_players(player, "Player2")
+                player.get_move(game, isolation.Deadline(150))
+                total += player.last_stats.depth
+            depths.append(total)
+        self.assertGreaterEqual(depths[1], depths[0])
+
+    def test_workers_start_with_player(self):
+        player = game_agent.AlphaBetaPlayer(workers=2)
+        self.addCleanup(player.close)
+        self.assertEqual(len(player._pool._processes), 2)
+        game = isolation.Board(player, "Player2")
+        game.apply_move((3, 3))
+        game.apply_move((2, 2))
+        # No worker can answer before the deadline; the fallback is a
+        # one-ply search rather than an arbitrary move
+        move = player.get_move(game, isolation.Deadline(0))
+        scores = {move: player.score(game.forecast_move(move), player)
+                  for move in game.get_legal_moves()}
+        self.assertEqual(scores[move], max(scores.values()))
+
+
+class PonderTest(unittest.TestCase):
+    """Check that a pondering player plays complete games"""
+
+    def test_pondering_game(self):
+        player = game_agent.AlphaBetaPlayer(pondering=True, tt_size=2**12)
+        self.addCleanup(player.close)
+        opponent = sample_players.GreedyPlayer()
+        game = isolation.Board(opponent, player, 5, 5)
+        game.apply_move((2, 2))
+        winner, history, termination = game.play(time_limit=150, ponder=True)
+        self.assertEqual(termination, "illegal move")
+        self.assertEqual(player.ponder_hits + player.ponder_misses,
+                         (len(history) + int(winner is player)) // 2)
+
+    def test_ponder_miss_uses_most_of_the_budget(self):
+        player = game_agent.AlphaBetaPlayer(
+            pondering=True, time_manager=time_manager.TimeManager(predict=False))
+        self.addCleanup(player.close)
+        self.assertLess(player.ipc_latency, 50)
+        game = isolation.Board(player, "Player2")
+        game.apply_move((3, 3))
+        game.apply_move((2, 2))
+        player.get_move(game, isolation.Deadline(150))
+        self.assertEqual(player.ponder_misses, 1)
+        self.assertLess(player.last_stats.time_left, 50)
+        self.assertGreaterEqual(player.last_stats.time_left, 0)
+
+    def test_stop_signal(self):
+        stop = multiprocessing.Event()
+        deadline = game_agent.PonderDeadline(stop)
+        for _ in range(5000):
+            self.assertFalse(deadline.expired(100.))
+        self.assertEqual(deadline(), float("inf"))
+        stop.set()
+        self.assertTrue(deadline.expired(100.))
+        self.assertEqual(deadline(), 0.)
+
+
+class PerftTest(unittest.TestCase):
+    """Check the perft node counts of the benchmark positions"""
+
+    def test_empty_board(self):
+        game = isolation.Board("Player1", "Player2", 5, 5)
+        self.assertEqual(benchmark.perft(game, 2), 25 * 24)
+
+    def test_engines_agree(self):
+        for num_moves, seed in benchmark.POSITIONS.values():
+            counts = set()
+            for engine in (isolation.Board, isolation.BitBoard):
+                for in_place in (False, True):
+                    game = benchmark.make_position(engine, 7, 7, num_moves, seed)
+                    counts.add(benchmark.perft(game, 4, in_place))
+            self.assertEqual(len(counts), 1)
+
+
+class SearchStatsTest(unittest.TestCase):
+    """Check the per-move search statistics of the agents"""
+
+    def test_alphabeta_stats(self):
+        player = game_agent.AlphaBetaPlayer()
+        game = isolation.Board(player, "Player2")
+        game.apply_move((3, 3))
+        game.apply_move((0, 0))
+        player.get_move(game, isolation.Deadline(150))
+        stats = player.last_stats
+        self.assertEqual(stats.source, "search")
+        self.assertGreater(stats.depth, 0)
+        self.assertEqual(len(stats.iteration_nodes), stats.depth)
+        self.assertGreaterEqual(stats.nodes, sum(stats.iteration_nodes))
+        self.assertEqual(player.stats_summary.moves, 1)
+        self.assertEqual(player.stats_summary.average_depth, stats.depth)
+
+    def test_summary_merge(self):
+        summary = search_stats.StatsSummary()
+        other = search_stats.StatsSummary()
+        for source, depth in (("search", 4), ("book", 0), ("search", 6)):
+            stats = search_stats.SearchStats(100.)
+            stats.end_iteration(depth)
+            stats.finish(40., source)
+            other.add(stats)
+        summary.merge(other)
+        self.assertEqual(summary.moves, 3)
+        self.assertEqual(summary.sources, {"search": 2, "book": 1})
+        self.assertEqual(summary.average_depth, 5)
+        self.assertEqual(summary.min_time_left, 40.)
+
+
+class SPRTTest(unittest.TestCase):
+    """Check the decisions of the tournament's sequential test"""
+
+    def test_decisions(self):
+        for p0, p1, win_rate, decision in ((0.5, 0.6, 0.9, "H1"),
+                                           (0.5, 0.6, 0.3, "H0")):
+            sprt = tournament.SPRT(p0, p1, alpha=0.05, beta=0.05)
+            rng = random.Random(19)
+            while sprt.decision is None:
+                sprt.add(rng.random() < win_rate)
+            self.assertEqual(sprt.decision, decision)
+            self.assertLess(sprt.games, 200)
+
+    def test_llr(self):
+        sprt = tournament.SPRT(0.5, 0.75)
+        for won in (True, True, False):
+            sprt.add(won)
+        self.assertAlmostEqual(sprt.llr, 2 * math.log(1.5) + math.log(0.5))
+        self.assertRaises(ValueError, tournament.SPRT, 0.6, 0.5)
+
+
+class TournamentTest(unittest.TestCase):
+    """Check the seeded tournament runner"""
+
+    def play_matches(self, num_workers):
+        cpu_agents = [
+            tournament.Agent(sample_players.RandomPlayer(), "Random"),
+            tournament.Agent(sample_players.GreedyPlayer(), "Greedy")]
+        test_agents = [
+            tournament.Agent(sample_players.GreedyPlayer(
+                sample_players.improved_score), "G_Improved"),
+            tournament.Agent(sample_players.RandomPlayer(), "Random_2")]
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            tournament.play_matches(cpu_agents, test_agents, 3, num_workers,
+                                    seed=7)
+        return output.getvalue().splitlines()
+
+    def test_play_game_keeps_random_state(self):
+        random.seed(7)
+        state = random.getstate()
+        task = tournament.GameTask(sample_players.RandomPlayer(),
+                                   sample_players.RandomPlayer(),
+                                   [(3, 3), (2, 4)], 21)
+        result = tournament.play_game(task)
+        self.assertEqual(random.getstate(), state)
+        self.assertEqual(tournament.play_game(task), result)
+
+    def test_workers_give_same_tallies(self):
+        lines = self.play_matches(1)
+        self.assertEqual(lines, self.play_matches(2))
+        # The layout of the results table
+        self.assertEqual(lines[1], "{:^9}{:^13}{:^13}{:^13}".format(
+            "Match #", "Opponent", "G_Improved", "Random_2"))
+        self.assertEqual(lines[2].split(), ["Won", "|", "Lost"] * 2)
+        for idx, name in enumerate(["Random", "Greedy"]):
+            row = lines[3 + idx].split()
+            self.assertEqual(row[:2], [str(idx + 1), name])
+            self.assertEqual(int(row[2]) + int(row[4]), 6)
+        self.assertEqual(lines[5], "-" * 74)
+        self.assertTrue(lines[6].startswith("{:^9}{:^13}".format(
+            "", "Win Rate:")))
+
+
+class RetrogradeTest(unittest.TestCase):
+    """Check the retrograde solver against exhaustive search"""
+
+    def exhaustive_distance(self, game):
+        return retrograde.distance([
+            self.exhaustive_distance(game.forecast_move(move))
+            for move in game.get_legal_moves()])
+
+    def test_table_matches_exhaustive_search(self):
+        table = retrograde.solve(4, 4)
+        self.assertEqual(table.layers[0][1][0], 14)
+        rng = random.Random(21)
+        for _ in range(30):
+            game = isolation.Board("Player1", "Player2", 4, 4)
+            for _ in range(rng.randrange(4, 9)):
+                if game.get_legal_moves():
+                    game.apply_move(rng.choice(sorted(game.get_legal_moves())))
+            expected = self.exhaustive_distance(game)
+            self.assertEqual(table.lookup(game), expected)
+            move = table.best_move(game)
+            if expected:
+                self.assertIn(move, game.get_legal_moves())
+                self.assertEqual(table.lookup(game.forecast_move(move)),
+                                 expected - 1)
+            else:
+                self.assertIsNone(move)
+
+        with tempfile.TemporaryDirectory() as dirname:
+            path = os.path.join(dirname, "table.bin")
+            table.save(path)
+            loaded = retrograde.RetrogradeTable.load(path)
+        self.assertEqual(len(loaded), len(table))
+        self.assertEqual(loaded.layers, table.layers)
+        self.assertIsNone(loaded.lookup(isolation.Board("Player1", "Player2")))
+
+    def test_heuristic_accuracy(self):
+        table = retrograde.solve(4, 4)
+        accuracy = retrograde.heuristic_accuracy(
+            table, sample_players.improved_score, num_games=10, seed=21)
+        self.assertTrue(0. <= accuracy <= 1.)
+        for table in (retrograde.solve(3, 3, blocked=[(1, 1)]),
+                      retrograde.solve(3, 2, "queen")):
+            self.assertRaises(ValueError, retrograde.heuristic_accuracy,
+                              table, sample_players.improved_score)
+
+    def test_queen_moves(self):
+        # gamestate.py's board: 3x2 with the bottom right cell blocked
+        table = retrograde.solve(3, 2, "queen", blocked=[(1, 2)])
+        geometry = table.geometry
+        n = geometry.size
+
+        def exhaustive_distance(blocked, mover, other):
+            return retrograde.distance([
+                exhaustive_distance(blocked | 1 << idx, other, idx)
+                for idx in geometry.legal_moves(blocked, mover)])
+
+        self.assertEqual(table.layers[0][1][0],
+                         exhaustive_distance(geometry.initial, n, n))
+        for keys, distances in table.layers:
+            for key, value in zip(keys, distances):
+                self.assertEqual(value, exhaustive_distance(
+                    *geometry.decode(key)))
+
+
+class TimeManagerTest(unittest.TestCase):
+    """Check the iteration predictions and margin of the time manager"""
+
+    def test_prediction(self):
+        clock = [150.]
+        manager = time_manager.TimeManager(margin=10.)
+        manager.start(lambda: clock[0])
+        self.assertTrue(manager.should_start())
+        for nodes, now in ((10, 140.), (40, 100.)):
+            clock[0] = now
+            manager.end_iteration(nodes)
+        self.assertEqual(manager.durations, [10., 40.])
+        self.assertEqual(manager.branching_factor, 4.)
+        self.assertEqual(manager.predicted_duration(), 160.)
+        self.assertTrue(manager.should_start())
+        clock[0] = 70.
+        self.assertFalse(manager.should_start())
+        self.assertEqual(manager.skipped, 1)
+        self.assertTrue(time_manager.TimeManager(10., predict=False).should_start())
+
+    def test_infinite_timer(self):
+        # Pondering searches with a timer reading infinity until stopped;
+        # iterations must not be skipped on NaN predictions
+        stop = timeit.default_timer() + 0.3
+        player = game_agent.AlphaBetaPlayer()
+        game = isolation.Board(player, sample_players.RandomPlayer())
+        game.apply_move((3, 3))
+        game.apply_move((2, 4))
+        player.get_move(game, lambda: 0. if timeit.default_timer() > stop
+                        else float("inf"))
+        self.assertGreater(player.last_stats.depth, 2)
+        self.assertEqual(player.time_manager.skipped, 0)
+
+    def test_margin_calibration(self):
+        manager = time_manager.TimeManager()
+        margin = manager.margin
+        self.assertGreaterEqual(margin, time_manager.MIN_MARGIN)
+        manager.start(lambda: float("inf"))
+        manager.finish()
+        self.assertEqual(manager.margin, margin)
+        # A move that ended 5 ms past the deadline widens the margin
+        manager.start(lambda: -5.)
+        manager.finish()
+        self.assertEqual(manager.latencies, [margin + 5.])
+        self.assertGreaterEqual(manager.margin, 2 * (margin + 5.))
+
+    def test_calibrated_before_first_move(self):
+        jitter = time_manager._jitter
+        self.addCleanup(setattr, time_manager, "_jitter", jitter)
+        time_manager._jitter = None
+        manager = time_manager.TimeManager()
+        self.assertIsNotNone(time_manager._jitter)
+        time_manager._jitter = None
+        pickle.loads(pickle.dumps(manager))
+        self.assertIsNotNone(time_manager._jitter)
+        time_manager._jitter = None
+        time_manager.TimeManager(margin=10.)
+        self.assertIsNone(time_manager._jitter)
+
+
+class SelfPlayTest(unittest.TestCase):
+    """Check the vectorized self-play against games on a Board"""
+
+    def test_games_replay_on_board(self):
+        size = 5
+        for policies in (("improved", "open_move"), ("random", "improved")):
+            batch = selfplay.simulate(policies[0], policies[1], 40, size,
+                                      size, seed=24)
+            self.assertEqual(batch.wins.sum(), 40)
+            for moves, winner in zip(batch.moves, batch.winners):
+                players = [sample_players.GreedyPlayer(
+                    getattr(sample_players, policy + "_score"))
+                    if policy != "random" else sample_players.RandomPlayer()
+                    for policy in policies]
+                game = isolation.Board(players[0], players[1], size, size)
+                for ply, cell in enumerate(moves[moves >= 0]):
+                    move = (cell % size, cell // size)
+                    self.assertIn(move, game.get_legal_moves())
+                    player = players[ply & 1]
+                    if (ply >= selfplay.OPENING_PLIES and
+                            isinstance(player, sample_players.GreedyPlayer)):
+                        self.assertEqual(player.get_move(game, None), move)
+                    game.apply_move(move)
+                self.assertFalse(game.get_legal_moves())
+                self.assertEqual(game.move_count & 1, 1 - winner)
+
+    def test_fair_games(self):
+        win_rate, first, second = selfplay.fair_games("improved", "random",
+                                                      200, seed=24)
+        self.assertTrue((first.moves[:, :2] == second.moves[:, :2]).all())
+        self.assertEqual(win_rate, (first.wins[0] + second.wins[1]) / 400.)
+        self.assertGreater(win_rate, 0.7)
+        self.assertRaises(ValueError, first.step, "minimax", None)
+
+    def test_save(self):
+        first = selfplay.simulate("random", "improved", 5, 5, 5, seed=24)
+        second = selfplay.simulate("improved", "random", 3, 5, 5, seed=24)
+        batch = selfplay.GameBatch.concatenate([first, second])
+        self.assertEqual(len(batch), 8)
+        with tempfile.TemporaryDirectory() as dirname:
+            path = os.path.join(dirname, "games.npz")
+            batch.save(path, players=[[1, 2]] * 8)
+            with np.load(path) as games:
+                self.assertEqual(games["width"], 5)
+                self.assertTrue((games["moves"][5:] == second.moves).all())
+                self.assertTrue((games["winners"][:5] == first.winners).all())
+                self.assertEqual(games["players"].shape, (8, 2))
+
+
+class HangingPlayer(sample_players.RandomPlayer):
+    """Agent ignoring its deadline"""
+
+    def get_move(self, game, time_left):
+        time.sleep(60)
+
+
+class FailingPlayer(sample_players.RandomPlayer):
+    """Agent raising an exception on its first move"""
+
+    def get_move(self, game, time_left):
+        raise RuntimeError("no move")
+
+
+class UnloadablePlayer(sample_players.RandomPlayer):
+    """Agent that cannot be unpickled by a worker process"""
+
+    def __getstate__(self):
+        return {"loadable": False}
+
+    def __setstate__(self, state):
+        raise RuntimeError("cannot load")
+
+
+class MatchServerTest(unittest.TestCase):
+    """Play games through the match server"""
+
+    def play(self, pairs, time_limit=50, **kwargs):
+        async def run():
+            async with match_server.MatchServer(time_limit, 4) as server:
+                results = await asyncio.gather(*(
+                    server.play(player_1, player_2, **kwargs)
+                    for player_1, player_2 in pairs))
+                idle = [len(workers) for workers in server._idle.values()]
+            return results, idle
+        return asyncio.run(run())
+
+    def test_games_replay_on_board(self):
+        greedy = sample_players.GreedyPlayer()
+        rand = sample_players.RandomPlayer()
+        opening = [(2, 3), (4, 4)]
+        results, idle = self.play([(greedy, rand), (rand, greedy)] * 3,
+                                  opening=opening, width=5, height=5)
+        self.assertLessEqual(max(idle), 4)
+        for idx, result in enumerate(results):
+            players = (greedy, rand) if idx % 2 == 0 else (rand, greedy)
+            game = isolation.Board(players[0], players[1], 5, 5)
+            for move in opening + result.history:
+                self.assertIn(tuple(move), game.get_legal_moves())
+                game.apply_move(tuple(move))
+            self.assertEqual(result.termination, "illegal move")
+            self.assertFalse(game.get_legal_moves())
+            self.assertEqual(game.move_count & 1, 1 - result.winner)
+
+    def test_hanging_agent_times_out(self):
+        greedy = sample_players.GreedyPlayer()
+        start = timeit.default_timer()
+        results, _ = self.play([(HangingPlayer(), greedy), (greedy, greedy)])
+        self.assertLess(timeit.default_timer() - start, 30)
+        self.assertEqual(results[0][:3], (1, [], "timeout"))
+        self.assertEqual(results[1].termination, "illegal move")
+
+    def test_failing_agent_loses(self):
+        with self.assertWarns(UserWarning):
+            results, _ = self.play([(sample_players.GreedyPlayer(),
+                                     FailingPlayer())])
+        self.assertEqual(results[0].winner, 0)
+        self.assertEqual(results[0].termination, "error")
+
+    def test_agent_failing_to_start_loses(self):
+        greedy = sample_players.GreedyPlayer()
+        with self.assertWarns(UserWarning):
+            results, _ = self.play([(greedy, UnloadablePlayer()),
+                                    (greedy, greedy)])
+        self.assertEqual(results[0][:3], (0, [], "error"))
+        self.assertEqual(results[1].termination, "illegal move")
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,182 @@
+"""Batched NumPy versions of the evaluation functions in game_agent.py and
+sample_players.py.
+
+The scalar heuristics score one board at a time, calling
+`get_legal_moves()` twice per position.  The functions below instead score
+a whole `PositionBatch` -- e.g., every child of a node on the search frontier
+-- with a handful of vectorized array operations: each position is a row of
+a boolean matrix of blocked cells, and the mobility of a player is the number
+of free cells in the row of a precomputed knight move matrix for its
+location.
+
+Every batch function returns exactly the values of its scalar counterpart
+(including the +/-inf values of won and lost positions), so an agent can
+switch between them without changing its search results.
+"""
+import numpy as np
+
+from isolation.bitboard import knight_table
+
+# Boolean knight move matrices shared by every batch of the same board
+# dimensions, keyed by (width, height)
+_MOVE_MATRICES = {}
+
+
+def move_matrix(width, height):
+    """Return the (cached) boolean matrix whose entry [i, j] is True iff a
+    knight can move from cell index i to cell index j.
+    """
+    matrix = _MOVE_MATRICES.get((width, height))
+    if matrix is None:
+        masks = knight_table(width, height).masks
+        size = width * height
+        matrix = np.array([[mask >> idx & 1 for idx in range(size)]
+                           for mask in masks], dtype=bool)
+        _MOVE_MATRICES[(width, height)] = matrix
+    return matrix
+
+
+class PositionBatch:
+    """A set of positions on boards of the same size, seen from the point of
+    view of one player.
+
+    Parameters
+    ----------
+    width, height : int
+        The dimensions of the boards.
+
+    own_moves, opp_moves : numpy.ndarray<int>
+        The number of legal moves of the player and of its opponent in each
+        position.
+
+    own_locs : numpy.ndarray<int>
+        The cell index of the player in each position (cells are indexed like
+        `Board._board_state`); -1 if it has not moved yet.
+
+    own_to_move : numpy.ndarray<bool>
+        True for the positions where the player holds the initiative.
+    """
+
+    def __init__(self, width, height, own_moves, opp_moves, own_locs,
+                 own_to_move):
+        self.width = width
+        self.height = height
+        self.own_moves = own_moves
+        self.opp_moves = opp_moves
+        self.own_locs = own_locs
+        self.own_to_move = own_to_move
+
+    def __len__(self):
+        return len(self.own_moves)
+
+    @classmethod
+    def from_arrays(cls, width, height, blocked, own_locs, opp_locs,
+                    own_to_move):
+        """Return the batch of arbitrary positions.
+
+        Parameters
+        ----------
+        blocked : numpy.ndarray<bool>
+            Array of shape (N, width * height) flagging the blocked cells of
+            each position.
+
+        own_locs, opp_locs : numpy.ndarray<int>
+            The cell index of the player and of its opponent in each
+            position; -1 for a player that has not moved yet.
+
+        own_to_move : numpy.ndarray<bool>
+            True for the positions where the player holds the initiative.
+        """
+        matrix = move_matrix(width, height)
+        free = ~blocked
+
+        def mobility(locs):
+            moves = (matrix[locs] & free).sum(axis=1)
+            not_moved = locs < 0
+            if not_moved.any():
+                moves[not_moved] = free[not_moved].sum(axis=1)
+            return moves
+
+        return cls(width, height, mobility(own_locs), mobility(opp_locs),
+                   own_locs, own_to_move)
+
+    @classmethod
+    def children(cls, game, moves, player):
+        """Return the batch of the positions reached from `game` by each of
+        the active player's `moves`, seen from `player`.
+
+        The children differ from `game` by a single blocked cell, so their
+        mobilities are derived from the free cells of `game` alone, without
+        materializing the board of each child.
+        """
+        height = game.height
+        matrix = move_matrix(game.width, height)
+        free = np.zeros(game.width * height, dtype=bool)
+        free[[r + c * height for r, c in game.get_blank_spaces()]] = True
+        move_locs = np.array([r + c * height for r, c in moves])
+
+        # A knight never attacks its own cell, so the move does not change
+        # the mobility of the player making it
+        mover_moves = (matrix[move_locs] & free).sum(axis=1)
+        other = game.get_player_location(game.inactive_player)
+        if other is None:
+            other_moves = np.full(len(moves), free.sum() - 1)
+        else:
+            other_loc = other[0] + other[1] * height
+            other_moves = ((matrix[other_loc] & free).sum() -
+                           matrix[other_loc, move_locs])
+
+        if game.active_player is player:
+            return cls(game.width, height, mover_moves, other_moves,
+                       move_locs, np.zeros(len(moves), dtype=bool))
+        own_locs = np.full(len(moves), -1 if other is None else other_loc)
+        return cls(game.width, height, other_moves, mover_moves, own_locs,
+                   np.ones(len(moves), dtype=bool))
+
+    def outcome(self, values):
+        """Return `values` (one float per position) with the positions lost
+        by the player set to -inf and those won set to +inf.
+        """
+        values = np.array(values, dtype=float)
+        values[self.own_to_move & (self.own_moves == 0)] = float("-inf")
+        values[~self.own_to_move & (self.opp_moves == 0)] = float("inf")
+        return values
+
+
+def open_move_score(batch):
+    """Batch version of `sample_players.open_move_score`. """
+    return batch.outcome(batch.own_moves)
+
+
+def improved_score(batch):
+    """Batch version of `sample_players.improved_score`. """
+    return batch.outcome(batch.own_moves - batch.opp_moves)
+
+
+def center_score(batch):
+    """Batch version of `sample_players.center_score`. """
+    rows = batch.own_locs % batch.height
+    cols = batch.own_locs // batch.height
+    return batch.outcome((batch.height / 2. - rows)**2 +
+                         (batch.width / 2. - cols)**2)
+
+
+def custom_score(batch):
+    """Batch version of `game_agent.custom_score`. """
+    return batch.outcome(batch.own_moves - 4 * batch.opp_moves)
+
+
+def custom_score_2(batch):
+    """Batch version of `game_agent.custom_score_2`. """
+    x = batch.own_moves - batch.opp_moves
+    y = batch.own_moves + batch.opp_moves
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return batch.outcome(x / y)
+
+
+def custom_score_3(batch):
+    """Batch version of `game_agent.custom_score_3`. """
+    x = batch.own_moves - batch.opp_moves
+    y = batch.own_moves + batch.opp_moves
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return batch.outcome(np.exp(x / y - 2))
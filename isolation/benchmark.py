@@ -0,0 +1,356 @@
+"""Measure the throughput of move generation and search, and report it as
+JSON so that results from different versions of the code can be compared.
+
+The benchmark has five parts:
+
+    perft      Count the positions reachable in exactly `depth` plies from
+               fixed positions with `get_legal_moves()` and `forecast_move()`
+               (or `push_move()`/`pop_move()` in place), on each engine and
+               board size. The counts double as a correctness check.
+
+    search     Time fixed-depth searches of `MinimaxPlayer` and
+               `AlphaBetaPlayer` with every score function on each engine,
+               counting the number of positions evaluated.
+
+    leaf       Time the evaluation of every score function, and of its fused
+               version from fused_eval.py, on the children of fixed
+               positions (each child is pushed in place so that it starts
+               with an empty mobility cache, as in a search).
+
+    copy       Time `copy()` of fixed positions on each engine, and report
+               the approximate number of bytes owned by one board (the
+               board object and the containers holding its state, not the
+               tables and players it shares with its copies).
+
+    sizes      Every part runs on each board size given by --sizes (by
+               default 7x7, 15x15 and 25x25), which shows whether the cost
+               per node grows with the area of the board.
+
+Save a baseline and compare a later run against it with e.g.
+
+    python benchmark.py -o before.json
+    python benchmark.py --baseline before.json
+
+The comparison lists every measurement whose throughput dropped by more than
+--tolerance, and exits with status 1 if there is any (or if a node count
+differs, which means the rules of the game changed).
+"""
+import argparse
+import itertools
+import json
+import platform
+import random
+import sys
+import timeit
+
+import fused_eval
+from isolation import Board, BitBoard
+from sample_players import open_move_score, improved_score, center_score
+from game_agent import (MinimaxPlayer, AlphaBetaPlayer, custom_score,
+                        custom_score_2, custom_score_3)
+
+ENGINES = {"Board": Board, "BitBoard": BitBoard}
+
+SCORE_FNS = [open_move_score, improved_score, center_score, custom_score,
+             custom_score_2, custom_score_3]
+
+# Positions are reached from the empty board by playing this many random
+# moves from a generator with a fixed seed, picking among the legal moves in
+# sorted order so that every engine and version reaches the same position
+POSITIONS = {"opening": (2, 0), "midgame": (6, 1)}
+
+# Search depths of the perft and search benchmarks, and the depth below the
+# benchmark positions of the parents of the positions scored by the leaf
+# benchmark
+PERFT_DEPTH = 6
+SEARCH_DEPTHS = {"minimax": 5, "alphabeta": 8}
+LEAF_DEPTH = 4
+
+# Every measurement is repeated this many times and the fastest run is
+# reported, which filters out most of the noise from other processes
+REPEAT = 3
+
+# Number of copies of every position timed by the copy benchmark
+COPIES = 20000
+
+# Attributes of a board that are shared with its copies, and so are not
+# counted in its size
+SHARED_ATTRIBUTES = {"_player_1", "_player_2", "_active_player",
+                     "_inactive_player", "_tables", "_table", "_zobrist"}
+
+
+def make_position(engine, width, height, num_moves, seed, players=("1", "2")):
+    """Return the benchmark position reached by `num_moves` random moves. """
+    rng = random.Random(seed)
+    game = engine(players[0], players[1], width, height)
+    for _ in range(num_moves):
+        legal_moves = game.get_legal_moves()
+        if not legal_moves:
+            break
+        game.apply_move(rng.choice(sorted(legal_moves)))
+    return game
+
+
+def perft(game, depth, in_place=False):
+    """Return the number of positions reachable from `game` in exactly
+    `depth` plies.
+    """
+    if depth == 0:
+        return 1
+    legal_moves = game.get_legal_moves()
+    if depth == 1:
+        return len(legal_moves)
+    count = 0
+    for move in legal_moves:
+        if in_place:
+            game.push_move(move)
+            count += perft(game, depth - 1, in_place)
+            game.pop_move()
+        else:
+            count += perft(game.forecast_move(move), depth - 1, in_place)
+    return count
+
+
+def counting(score_fn):
+    """Wrap `score_fn` so that the number of calls is counted in the
+    `calls` attribute of the wrapper.
+    """
+    def score(game, player):
+        score.calls += 1
+        return score_fn(game, player)
+    score.calls = 0
+    return score
+
+
+def time_call(fn, repeat=REPEAT):
+    """Return the result of calling `fn` and the shortest time (seconds) it
+    took in `repeat` calls.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        result = fn()
+        best = min(best, timeit.default_timer() - start)
+    return result, best
+
+
+def run_perft(sizes, depth=PERFT_DEPTH, repeat=REPEAT):
+    """Return the perft results for every position, engine and size. """
+    results = []
+    for size in sizes:
+        for name, (num_moves, seed) in sorted(POSITIONS.items()):
+            for engine_name, engine in sorted(ENGINES.items()):
+                for in_place in (False, True):
+                    game = make_position(engine, size, size, num_moves, seed)
+                    nodes, seconds = time_call(
+                        lambda: perft(game, depth, in_place), repeat)
+                    results.append({
+                        "name": "perft/{}/{}x{}/{}/{}".format(
+                            name, size, size, engine_name,
+                            "in_place" if in_place else "copy"),
+                        "nodes": nodes, "seconds": seconds,
+                        "nodes_per_second": nodes / seconds})
+    return results
+
+
+def run_search(sizes, depths=SEARCH_DEPTHS, repeat=REPEAT):
+    """Return the fixed-depth search timings of every agent, score function,
+    engine and size, searching the "midgame" position.
+    """
+    results = []
+    num_moves, seed = POSITIONS["midgame"]
+    for size, (engine_name, engine) in itertools.product(
+            sizes, sorted(ENGINES.items())):
+        for agent, search_depth in sorted(depths.items()):
+            for score_fn in SCORE_FNS:
+                score = counting(score_fn)
+                if agent == "minimax":
+                    player = MinimaxPlayer(score_fn=score)
+                    search = player.minimax
+                else:
+                    player = AlphaBetaPlayer(score_fn=score)
+                    search = player.alphabeta
+                player.time_left = lambda: float("inf")
+                player.TIMER_THRESHOLD = 0
+                game = make_position(engine, size, size, num_moves, seed)
+                game = game.copy_with_players(player, "opponent")
+
+                def run():
+                    # Board shuffles the legal moves; seed the shuffles so
+                    # that every run searches the same tree
+                    random.seed(seed)
+                    return search(game, search_depth)
+
+                _, seconds = time_call(run, repeat)
+                score.calls //= repeat
+                results.append({
+                    "name": "search/{}/{}/{}x{}/{}".format(
+                        agent, score_fn.__name__, size, size, engine_name),
+                    "nodes": score.calls, "seconds": seconds,
+                    "nodes_per_second": score.calls / seconds})
+    return results
+
+
+def descendants(game, depth):
+    """Return the list of the positions reachable from `game` in exactly
+    `depth` plies.
+    """
+    if depth == 0:
+        return [game]
+    return [position for move in game.get_legal_moves()
+            for position in descendants(game.forecast_move(move), depth - 1)]
+
+
+def run_leaf(sizes, depth=LEAF_DEPTH, repeat=REPEAT):
+    """Return the timings of scoring the children of the descendants of
+    every position with each score function and its fused version, on each
+    engine and size.
+    """
+    results = []
+    for size in sizes:
+        for engine_name, engine in sorted(ENGINES.items()):
+            for score_fn in SCORE_FNS:
+                fused_fn = getattr(fused_eval, score_fn.__name__)
+                for variant, fn in (("scalar", score_fn), ("fused", fused_fn)):
+                    parents = []
+                    for num_moves, seed in POSITIONS.values():
+                        game = make_position(engine, size, size, num_moves, seed)
+                        parents.extend(descendants(game, depth))
+
+                    def run():
+                        count = 0
+                        for parent in parents:
+                            player = parent.active_player
+                            for move in parent.get_legal_moves():
+                                parent.push_move(move)
+                                fn(parent, player)
+                                parent.pop_move()
+                                count += 1
+                        return count
+
+                    nodes, seconds = time_call(run, repeat)
+                    results.append({
+                        "name": "leaf/{}/{}/{}x{}/{}".format(
+                            score_fn.__name__, variant, size, size,
+                            engine_name),
+                        "nodes": nodes, "seconds": seconds,
+                        "nodes_per_second": nodes / seconds})
+    return results
+
+
+def footprint(game):
+    """Return the approximate number of bytes owned by a board: the size of
+    the object, of its attribute dict (if any) and of the attribute values
+    that are not shared with its copies.
+    """
+    names = set(getattr(game, "__dict__", ()))
+    for cls in type(game).__mro__:
+        names.update(getattr(cls, "__slots__", ()))
+    size = sys.getsizeof(game)
+    if hasattr(game, "__dict__"):
+        size += sys.getsizeof(game.__dict__)
+    for name in names - SHARED_ATTRIBUTES:
+        if hasattr(game, name):
+            size += sys.getsizeof(getattr(game, name))
+    return size
+
+
+def run_copy(sizes, copies=COPIES, repeat=REPEAT):
+    """Return the timings of copying every position, and the number of
+    bytes of one board, on each engine and size.
+    """
+    results = []
+    for size in sizes:
+        for name, (num_moves, seed) in sorted(POSITIONS.items()):
+            for engine_name, engine in sorted(ENGINES.items()):
+                game = make_position(engine, size, size, num_moves, seed)
+
+                def run():
+                    copy = game.copy
+                    for _ in range(copies):
+                        copy()
+                    return copies
+
+                nodes, seconds = time_call(run, repeat)
+                results.append({
+                    "name": "copy/{}/{}x{}/{}".format(
+                        name, size, size, engine_name),
+                    "nodes": nodes, "seconds": seconds,
+                    "nodes_per_second": nodes / seconds,
+                    "bytes": footprint(game.copy())})
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the list of regressions of `results` relative to `baseline`:
+    changed node counts, and throughput drops by more than `tolerance`.
+    """
+    old = {entry["name"]: entry for entry in baseline["results"]}
+    regressions = []
+    for entry in results["results"]:
+        before = old.get(entry["name"])
+        if before is None:
+            continue
+        if entry["name"].startswith("perft") and entry["nodes"] != before["nodes"]:
+            regressions.append("{}: {} nodes, was {}".format(
+                entry["name"], entry["nodes"], before["nodes"]))
+            continue
+        ratio = entry["nodes_per_second"] / before["nodes_per_second"]
+        if ratio < 1 - tolerance:
+            regressions.append("{}: {:.0f} nodes/s, was {:.0f} ({:+.0%})".format(
+                entry["name"], entry["nodes_per_second"],
+                before["nodes_per_second"], ratio - 1))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark move generation and search throughput.")
+    parser.add_argument("-o", "--output",
+                        help="write the JSON results to this file "
+                             "(default: standard output)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[7, 15, 25],
+                        help="board sizes (width = height) to benchmark")
+    parser.add_argument("--only", choices=["perft", "search", "leaf", "copy"],
+                        help="run only one part of the benchmark")
+    parser.add_argument("--repeat", type=int, default=REPEAT,
+                        help="number of runs of every measurement")
+    parser.add_argument("--baseline",
+                        help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="largest relative throughput drop that is not "
+                             "reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = []
+    if args.only in (None, "perft"):
+        results.extend(run_perft(args.sizes, repeat=args.repeat))
+    if args.only in (None, "search"):
+        results.extend(run_search(args.sizes, repeat=args.repeat))
+    if args.only in (None, "leaf"):
+        results.extend(run_leaf(args.sizes, repeat=args.repeat))
+    if args.only in (None, "copy"):
+        results.extend(run_copy(args.sizes, repeat=args.repeat))
+    report = {"python": platform.python_version(),
+              "machine": platform.machine(),
+              "results": results}
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    elif not args.baseline:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(report, json.load(baseline_file),
+                                  args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,7 +4,15 @@ champions) in a tournament.
 
          COMPLETING AND SUBMITTING A COMPETITION AGENT IS OPTIONAL
 """
+import math
 import random
+import timeit
+
+from array import array
+
+from isolation import Deadline
+from isolation.bitboard import knight_table
+from opening_book import OpeningBook
 
 
 class SearchTimeout(Exception):
@@ -33,7 +41,100 @@ def custom_score(game, player):
     float
         The heuristic value of the current game state to the specified player.
     """
-    raise NotImplementedError
+    if game.is_loser(player):
+        return float("-inf")
+
+    if game.is_winner(player):
+        return float("inf")
+
+    own_moves = len(game.get_legal_moves(player))
+    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    return float(own_moves - opp_moves)
+
+
+class MCTSTree:
+    """Monte Carlo search tree stored in flat arrays.
+
+    Nodes are integer indices into parallel arrays of node attributes, and
+    the children of a node are created all at once when it is expanded, so
+    they occupy a contiguous range of indices.  The tree holds no Python
+    objects per node: growing it allocates no garbage-collected containers,
+    so the cyclic garbage collector never has to traverse it in the middle
+    of a timed search.
+
+    Moves are cell indices (``row + column * height``) and players are
+    numbered relative to the root of the first search: 0 for the searching
+    player and 1 for its opponent.
+
+    Attributes
+    ----------
+    move : array<int>
+        The move leading from the parent to each node (-1 at the root)
+
+    player : array<int>
+        The player who made the move of each node
+
+    visits, wins : array<int>
+        The number of playouts through each node, and how many of them were
+        won by the player who made its move
+
+    first, count : array<int>
+        The index of the first child and the number of children of each
+        node; `count` is -1 until the node is expanded
+    """
+    def __init__(self):
+        self.move = array("h")
+        self.player = array("b")
+        self.visits = array("i")
+        self.wins = array("i")
+        self.first = array("i")
+        self.count = array("h")
+        self.add_node(-1, 1)
+
+    def __len__(self):
+        return len(self.move)
+
+    def add_node(self, move, player):
+        """Append an unexpanded node and return its index. """
+        self.move.append(move)
+        self.player.append(player)
+        self.visits.append(0)
+        self.wins.append(0)
+        self.first.append(0)
+        self.count.append(-1)
+        return len(self.move) - 1
+
+    def expand(self, node, moves, player):
+        """Create the children of `node`, one per move in `moves` made by
+        `player`, in random order.
+        """
+        random.shuffle(moves)
+        self.first[node] = len(self.move)
+        self.count[node] = len(moves)
+        for move in moves:
+            self.add_node(move, player)
+
+    def children(self, node):
+        """Return the range of the child indices of `node`. """
+        first = self.first[node]
+        return range(first, first + max(self.count[node], 0))
+
+    def most_visited_child(self, node):
+        """Return the child of `node` with the most playouts, or None if
+        `node` has not been expanded.
+        """
+        return max(self.children(node), key=self.visits.__getitem__,
+                   default=None)
+
+
+def mask_to_moves(mask):
+    """Return the list of cell indices of the set bits in `mask`. """
+    moves = []
+    while mask:
+        low = mask & -mask
+        moves.append(low.bit_length() - 1)
+        mask ^= low
+    return moves
 
 
 class CustomPlayer:
@@ -59,12 +160,49 @@ class CustomPlayer:
         the PvP competition uses more accurate timers that are not cross-
         platform compatible, so a limit of 1ms (vs 10ms for the other classes)
         is generally sufficient.
+
+    book : str or `opening_book.OpeningBook` (optional)
+        An opening book (or the path of a book file) consulted before
+        searching.
+
+    exploration : float (optional)
+        The exploration constant of the UCT selection rule.
+
+    max_nodes : int (optional)
+        The search tree is reused across moves until it holds this many
+        nodes, after which the next search starts a new tree.
+
+    Attributes
+    ----------
+    playouts : int
+        The number of playouts run for the last move
+
+    playouts_per_second : float
+        The playout rate of the last search
     """
 
-    def __init__(self, data=None, timeout=1.):
+    def __init__(self, data=None, timeout=1., book=None,
+                 exploration=math.sqrt(2), max_nodes=2**22):
         self.score = custom_score
         self.time_left = None
         self.TIMER_THRESHOLD = timeout
+        self.book = OpeningBook(book) if isinstance(book, str) else book
+        self.exploration = exploration
+        self.max_nodes = max_nodes
+        self.playouts = 0
+        self.playouts_per_second = 0.
+        self._tree = None
+        self._root = 0
+        self._root_state = None
+        self._table = None
+
+    def __getstate__(self):
+        """Drop the timer and the search tree when pickling the player (e.g.,
+        to play games in worker processes).
+        """
+        state = self.__dict__.copy()
+        state.update(time_left=None, _tree=None, _root=0, _root_state=None)
+        return state
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -93,5 +231,145 @@ class CustomPlayer:
             Board coordinates corresponding to a legal move; may return
             (-1, -1) if there are no available legal moves.
         """
-        # OPTIONAL: Finish this function!
-        raise NotImplementedError
+        self.time_left = Deadline.wrap(time_left)
+        self.playouts = 0
+
+        legal_moves = game.get_legal_moves()
+        if not legal_moves:
+            return (-1, -1)
+        if self.book is not None:
+            book_move = self.book.lookup(game)
+            if book_move in legal_moves:
+                return book_move
+        if len(legal_moves) == 1:
+            return legal_moves[0]
+
+        self._table = knight_table(game.width, game.height)
+        self.reroot(self.game_state(game))
+
+        start = timeit.default_timer()
+        while not self.time_left.expired(self.TIMER_THRESHOLD):
+            self.run_playout()
+        elapsed = timeit.default_timer() - start
+        self.playouts_per_second = self.playouts / elapsed if elapsed else 0.
+
+        # Without a completed playout (e.g. if the time was already short
+        # when the search started) the root may not have been expanded
+        best = self._tree.most_visited_child(self._root)
+        if best is None or not self._tree.visits[best]:
+            return legal_moves[0]
+        return self._table.cells[self._tree.move[best]]
+
+    def game_state(self, game):
+        """Return the searched state of `game`: the locations of the active
+        and inactive players (cell indices, None if they have not moved) and
+        the bitmask of blocked cells.
+        """
+        height = game.height
+        locations = []
+        for player in (game.active_player, game.inactive_player):
+            loc = game.get_player_location(player)
+            locations.append(None if loc is None else loc[0] + loc[1] * height)
+        blank = sum(1 << (r + c * height) for r, c in game.get_blank_spaces())
+        return tuple(locations), self._table.full & ~blank
+
+    def legal_moves(self, loc, occupied):
+        """Return the bitmask of the legal moves from the cell index `loc`
+        (None if the player has not moved yet) given the blocked cells.
+        """
+        moves = self._table.full if loc is None else self._table.masks[loc]
+        return moves & ~occupied
+
+    def reroot(self, state):
+        """Move the root of the tree to `state`, reusing the subtree of the
+        last search if `state` was reached by the move chosen then and one
+        reply of the opponent; otherwise start a new tree.
+        """
+        locations, occupied = state
+        tree, root = self._tree, None
+        if (tree is not None and len(tree) < self.max_nodes and
+                None not in locations and tree.count[self._root] > 0):
+            _, last_occupied = self._root_state
+            chosen = tree.most_visited_child(self._root)
+            if (locations[0] == tree.move[chosen] and occupied ==
+                    last_occupied | 1 << locations[0] | 1 << locations[1]):
+                root = next((child for child in tree.children(chosen)
+                             if tree.move[child] == locations[1]), None)
+
+        if root is None:
+            self._tree, root = MCTSTree(), 0
+        self._root, self._root_state = root, state
+
+    def run_playout(self):
+        """Run one iteration of MCTS: select a leaf of the tree with UCT,
+        expand it, play the game out at random and update the statistics of
+        the nodes along the path.
+        """
+        tree = self._tree
+        visits, wins, first, count = tree.visits, tree.wins, tree.first, tree.count
+        masks = self._table.masks
+        full = self._table.full
+        log = math.log
+        sqrt = math.sqrt
+        c = self.exploration
+
+        locations, occupied = self._root_state
+        locations = list(locations)
+        node = self._root
+        path = [node]
+        # The player to move, relative to the player of the root node
+        player = tree.player[node] ^ 1
+
+        # Selection, stopping at the first unvisited or unexpanded node
+        while count[node] > 0 and visits[node]:
+            scale = c * sqrt(log(visits[node]))
+            best_value = -1.
+            for child in range(first[node], first[node] + count[node]):
+                child_visits = visits[child]
+                if not child_visits:
+                    node = child
+                    break
+                value = wins[child] / child_visits + scale / sqrt(child_visits)
+                if value > best_value:
+                    node, best_value = child, value
+            path.append(node)
+            move = tree.move[node]
+            locations[player] = move
+            occupied |= 1 << move
+            player ^= 1
+
+        # Expansion of every child of the leaf at once, then descend into
+        # one of them
+        if count[node] < 0:
+            moves = mask_to_moves(self.legal_moves(locations[player], occupied))
+            tree.expand(node, moves, player)
+            if moves:
+                node = first[node]
+                path.append(node)
+                move = tree.move[node]
+                locations[player] = move
+                occupied |= 1 << move
+                player ^= 1
+
+        # Simulation on the bitmasks alone; the player to move without a
+        # legal move loses
+        while True:
+            loc = locations[player]
+            moves = (full if loc is None else masks[loc]) & ~occupied
+            if not moves:
+                break
+            for _ in range(random.randrange(bin(moves).count("1"))):
+                moves &= moves - 1
+            move = (moves & -moves).bit_length() - 1
+            locations[player] = move
+            occupied |= 1 << move
+            player ^= 1
+        loser = player
+
+        # Backpropagation
+        node_player = tree.player
+        for node in path:
+            visits[node] += 1
+            if node_player[node] != loser:
+                wins[node] += 1
+        self.playouts += 1
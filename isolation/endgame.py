@@ -0,0 +1,154 @@
+"""Exact endgame solver for isolation positions where the players are
+partitioned.
+
+Once the two knights can no longer reach a common cell (see
+`Board.is_partitioned`), neither player can interfere with the other, and
+the game is decided by the length of the longest knight path each player can
+still walk through its own region: the player to move wins if and only if
+its longest path is strictly longer than the opponent's.
+
+Longest paths are computed by exhaustive depth-first search over bitmasks
+of the free cells, memoized on (location, free cells). At every step the free
+cells are first restricted to those still reachable from the current
+location, and the search stops as soon as it finds a path as long as the
+parity bound: knight moves alternate between light and dark cells, so a path
+can never use more than one cell more of the opposite color than of the
+color of its starting cell. Moves are tried in Warnsdorff order (fewest
+onward moves first), which finds long paths early. The memo table is kept
+between moves, so after the first solve the remaining moves of the game are
+usually answered from the table.
+
+To prove a win the player to move only needs a path longer than the
+opponent's longest path, so its own search stops at the first such path.
+"""
+from isolation.bitboard import knight_table, reachable_mask
+
+
+class EndgameSolver:
+    """Memoized longest-path solver for partitioned positions.
+
+    Parameters
+    ----------
+    max_entries : int (optional)
+        The largest number of positions kept in the memo table; new results
+        are not memoized once it is full.
+    """
+
+    def __init__(self, max_entries=2**20):
+        self.max_entries = max_entries
+        self._memo = {}
+        self._table = None
+        self._light_cells = 0
+        self._check_time = None
+
+    def solve(self, game, player, check_time=None):
+        """Solve a partitioned position for the active player.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            The current game state.
+
+        player : object
+            The active player in `game`.
+
+        check_time : callable (optional)
+            Called periodically during the search; may raise an exception
+            (e.g., `game_agent.SearchTimeout`) to abort the solver.
+
+        Returns
+        -------
+        ((int, int), int, int) or None
+            None if the players are not partitioned. Otherwise the move
+            starting the longest path of `player` (None if it has no legal
+            moves), the length of that path and the length of the opponent's
+            longest path. `player` wins iff its path is strictly longer; in
+            that case the search stops at the first winning path, so its
+            length is only guaranteed to exceed the opponent's.
+        """
+        if not game.is_partitioned():
+            return None
+
+        table = knight_table(game.width, game.height)
+        if table is not self._table:
+            self._memo = {}
+            self._table = table
+            self._light_cells = sum(1 << idx for idx, (r, c)
+                                    in enumerate(table.cells) if (r + c) % 2 == 0)
+        self._check_time = check_time
+
+        own_loc, own_region = self._region(game, player)
+        opp_loc, opp_region = self._region(game, game.get_opponent(player))
+        opp_length = self.longest_path(opp_loc, opp_region)
+
+        best_move, own_length = None, 0
+        for idx in self._ordered_moves(own_loc, own_region):
+            length = 1 + self.longest_path(idx, own_region ^ 1 << idx,
+                                           opp_length)
+            if length > own_length:
+                best_move, own_length = table.cells[idx], length
+            if own_length > opp_length:
+                break
+        return best_move, own_length, opp_length
+
+    def longest_path(self, loc, free, target=None):
+        """Return the number of moves in the longest knight path starting at
+        the cell index `loc` and visiting only cells in the bitmask `free`.
+
+        If `target` is given, the search may stop as soon as it finds a path
+        with at least `target` moves, in which case the returned length is
+        only a lower bound (at least `target`) on the longest path.
+        """
+        free = reachable_mask(self._table, loc, free)
+        key = (loc, free)
+        length = self._memo.get(key)
+        if length is not None:
+            return length
+        if self._check_time is not None:
+            self._check_time()
+
+        length = 0
+        light = bin(free & self._light_cells).count("1")
+        dark = bin(free).count("1") - light
+        if self._light_cells >> loc & 1:
+            limit = min(2 * dark, 2 * light + 1)
+        else:
+            limit = min(2 * light, 2 * dark + 1)
+        if target is not None:
+            limit = min(limit, target)
+        for idx in self._ordered_moves(loc, free):
+            child_target = None if target is None else target - 1
+            length = max(length, 1 + self.longest_path(idx, free ^ 1 << idx,
+                                                        child_target))
+            if length >= limit:
+                break
+
+        # Lengths cut short by the target are lower bounds, not results
+        if (target is None or length < target) and len(self._memo) < self.max_entries:
+            self._memo[key] = length
+        return length
+
+    def _ordered_moves(self, loc, free):
+        """Return the cell indices in `free` a knight can move to from `loc`,
+        those with the fewest onward moves first.
+        """
+        masks = self._table.masks
+        moves = []
+        candidates = masks[loc] & free
+        while candidates:
+            low = candidates & -candidates
+            candidates ^= low
+            idx = low.bit_length() - 1
+            moves.append((bin(masks[idx] & free).count("1"), idx))
+        moves.sort()
+        return [idx for _, idx in moves]
+
+    def _region(self, game, player):
+        """Return the cell index of the player and the bitmask of the cells
+        it can reach.
+        """
+        row, col = game.get_player_location(player)
+        region = 0
+        for r, c in game.get_reachable_cells(player):
+            region |= 1 << (r + c * game.height)
+        return row + col * game.height, region
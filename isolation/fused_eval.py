@@ -0,0 +1,95 @@
+"""Fused versions of the evaluation functions in game_agent.py and
+sample_players.py.
+
+The original heuristics test `is_loser()` and `is_winner()` before counting
+the legal moves of both players, so a single evaluation generates (and
+shuffles) a move list up to four times.  The functions below count the
+moves of each player once with `Board.mobility()` -- which is cached per
+state and shared with the terminal tests of the search -- and derive the
+terminal values from the same two counts.
+
+Every function returns exactly the value of its original counterpart, so an
+agent can switch between them without changing its search results.
+"""
+import numpy as np
+
+# Values of custom_score_3 keyed by (own_moves, opp_moves); computed with
+# numpy like the original, whose exp() may differ from math.exp() in the
+# last bit
+_EXP_SCORES = {}
+
+
+def mobility(game, player):
+    """Return the number of legal moves of `player` and of its opponent, and
+    the value of the position if it is decided: -inf if `player` has lost,
+    +inf if it has won, and None otherwise.
+    """
+    own_moves = game.mobility(player)
+    opp_moves = game.mobility(game.get_opponent(player))
+    if player == game.active_player:
+        value = None if own_moves else float("-inf")
+    else:
+        value = None if opp_moves else float("inf")
+    return own_moves, opp_moves, value
+
+
+def open_move_score(game, player):
+    """Fused version of `sample_players.open_move_score`; the opponent's
+    moves are only counted when it is to move, for the terminal test.
+    """
+    own_moves = game.mobility(player)
+    if player == game.active_player:
+        if not own_moves:
+            return float("-inf")
+    elif not game.mobility(game.active_player):
+        return float("inf")
+    return float(own_moves)
+
+
+def improved_score(game, player):
+    """Fused version of `sample_players.improved_score`. """
+    own_moves, opp_moves, value = mobility(game, player)
+    if value is not None:
+        return value
+    return float(own_moves - opp_moves)
+
+
+def center_score(game, player):
+    """Fused version of `sample_players.center_score`; only the active
+    player's moves are counted, for the terminal test.
+    """
+    if not game.mobility(game.active_player):
+        return float("-inf") if player == game.active_player else float("inf")
+    w, h = game.width / 2., game.height / 2.
+    y, x = game.get_player_location(player)
+    return float((h - y)**2 + (w - x)**2)
+
+
+def custom_score(game, player):
+    """Fused version of `game_agent.custom_score`. """
+    own_moves, opp_moves, value = mobility(game, player)
+    if value is not None:
+        return value
+    return float(own_moves - 4 * opp_moves)
+
+
+def custom_score_2(game, player):
+    """Fused version of `game_agent.custom_score_2`. """
+    own_moves, opp_moves, value = mobility(game, player)
+    if value is not None:
+        return value
+    return float((own_moves - opp_moves) / (own_moves + opp_moves))
+
+
+def custom_score_3(game, player):
+    """Fused version of `game_agent.custom_score_3`. """
+    own_moves, opp_moves, value = mobility(game, player)
+    if value is not None:
+        return value
+    score = _EXP_SCORES.get((own_moves, opp_moves))
+    if score is None:
+        x = own_moves - opp_moves
+        y = own_moves + opp_moves
+        score = float(np.exp(x / y - 2))
+        _EXP_SCORES[(own_moves, opp_moves)] = score
+    return score
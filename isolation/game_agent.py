@@ -2,11 +2,40 @@
 test your agent's strength against a set of known agents using tournament.py
 and include the results in your report.
 """
+import multiprocessing
+import os
 import random
+import time
+import timeit
 
+from concurrent.futures import ProcessPoolExecutor, wait
 from random import randint
 import numpy as np
 
+from isolation import Deadline
+from batch_eval import PositionBatch
+from endgame import EndgameSolver
+from opening_book import OpeningBook
+from search_stats import SearchStats, StatsSummary
+from time_manager import TimeManager, measure_jitter
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+# Salt mixed into the position hash of nodes where the searching player is
+# to move, so that transposition table entries from min and max nodes (i.e.,
+# from games where the agent plays as the other player) never collide
+MAX_NODE_SALT = 0x9E3779B97F4A7C15
+
+# Number of empty tasks whose round trip to the worker processes of the
+# parallel root search or of pondering is timed to estimate the latency of
+# their results (see `AlphaBetaPlayer.measure_latency()`)
+LATENCY_SAMPLES = 10
+
+# Seconds every worker of the parallel root search pauses while the pool is
+# warmed up, and the number of batches of pauses sent before giving up on
+# seeing every worker (see `AlphaBetaPlayer.start_workers()`)
+WARM_UP_PAUSE = 0.01
+WARM_UP_ROUNDS = 10
+
 class SearchTimeout(Exception):
     """Subclass base exception for code clarity. """
     pass
@@ -141,12 +170,81 @@ class IsolationPlayer:
         Time remaining (in milliseconds) when search is aborted. Should be a
         positive value large enough to allow the function to return before the
         timer expires.
+
+    in_place : bool (optional)
+        If True, search by applying and undoing moves on a single board with
+        `Board.push_move()`/`Board.pop_move()` instead of allocating a new
+        board with `Board.forecast_move()` at every node.
+
+    move_ordering : `move_ordering.MoveOrderer` (optional)
+        Ranks the legal moves at each node of an alpha-beta search (PV move,
+        killer moves, history heuristic, static order). If None, moves are
+        searched in the order returned by `Board.get_legal_moves()`.
     """
-    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.):
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 in_place=False, move_ordering=None):
         self.search_depth = search_depth
         self.score = score_fn
         self.time_left = None
         self.TIMER_THRESHOLD = timeout
+        self.in_place = in_place
+        self.move_ordering = move_ordering
+        self.stats = SearchStats()
+        self.last_stats = None
+        self.stats_summary = StatsSummary()
+
+    @property
+    def time_left(self):
+        """The `isolation.Deadline` of the current move. Any `time_left`
+        callable assigned to this attribute is wrapped in a `Deadline`, so
+        the search can call `self.time_left.expired(self.TIMER_THRESHOLD)`
+        at every node but only read the clock every few nodes.
+        """
+        return self._deadline
+
+    @time_left.setter
+    def time_left(self, time_left):
+        self._deadline = None if time_left is None else Deadline.wrap(time_left)
+
+    def __getstate__(self):
+        """Drop the timer of the last move when pickling the player (e.g., to
+        play games in worker processes); it may be a closure over the game
+        that was being played, which cannot be pickled.
+        """
+        state = self.__dict__.copy()
+        state["_deadline"] = None
+        return state
+
+    def start_stats(self):
+        """Start recording the `search_stats.SearchStats` of a new move;
+        `time_left` must already be set.
+        """
+        self.stats = SearchStats(self.time_left())
+
+    def finish_stats(self, move, source=None):
+        """Complete the statistics of the current move (chosen by `source`, if
+        given), add them to `stats_summary` and return `move`.
+        """
+        self.stats.finish(self.time_left(), source)
+        self.last_stats = self.stats
+        self.stats_summary.add(self.stats)
+        return move
+
+    def search_child(self, search_fn, game, move, *args):
+        """Return the value of `search_fn` applied to the successor of `game`
+        reached by `move`. Any extra arguments are passed through.
+
+        When searching in place the move is undone before returning, even if
+        the search is aborted by a `SearchTimeout`, so the caller's board is
+        always left unchanged.
+        """
+        if not self.in_place:
+            return search_fn(game.forecast_move(move), *args)
+        game.push_move(move)
+        try:
+            return search_fn(game, *args)
+        finally:
+            game.pop_move()
 
 
 class MinimaxPlayer(IsolationPlayer):
@@ -184,6 +282,7 @@ class MinimaxPlayer(IsolationPlayer):
             (-1, -1) if there are no available legal moves.
         """
         self.time_left = time_left
+        self.start_stats()
 
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
@@ -192,13 +291,14 @@ class MinimaxPlayer(IsolationPlayer):
         try:
             # The try/except block will automatically catch the exception
             # raised when the timer is about to expire.
-            return self.minimax(game, self.search_depth)
+            best_move = self.minimax(game, self.search_depth)
+            self.stats.end_iteration(self.search_depth)
 
         except SearchTimeout:
-            pass  # Handle any actions required after timeout as needed
+            self.stats.timed_out = True
 
         # Return the best move from the last completed search iteration
-        return best_move
+        return self.finish_stats(best_move)
 
     def minimax(self, game, depth):
         """Implement depth-limited minimax search algorithm as described in
@@ -239,8 +339,9 @@ class MinimaxPlayer(IsolationPlayer):
                 each helper function or else your agent will timeout during
                 testing.
         """
-        if self.time_left() < self.TIMER_THRESHOLD:
+        if self.time_left.expired(self.TIMER_THRESHOLD):
             raise SearchTimeout()
+        self.stats.nodes += 1
 
         # TODO: finish this function!
 
@@ -260,7 +361,7 @@ class MinimaxPlayer(IsolationPlayer):
         # Do minimax calculation.
         # Code adapted from lecture mini project.
         for move in game.get_legal_moves():
-            v = self.min_value(game.forecast_move(move), depth - 1)
+            v = self.search_child(self.min_value, game, move, depth - 1)
             if v > best_score:
                 best_score = v
                 best_move = move
@@ -272,8 +373,9 @@ class MinimaxPlayer(IsolationPlayer):
         minimum value over all legal child nodes.
         """
         # Check for timer timeout
-        if self.time_left() < self.TIMER_THRESHOLD:
+        if self.time_left.expired(self.TIMER_THRESHOLD):
             raise SearchTimeout()
+        self.stats.nodes += 1
         # Check legal moves
         if not game.get_legal_moves():
             return (self.score(game, self))
@@ -284,7 +386,7 @@ class MinimaxPlayer(IsolationPlayer):
         v = float('inf')
         # Iterate through moves and find optimal value
         for move in game.get_legal_moves():
-            v = min(v, self.max_value(game.forecast_move(move), depth - 1))
+            v = min(v, self.search_child(self.max_value, game, move, depth - 1))
         # Return value
         return v
 
@@ -293,8 +395,9 @@ class MinimaxPlayer(IsolationPlayer):
         maximum value over all legal child nodes.
         """
         # Check for timer timeout
-        if self.time_left() < self.TIMER_THRESHOLD:
+        if self.time_left.expired(self.TIMER_THRESHOLD):
             raise SearchTimeout()
+        self.stats.nodes += 1
         # Check legal moves
         if not game.get_legal_moves():
             return (self.score(game, self))
@@ -305,7 +408,7 @@ class MinimaxPlayer(IsolationPlayer):
         v = float('-inf')
         # Iterate through moves and find optimal value
         for move in game.get_legal_moves():
-            v = max(v, self.min_value(game.forecast_move(move), depth - 1))
+            v = max(v, self.search_child(self.min_value, game, move, depth - 1))
         # Return value
         return v
 
@@ -314,7 +417,266 @@ class AlphaBetaPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using iterative deepening minimax
     search with alpha-beta pruning. You must finish and test this player to
     make sure it returns a good move before the search time limit expires.
+
+    Parameters
+    ----------
+    tt_size : int (optional)
+        The number of buckets in the transposition table used to reuse the
+        results of earlier iterations and transposed positions; zero (the
+        default) disables the table.
+
+    tt_replacement : str (optional)
+        The replacement scheme of the transposition table ("depth" or
+        "two-tier"); see `transposition.TranspositionTable`.
+
+    search_mode : str (optional)
+        "alphabeta" searches every move with the full (alpha, beta) window.
+        "pvs" (principal variation search, a.k.a. NegaScout) searches the
+        first move of each node with the full window and the others with a
+        null window that only proves they are no better, re-searching the
+        moves that turn out to be better.
+
+    aspiration : float (optional)
+        If set, each iteration of iterative deepening after the first one
+        searches the root with a window of this half-width centred on the
+        value of the previous iteration, widening it on fail-high/fail-low.
+        The width is in the units of `score_fn`. None disables aspiration
+        windows.
+
+    endgame : bool (optional)
+        If True, positions where the players are partitioned are solved
+        exactly with `endgame.EndgameSolver` instead of heuristic search.
+
+    book : str or `opening_book.OpeningBook` (optional)
+        An opening book (or the path of a book file) consulted before
+        searching; positions found in the book are played without search.
+
+    batch_score_fn : callable (optional)
+        A batched version of `score_fn` from `batch_eval` (e.g.,
+        `batch_eval.custom_score` for `custom_score`). If set, the children
+        of every node one ply above the search horizon are all scored in a
+        single call instead of one `score_fn` call each. This pays off on
+        `isolation.Board`, whose scalar evaluation is expensive; with
+        `isolation.BitBoard` the NumPy call overhead dominates.
+
+    workers : int (optional)
+        The number of worker processes of the parallel root search. With more
+        than one worker, the root moves are split among the workers, each of
+        which deepens its share of the moves iteratively (keeping its own
+        transposition table and move ordering state between moves) until the
+        deadline; the best move of the deepest iteration completed by every
+        worker is played. The worker pool is started with the player; call
+        `close()` to shut it down.
+
+    pondering : bool (optional)
+        If True, the player searches in a background process that keeps its
+        transposition table and move ordering state between moves, and that
+        ponders while the opponent thinks (see `ponder()`): it predicts the
+        reply of the opponent and searches the resulting position until the
+        opponent moves. If the prediction was right, the pondered move is
+        played without searching again; otherwise the tables stay warm for
+        the actual position. Pondering needs a spare CPU core so that it
+        does not slow down the opponent. The process is started with the
+        player; call `close()` to stop it.
+
+    time_manager : `time_manager.TimeManager` (optional)
+        Decides whether to start each iteration of iterative deepening and
+        sets the safety margin (`TIMER_THRESHOLD`) of every move. If None, a
+        `TimeManager` with a calibrated margin is used;
+        `TimeManager(margin=100., predict=False)` restores the original
+        fixed 100 ms threshold.
+
+    See `IsolationPlayer` for the remaining parameters.
     """
+    SEARCH_MODES = ("alphabeta", "pvs")
+
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 in_place=False, move_ordering=None, tt_size=0,
+                 tt_replacement="depth", search_mode="alphabeta",
+                 aspiration=None, endgame=False, book=None,
+                 batch_score_fn=None, workers=1, pondering=False,
+                 time_manager=None):
+        super().__init__(search_depth, score_fn, timeout, in_place,
+                         move_ordering)
+        if search_mode not in self.SEARCH_MODES:
+            raise ValueError("Unknown search mode: {}".format(search_mode))
+        if workers > 1 and pondering:
+            raise ValueError("Parallel root search and pondering cannot be "
+                             "combined")
+        self.search_mode = search_mode
+        self.aspiration = aspiration
+        self.root_depth = 0
+        self.root_value = None
+        self.tt = None
+        if tt_size:
+            self.tt = TranspositionTable(tt_size, tt_replacement)
+        self.endgame = EndgameSolver() if endgame else None
+        self.book = OpeningBook(book) if isinstance(book, str) else book
+        self.batch_score_fn = batch_score_fn
+        self.workers = workers
+        self.pondering = pondering
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+        self.time_manager = time_manager or TimeManager()
+        self.root_moves = None
+        self.ipc_latency = 0.
+        self._pool = None
+        self._ponder_stop = None
+        if workers > 1:
+            self.start_workers()
+        if pondering:
+            self.start_ponder_process()
+
+    def __getstate__(self):
+        """Drop the worker pool of the parallel root search when pickling the
+        player; copies start their own pool when needed.
+        """
+        state = super().__getstate__()
+        state["_pool"] = None
+        state["_ponder_stop"] = None
+        return state
+
+    def close(self):
+        """Shut down the worker processes of the parallel root search or of
+        pondering, if any.
+        """
+        self.stop_pondering()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def start_workers(self):
+        """Start the worker processes of the parallel root search, unless they
+        are running, and wait until every worker is ready, so that no move
+        pays for their startup.
+
+        Called when the player is created; copies of the player (which do
+        not share its processes) and players reopened after `close()` start
+        their workers on their first move unless this is called first.
+        """
+        if self._pool is not None:
+            return
+        self._pool = ProcessPoolExecutor(self.workers,
+                                         initializer=init_root_worker,
+                                         initargs=(self,))
+        ready = set()
+        for _ in range(WARM_UP_ROUNDS):
+            ready.update(future.result() for future in [
+                self._pool.submit(warm_up_worker) for _ in range(self.workers)])
+            if len(ready) == self.workers:
+                break
+        self.measure_latency()
+
+    def measure_latency(self):
+        """Set `ipc_latency` to the longest round trip (in milliseconds) of
+        LATENCY_SAMPLES empty tasks sent to the worker processes, the delay
+        with which their results reach this process.
+        """
+        latency = 0.
+        for _ in range(LATENCY_SAMPLES):
+            start = timeit.default_timer()
+            self._pool.submit(os.getpid).result()
+            latency = max(latency, 1000 * (timeit.default_timer() - start))
+        self.ipc_latency = latency
+
+    def worker_deadline(self):
+        """Return the deadline (a `timeit.default_timer()` reading) of a
+        search in a worker process: early enough that its result arrives
+        while half of the safety margin of this process is left. The clock is
+        system-wide and monotonic, so the deadline holds in every process.
+        """
+        return timeit.default_timer() + (
+            self.time_left() - self.time_manager.margin / 2 -
+            self.ipc_latency) / 1000.
+
+    def collect(self, futures):
+        """Wait for the results of worker processes until half of the safety
+        margin is left, and return the set of the futures that are done.
+        """
+        done, _ = wait(futures, timeout=max(
+            0., self.time_left() - self.time_manager.margin / 2) / 1000.)
+        return done
+
+    def ponder(self, game):
+        """Start pondering on `game`, where the opponent of this player is
+        about to move, and return immediately. Does nothing unless the player
+        was created with `pondering=True`.
+
+        `Board.play(ponder=True)` calls this at the start of every turn of
+        the opponent, and `stop_pondering()` once the opponent has moved.
+        """
+        if not self.pondering or not game.get_legal_moves():
+            return
+        self.start_ponder_process()
+        self._ponder_stop.clear()
+        self._pool.submit(ponder_position,
+                          game.copy_with_players("opponent", "searcher"))
+
+    def start_ponder_process(self):
+        """Start the background process of a pondering player, unless it is
+        already running.
+        """
+        if self._pool is None:
+            self._ponder_stop = multiprocessing.Event()
+            self._pool = ProcessPoolExecutor(
+                1, initializer=init_ponder_worker,
+                initargs=(self, self._ponder_stop))
+            self.measure_latency()
+
+    def stop_pondering(self):
+        """Stop pondering, if the player is; returns immediately. """
+        if self._ponder_stop is not None:
+            self._ponder_stop.set()
+
+    def predict_reply(self, game):
+        """Return the predicted move of the opponent, who is active in `game`:
+        the best move stored in the transposition table for `game` if any,
+        else the reply on the principal variation of the last search, else
+        the reply that minimizes the score of the player one ply ahead.
+        """
+        legal_moves = game.get_legal_moves()
+        _, entry = self.tt_probe(game)
+        if entry is not None and entry.move in legal_moves:
+            return entry.move
+        if self.move_ordering is not None:
+            pv = self.move_ordering.principal_variation
+            if len(pv) > 1 and pv[1] in legal_moves:
+                return pv[1]
+        return min(legal_moves,
+                   key=lambda move: self.score(game.forecast_move(move), self))
+
+    def background_search(self, game):
+        """Return the move found by searching `game` in the pondering
+        process, or the move of a one-ply search (see `quick_move()`) if it
+        does not answer before the deadline.
+        """
+        legal_moves = game.get_legal_moves()
+        self.start_ponder_process()
+        self.stop_pondering()
+        # The deadline is absolute, since the search may only start once the
+        # pondering search has noticed the stop signal
+        future = self._pool.submit(search_position,
+                                   game.copy_with_players("searcher", "opponent"),
+                                   self.worker_deadline())
+        if not self.collect([future]):
+            self.stats.timed_out = True
+            return self.quick_move(game)
+        move, hit, stats = future.result()
+        self.stats.absorb(stats)
+        if hit:
+            self.ponder_hits += 1
+            self.stats.source = "ponder"
+        else:
+            self.ponder_misses += 1
+            self.stats.source = stats.source
+        return move if move in legal_moves else self.quick_move(game)
+
+    def quick_move(self, game):
+        """Return the best move of a one-ply search of `game` that ignores the
+        timer, the fallback when the worker processes do not answer in time.
+        """
+        return max(game.get_legal_moves(),
+                   key=lambda move: self.score(game.forecast_move(move), self))
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -346,18 +708,42 @@ class AlphaBetaPlayer(IsolationPlayer):
             Board coordinates corresponding to a legal move; may return
             (-1, -1) if there are no available legal moves.
         """
-        self.TIMER_THRESHOLD = 100.0
-
         self.time_left = time_left
+        self.TIMER_THRESHOLD = self.time_manager.margin
+        if self.workers > 1 or self.pondering:
+            # Moves searched in other processes arrive up to a round trip late
+            self.TIMER_THRESHOLD += self.ipc_latency
+        self.start_stats()
+        if self.tt is not None:
+            self.tt.new_search()
+        if self.move_ordering is not None:
+            self.move_ordering.new_search()
 
         # TODO: finish this function!
         # Check legal moves
         if not game.get_legal_moves():
-            return (-1, -1)
+            return self.finish_stats((-1, -1), "none")
+        if self.pondering:
+            return self.finish_stats(self.background_search(game))
+        # Play book moves without searching
+        if self.book is not None:
+            book_move = self.book.lookup(game)
+            if book_move in game.get_legal_moves():
+                return self.finish_stats(book_move, "book")
+        # Play proven wins and losses immediately once the players are
+        # partitioned
+        if self.endgame is not None:
+            solved_move = self.solve_endgame(game)
+            if solved_move is not None:
+                return self.finish_stats(solved_move, "endgame")
+        if self.workers > 1:
+            return self.finish_stats(self.parallel_search(game))
+
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
         best_move = game.get_legal_moves()[0]
 
+        self.time_manager.start(self.time_left)
         try:
             # The try/except block will automatically catch the exception
             # raised when the timer is about to expire.
@@ -365,15 +751,27 @@ class AlphaBetaPlayer(IsolationPlayer):
             depth = 1
             # Increase depth until time runs out
             while True:
-                best_move = self.alphabeta(game, depth)
+                if self.aspiration is not None and depth > 1:
+                    best_move = self.aspiration_search(game, depth)
+                else:
+                    best_move = self.alphabeta(game, depth)
+                if self.move_ordering is not None:
+                    self.move_ordering.end_iteration()
+                self.stats.end_iteration(depth)
+                self.time_manager.end_iteration(self.stats.iteration_nodes[-1])
+                # Stop early rather than start an iteration that cannot
+                # finish before the deadline
+                if not self.time_manager.should_start():
+                    break
                 depth += 1
             #return self.alphabeta(game, self.search_depth)
 
         except SearchTimeout:
-            pass  # Handle any actions required after timeout as needed
+            self.stats.timed_out = True
+        self.time_manager.finish()
 
         # Return the best move from the last completed search iteration
-        return best_move
+        return self.finish_stats(best_move)
 
     def alphabeta(self, game, depth, alpha=float("-inf"), beta=float("inf")):
         """Implement depth-limited minimax search with alpha-beta pruning as
@@ -420,10 +818,13 @@ class AlphaBetaPlayer(IsolationPlayer):
                 each helper function or else your agent will timeout during
                 testing.
         """
-        if self.time_left() < self.TIMER_THRESHOLD:
+        if self.time_left.expired(self.TIMER_THRESHOLD):
             raise SearchTimeout()
+        self.stats.nodes += 1
 
-
+        self.root_depth = depth
+        if self.move_ordering is not None:
+            self.move_ordering.start_node(0)
 
         # TODO: finish this function!
         # Test interface with random legal move selection
@@ -435,44 +836,330 @@ class AlphaBetaPlayer(IsolationPlayer):
         if depth == 0:
             return (-1, -1)
 
+        # Order the moves so the best move of the previous iteration, if
+        # any, is searched first
+        alpha_orig = alpha
+        key, entry = self.tt_probe(game, MAX_NODE_SALT)
+        legal_moves = self.order_moves(game, depth, entry, True)
+        if self.root_moves is not None:
+            legal_moves = [move for move in legal_moves if move in self.root_moves]
+        leaf_values = self.frontier_values(game, legal_moves, depth)
+
         # Set baseline values for score and move
         best_score = float('-inf')
-        best_move = game.get_legal_moves()[0]
+        best_move = legal_moves[0]
 
         # Do alpha beta search.
         # Code adapted from lecture mini project and minimax() above.
-        for move in game.get_legal_moves():
-            v = self.ab_min_value(game.forecast_move(move), depth - 1, alpha, beta)
+        for idx, move in enumerate(legal_moves):
+            if leaf_values is not None:
+                v = leaf_values[idx]
+            else:
+                v = self.search_move(self.ab_min_value, game, move,
+                                     depth - 1, alpha, beta, idx == 0, True)
             if v > best_score:
                 best_score = v
                 best_move = move
+                self.update_pv(game, depth, move)
             alpha = max(alpha, best_score)
+        self.root_value = best_score
+        # The value of a search restricted to some root moves is not the
+        # value of the position
+        if self.root_moves is None:
+            self.tt_store(key, depth, best_score, alpha_orig, beta, best_move)
         # Return optimal move
         return best_move
 
+    def parallel_search(self, game):
+        """Split the root moves of `game` among the worker processes and
+        return the best move of the deepest iteration that every worker
+        completed before the deadline (see `search_root_moves()`).
+
+        The workers search until `worker_deadline()`, with their own safety
+        margins, and their results are collected until half of the margin of
+        this player is left; moves of workers that have not answered by then
+        are ignored (if none answered, the move of `quick_move()` is
+        played).
+        """
+        legal_moves = game.get_legal_moves()
+        self.start_workers()
+
+        # Send the position without the player objects; each worker puts its
+        # own copy of this player in the seat of the active player
+        shared = game.copy_with_players("searcher", "opponent")
+        end = self.worker_deadline()
+        futures = [self._pool.submit(search_root_split, shared,
+                                     legal_moves[idx::self.workers], end)
+                   for idx in range(min(self.workers, len(legal_moves)))]
+        done = self.collect(futures)
+
+        results = []
+        for future in futures:
+            if future in done and future.result()[0]:
+                result, stats = future.result()
+                results.append(result)
+                self.stats.nodes += stats.nodes
+                self.stats.cutoffs += stats.cutoffs
+            else:
+                future.cancel()
+        if len(results) < len(futures):
+            self.stats.timed_out = True
+        if not results:
+            return self.quick_move(game)
+
+        self.root_depth = min(len(result) for result in results)
+        self.stats.depth = self.root_depth
+        self.root_value, best_move = max(
+            (result[self.root_depth - 1] for result in results),
+            key=lambda item: item[0])
+        return best_move
+
+    def search_root_moves(self, game, root_moves, time_left):
+        """Search `game` by iterative deepening, considering only the moves in
+        `root_moves` at the root, until the time runs out.
+
+        Returns
+        -------
+        list<(float, (int, int))>
+            The value and best move of every completed iteration, in order
+            of depth.
+        """
+        self.time_left = time_left
+        self.start_stats()
+        if self.tt is not None:
+            self.tt.new_search()
+        if self.move_ordering is not None:
+            self.move_ordering.new_search()
+
+        results = []
+        self.root_moves = root_moves
+        self.time_manager.start(self.time_left)
+        try:
+            # Deeper iterations than the number of blank cells cannot change
+            # the result
+            for depth in range(1, len(game.get_blank_spaces()) + 1):
+                best_move = self.alphabeta(game, depth)
+                results.append((self.root_value, best_move))
+                if self.move_ordering is not None:
+                    self.move_ordering.end_iteration()
+                self.stats.end_iteration(depth)
+                self.time_manager.end_iteration(self.stats.iteration_nodes[-1])
+                if not self.time_manager.should_start():
+                    break
+        except SearchTimeout:
+            self.stats.timed_out = True
+        finally:
+            self.root_moves = None
+        self.time_manager.finish()
+        return results
+
+    def solve_endgame(self, game):
+        """Return the move starting the longest path of the player if the
+        players are partitioned, or None otherwise (or if the solver cannot
+        finish within half of the time left, leaving the other half for the
+        heuristic search). Sets `root_value` to the proven outcome.
+        """
+        budget = max(self.TIMER_THRESHOLD, self.time_left() / 2)
+
+        def check_time():
+            if self.time_left.expired(budget):
+                raise SearchTimeout()
+
+        try:
+            solution = self.endgame.solve(game, self, check_time)
+        except SearchTimeout:
+            return None
+        if solution is None or solution[0] is None:
+            return None
+        move, own_length, opp_length = solution
+        self.root_value = float("inf") if own_length > opp_length else float("-inf")
+        return move
+
+    def aspiration_search(self, game, depth):
+        """Search the root with an aspiration window around the value of the
+        previous iteration, widening the failing side of the window (by a
+        factor of four each time) until the root value falls inside it.
+
+        Returns
+        -------
+        (int, int)
+            The best move found by `alphabeta`.
+        """
+        previous = self.root_value
+        if (self.aspiration is None or previous is None or
+                abs(previous) == float("inf")):
+            return self.alphabeta(game, depth)
+
+        delta = self.aspiration
+        alpha, beta = previous - delta, previous + delta
+        while True:
+            best_move = self.alphabeta(game, depth, alpha, beta)
+            if self.root_value <= alpha and alpha > float("-inf"):
+                delta *= 4
+                alpha = self.root_value - delta
+            elif self.root_value >= beta and beta < float("inf"):
+                delta *= 4
+                beta = self.root_value + delta
+            else:
+                return best_move
+            if delta > 64 * self.aspiration:
+                alpha, beta = float("-inf"), float("inf")
+
+    def search_move(self, search_fn, game, move, depth, alpha, beta,
+                    first, maximizing):
+        """Return the value of the child of `game` reached by `move`.
+
+        In "pvs" mode every move except the first one is searched with a null
+        window at the bound of the current node (alpha at max nodes, beta at
+        min nodes), and only re-searched with the full window if it is
+        better than the best move so far without causing a cutoff. Moves are
+        searched with the full window while the bound is still infinite.
+        """
+        bound = alpha if maximizing else beta
+        if self.search_mode != "pvs" or first or abs(bound) == float("inf"):
+            return self.search_child(search_fn, game, move, depth, alpha, beta)
+        if maximizing:
+            null_alpha, null_beta = alpha, float(np.nextafter(alpha, np.inf))
+        else:
+            null_alpha, null_beta = float(np.nextafter(beta, -np.inf)), beta
+        v = self.search_child(search_fn, game, move, depth, null_alpha,
+                              null_beta)
+        if alpha < v < beta:
+            v = self.search_child(search_fn, game, move, depth, alpha, beta)
+        return v
+
+    def frontier_values(self, game, moves, depth):
+        """Return the values of the children of `game` reached by `moves`,
+        scored in one call to `batch_score_fn`, if they lie on the search
+        horizon; otherwise (or without a batch function) return None.
+        """
+        if self.batch_score_fn is None or depth != 1:
+            return None
+        if self.move_ordering is not None:
+            self.move_ordering.start_node(self.root_depth - depth + 1)
+        self.stats.nodes += len(moves)
+        batch = PositionBatch.children(game, moves, self)
+        return self.batch_score_fn(batch).tolist()
+
+    def tt_probe(self, game, salt=0):
+        """Look up the position in the transposition table.
+
+        Returns
+        -------
+        (int, `transposition.TTEntry`)
+            The table key of the position (None if the table is disabled) and
+            the entry stored for it (None if there is no entry).
+        """
+        if self.tt is None:
+            return None, None
+        key = game.hash() ^ salt
+        return key, self.tt.probe(key)
+
+    def tt_store(self, key, depth, value, alpha, beta, move):
+        """Record a searched node in the transposition table, classifying the
+        value as exact or as a bound from the (alpha, beta) search window.
+        """
+        if key is None:
+            return
+        if value <= alpha:
+            flag = UPPER
+        elif value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, value, flag, move)
+
+    def order_moves(self, game, depth, entry, maximizing):
+        """Return the legal moves of the active player in `game`, ordered by
+        the move ordering engine if the player has one. Otherwise only the
+        best move stored in the transposition table `entry` (if any) is moved
+        to the front.
+        """
+        legal_moves = game.get_legal_moves()
+        tt_move = entry.move if entry is not None else None
+        if self.move_ordering is not None:
+            return self.move_ordering.order(game, legal_moves,
+                                            self.root_depth - depth, tt_move,
+                                            maximizing)
+        if tt_move in legal_moves:
+            legal_moves.remove(tt_move)
+            legal_moves.insert(0, tt_move)
+        return legal_moves
+
+    def update_pv(self, game, depth, move):
+        """Record `move` as the best move found so far at the node `game`. """
+        if self.move_ordering is not None:
+            self.move_ordering.update_pv(self.root_depth - depth, game.hash(),
+                                         move)
+
+    def record_cutoff(self, depth, move, maximizing):
+        """Inform the move ordering engine that `move` caused a cutoff. """
+        self.stats.cutoffs += 1
+        if self.move_ordering is not None:
+            self.move_ordering.record_cutoff(move, self.root_depth - depth,
+                                             depth, maximizing)
+
+    @staticmethod
+    def tt_cutoff(entry, depth, alpha, beta):
+        """Return the stored value if a transposition table entry searched to
+        at least `depth` plies decides the node within the (alpha, beta)
+        window, or None otherwise.
+        """
+        if entry is None or entry.depth < depth:
+            return None
+        if entry.flag == EXACT:
+            return entry.value
+        if entry.flag == LOWER and entry.value >= beta:
+            return entry.value
+        if entry.flag == UPPER and entry.value <= alpha:
+            return entry.value
+        return None
+
 
     def ab_min_value(self, game, depth, alpha, beta):
         """Returns score using self.score() if depth = 0. Otherwise returns
         minimum value using alpha-beta pruning.
         """
         # Check for timer timeout
-        if self.time_left() < self.TIMER_THRESHOLD:
+        if self.time_left.expired(self.TIMER_THRESHOLD):
             raise SearchTimeout()
+        self.stats.nodes += 1
+        if self.move_ordering is not None:
+            self.move_ordering.start_node(self.root_depth - depth)
         # Check legal moves:
         if not game.get_legal_moves():
             return (self.score(game, self))
         # Check for node depth
         if depth == 0:
             return (self.score(game, self))
+        # Reuse the result of an earlier search of this position if possible
+        key, entry = self.tt_probe(game)
+        cached = self.tt_cutoff(entry, depth, alpha, beta)
+        if cached is not None:
+            return cached
+        alpha_orig, beta_orig = alpha, beta
         # Define basline value
         v = float('inf')
+        best_move = None
         # Iterate through moves and find optimal value
-        for move in game.get_legal_moves():
-            v = min(v, self.ab_max_value(game.forecast_move(move),
-                    depth - 1, alpha, beta))
+        legal_moves = self.order_moves(game, depth, entry, False)
+        leaf_values = self.frontier_values(game, legal_moves, depth)
+        for idx, move in enumerate(legal_moves):
+            if leaf_values is not None:
+                child_v = leaf_values[idx]
+            else:
+                child_v = self.search_move(self.ab_max_value, game, move,
+                                           depth - 1, alpha, beta,
+                                           best_move is None, False)
+            if best_move is None or child_v < v:
+                v, best_move = child_v, move
+                if v < beta:
+                    self.update_pv(game, depth, move)
             if v <= alpha:
-                return v
+                self.record_cutoff(depth, move, False)
+                break
             beta = min(beta, v)
+        self.tt_store(key, depth, v, alpha_orig, beta_orig, best_move)
         # Return value
         return v
 
@@ -481,22 +1168,150 @@ class AlphaBetaPlayer(IsolationPlayer):
         maximum value using alpha-beta pruning.
         """
         # Check for timer timeout
-        if self.time_left() < self.TIMER_THRESHOLD:
+        if self.time_left.expired(self.TIMER_THRESHOLD):
             raise SearchTimeout()
+        self.stats.nodes += 1
+        if self.move_ordering is not None:
+            self.move_ordering.start_node(self.root_depth - depth)
         # Check legal moves
         if not game.get_legal_moves():
             return (self.score(game, self))
         # Check for node depth
         if depth == 0:
             return (self.score(game, self))
+        # Reuse the result of an earlier search of this position if possible
+        key, entry = self.tt_probe(game, MAX_NODE_SALT)
+        cached = self.tt_cutoff(entry, depth, alpha, beta)
+        if cached is not None:
+            return cached
+        alpha_orig, beta_orig = alpha, beta
         # Define basline value
         v = float('-inf')
+        best_move = None
         # Iterate through moves and find optimal value
-        for move in game.get_legal_moves():
-            v = max(v, self.ab_min_value(game.forecast_move(move),
-                    depth - 1, alpha, beta))
+        legal_moves = self.order_moves(game, depth, entry, True)
+        leaf_values = self.frontier_values(game, legal_moves, depth)
+        for idx, move in enumerate(legal_moves):
+            if leaf_values is not None:
+                child_v = leaf_values[idx]
+            else:
+                child_v = self.search_move(self.ab_min_value, game, move,
+                                           depth - 1, alpha, beta,
+                                           best_move is None, True)
+            if best_move is None or child_v > v:
+                v, best_move = child_v, move
+                if v > alpha:
+                    self.update_pv(game, depth, move)
             if v >= beta:
-                return v
+                self.record_cutoff(depth, move, True)
+                break
             alpha = max(alpha, v)
+        self.tt_store(key, depth, v, alpha_orig, beta_orig, best_move)
         # Return value
         return v
+
+
+# The player searching in a worker process of the parallel root search; set
+# once per process by the pool initializer
+_root_worker = None
+
+
+def init_root_worker(player):
+    """Initialize a worker process of `AlphaBetaPlayer.parallel_search()`. """
+    global _root_worker
+    _root_worker = player
+    _root_worker.workers = 1
+
+
+def warm_up_worker():
+    """Measure the scheduling jitter of a worker of the parallel root search
+    (which would otherwise be measured during its first move) and return the
+    process id after a short pause, so that each worker takes one of a batch
+    of these tasks (see `AlphaBetaPlayer.start_workers()`).
+    """
+    measure_jitter()
+    time.sleep(WARM_UP_PAUSE)
+    return os.getpid()
+
+
+def search_root_split(game, root_moves, end):
+    """Search the share `root_moves` of the root moves of `game` in a worker
+    process until the time `end` (see `AlphaBetaPlayer.worker_deadline()`);
+    see `AlphaBetaPlayer.search_root_moves()`.
+    """
+    player = _root_worker
+    player.TIMER_THRESHOLD = player.time_manager.margin
+    game = game.copy_with_players(player, game.inactive_player)
+    results = player.search_root_moves(
+        game, root_moves, Deadline(1000 * (end - timeit.default_timer())))
+    return results, player.stats
+
+
+# The stop signal of the pondering search in a pondering worker process, and
+# the (position hash, best move) of the last position it pondered
+_ponder_stop = None
+_ponder_result = None
+
+
+def init_ponder_worker(player, stop_event):
+    """Initialize the worker process of a pondering `AlphaBetaPlayer`. """
+    global _ponder_stop
+    init_root_worker(player)
+    _root_worker.pondering = False
+    _ponder_stop = stop_event
+
+
+class PonderDeadline(Deadline):
+    """Timer of the pondering search: infinite until `stop_pondering()` sets
+    the stop event, which `expired()` checks at every call (an `Event` is
+    read in about a microsecond) so that the search stops at once.
+    """
+
+    def __init__(self, stop_event):
+        super().__init__(float("inf"))
+        self._stop = stop_event
+
+    def __call__(self):
+        return 0. if self._stop.is_set() else float("inf")
+
+    def expired(self, margin):
+        return self._stop.is_set()
+
+
+def ponder_position(game):
+    """Ponder in the worker process: play the predicted reply of the
+    opponent (active in `game`) and search the resulting position until
+    `stop_pondering()` is called.
+    """
+    global _ponder_result
+    player = _root_worker
+    game = game.copy_with_players(game.active_player, player)
+    game.apply_move(player.predict_reply(game))
+    _ponder_result = None
+    if _ponder_stop.is_set() or not game.get_legal_moves():
+        return
+
+    player.root_depth = 0
+    move = player.get_move(game, PonderDeadline(_ponder_stop))
+    # Keep the result only if at least one iteration of the search was
+    # completed (or the move came from the opening book or endgame solver)
+    if player.root_depth != 1:
+        _ponder_result = (game.hash(), move, player.last_stats)
+
+
+def search_position(game, end):
+    """Return the best move in `game` for the player of the worker process
+    before the time `end`, whether the position was the one pondered (in
+    which case the pondered move is returned at once), and the `SearchStats`
+    of the search that found the move.
+
+    `end` is a `timeit.default_timer()` reading of the main process; the
+    clock is system-wide and monotonic, so it is comparable between
+    processes.
+    """
+    player = _root_worker
+    game = game.copy_with_players(player, game.inactive_player)
+    if _ponder_result is not None and _ponder_result[0] == game.hash():
+        return _ponder_result[1], True, _ponder_result[2]
+    move = player.get_move(game, Deadline(1000 * (end - timeit.default_timer())))
+    return move, False, player.last_stats
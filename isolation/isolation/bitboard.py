@@ -0,0 +1,363 @@
+"""
+This file contains the `BitBoard` class, an alternative engine for the game
+Isolation that is a drop-in replacement for `isolation.Board`.
+
+Instead of a Python list of cell values, the occupied cells are stored as the
+bits of a single integer, and the knight moves available from every cell are
+precomputed once per (width, height) as attack masks.  Generating the legal
+moves of a player is then a handful of bitwise tests against the occupancy
+mask rather than eight bounds checks and list lookups.
+"""
+from itertools import compress
+
+from .isolation import Board, DIRECTIONS, NO_CELL
+from .symmetry import symmetry_table
+from .zobrist import zobrist_keys
+
+# Precomputed move tables shared by every board of the same dimensions,
+# keyed by (width, height)
+_KNIGHT_TABLES = {}
+
+
+class KnightTable(object):
+    """Knight-move lookup tables for a board of fixed dimensions.
+
+    Cells are indexed exactly like `Board._board_state`, i.e., the cell at
+    (row, column) has index ``row + column * height``.
+
+    Attributes
+    ----------
+    cells : list<(int, int)>
+        The (row, column) coordinate pair of every cell index
+
+    masks : list<int>
+        Bitmask of the cells reachable by a knight from every cell index
+
+    targets : list<list<(int, (int, int))>>
+        The (bit, (row, column)) pairs reachable by a knight from every cell
+        index; used to build legal move lists without decoding bits
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.full = (1 << (width * height)) - 1
+        self.cells = [(i % height, i // height) for i in range(width * height)]
+        self.masks = []
+        self.targets = []
+        for r, c in self.cells:
+            pairs = [(1 << (r + dr + (c + dc) * height), (r + dr, c + dc))
+                     for dr, dc in DIRECTIONS
+                     if 0 <= r + dr < height and 0 <= c + dc < width]
+            self.targets.append(pairs)
+            self.masks.append(sum(bit for bit, _ in pairs))
+
+
+def knight_table(width, height):
+    """Return the (cached) `KnightTable` for a board of the given size. """
+    table = _KNIGHT_TABLES.get((width, height))
+    if table is None:
+        table = _KNIGHT_TABLES[(width, height)] = KnightTable(width, height)
+    return table
+
+
+def reachable_mask(table, loc, free):
+    """Return the bitmask of the cells in the bitmask `free` reachable by a
+    sequence of knight moves through `free` from the cell index `loc`.
+    """
+    masks = table.masks
+    reachable = 0
+    frontier = masks[loc] & free
+    while frontier:
+        reachable |= frontier
+        spread = 0
+        while frontier:
+            low = frontier & -frontier
+            spread |= masks[low.bit_length() - 1]
+            frontier ^= low
+        frontier = spread & free & ~reachable
+    return reachable
+
+
+class BitBoard(Board):
+    """Implement a model for the game Isolation assuming each player moves like
+    a knight in chess, storing the occupied cells in an integer bitmask.
+
+    The public interface is identical to `isolation.Board`; the only
+    observable difference is that `get_legal_moves()` returns moves in a
+    fixed order instead of shuffling them.
+
+    Parameters
+    ----------
+    player_1 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    player_2 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    width : int (optional)
+        The number of columns that the board should have.
+
+    height : int (optional)
+        The number of rows that the board should have.
+    """
+
+    __slots__ = ("_occupied", "_table")
+
+    def __init__(self, player_1, player_2, width=7, height=7):
+        self.width = width
+        self.height = height
+        self.move_count = 0
+        self._player_1 = player_1
+        self._player_2 = player_2
+        self._active_player = player_1
+        self._inactive_player = player_2
+
+        # Cell indices of the last move of player 1 and player 2 (in that
+        # order, NO_CELL if the player has not moved), and the bitmask of
+        # every blocked cell on the board
+        self._locations = [NO_CELL, NO_CELL]
+        self._occupied = 0
+        self._table = knight_table(width, height)
+
+        # Stack of (previous last move, previous occupancy, previous hash)
+        # for pop_move()
+        self._undo_stack = []
+
+        self._zobrist = zobrist_keys(width, height)
+        self._hash = 0
+
+    def copy(self):
+        """ Return a deep copy of the current board. """
+        new_board = BitBoard.__new__(BitBoard)
+        new_board.width = self.width
+        new_board.height = self.height
+        new_board.move_count = self.move_count
+        new_board._player_1 = self._player_1
+        new_board._player_2 = self._player_2
+        new_board._active_player = self._active_player
+        new_board._inactive_player = self._inactive_player
+        new_board._locations = self._locations[:]
+        new_board._occupied = self._occupied
+        new_board._table = self._table
+        new_board._undo_stack = []
+        new_board._zobrist = self._zobrist
+        new_board._hash = self._hash
+        return new_board
+
+    def move_is_legal(self, move):
+        """Test whether a move is legal in the current game state.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+
+        Returns
+        -------
+        bool
+            Returns True if the move is legal, False otherwise
+        """
+        return (0 <= move[0] < self.height and 0 <= move[1] < self.width and
+                not self._occupied >> (move[0] + move[1] * self.height) & 1)
+
+    def get_blank_spaces(self):
+        """Return a list of the locations that are still available on the board.
+        """
+        return list(compress(self._table.cells,
+                             map('0'.__eq__, self._bits(self._occupied))))
+
+    def get_player_location(self, player):
+        """Find the current location of the specified player on the board.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game.
+
+        Returns
+        -------
+        (int, int) or None
+            The coordinate pair (row, column) of the input player, or None
+            if the player has not moved.
+        """
+        if player == self._player_1:
+            idx = self._locations[0]
+        elif player == self._player_2:
+            idx = self._locations[1]
+        else:
+            raise RuntimeError(
+                "Invalid player in get_player_location: {}".format(player))
+        if idx < 0:
+            return Board.NOT_MOVED
+        return self._table.cells[idx]
+
+    def get_legal_moves(self, player=None):
+        """Return the list of all legal moves for the specified player.
+
+        Parameters
+        ----------
+        player : object (optional)
+            An object registered as a player in the current game. If None,
+            return the legal moves for the active player on the board.
+
+        Returns
+        -------
+        list<(int, int)>
+            The list of coordinate pairs (row, column) of all legal moves
+            for the player constrained by the current game state.
+        """
+        loc = self._location_of(player)
+        if loc < 0:
+            return self.get_blank_spaces()
+        occupied = self._occupied
+        return [move for bit, move in self._table.targets[loc]
+                if not occupied & bit]
+
+    def mobility(self, player=None):
+        """Return the number of legal moves of the specified player (see
+        `Board.mobility`). Counting the bits of a mask is cheaper than a cache
+        lookup here, so nothing is cached.
+        """
+        loc = self._location_of(player)
+        if loc < 0:
+            return bin(~self._occupied & self._table.full).count("1")
+        return bin(self._table.masks[loc] & ~self._occupied).count("1")
+
+    def get_reachable_cells(self, player):
+        """Return the set of blank cells that the specified player could still
+        reach by a sequence of knight moves through blank cells (see
+        `Board.get_reachable_cells`).
+        """
+        loc = self._location_of(player)
+        if loc < 0:
+            return set(self.get_blank_spaces())
+        return set(compress(self._table.cells,
+                            map('1'.__eq__, self._bits(self.reachable_mask(loc)))))
+
+    def is_partitioned(self):
+        """Test whether both players have moved and can no longer reach any
+        common cell (see `Board.is_partitioned`).
+        """
+        loc_1, loc_2 = self._locations
+        if loc_1 < 0 or loc_2 < 0:
+            return False
+        return not self.reachable_mask(loc_1) & self.reachable_mask(loc_2)
+
+    def reachable_mask(self, loc):
+        """Return the bitmask of blank cells reachable by a sequence of knight
+        moves through blank cells from the cell index `loc`.
+        """
+        return reachable_mask(self._table, loc, ~self._occupied & self._table.full)
+
+    def apply_move(self, move):
+        """Move the active player to a specified location.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        idx = move[0] + move[1] * self.height
+        player_idx = self.move_count & 1
+        self._hash ^= self._zobrist.move_delta(
+            player_idx, self._locations[player_idx], idx)
+        self._locations[player_idx] = idx
+        self._occupied |= 1 << idx
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self.move_count += 1
+
+    def push_move(self, move):
+        """Apply a move in-place like `apply_move`, but remember enough of the
+        previous state that `pop_move` can restore it exactly.
+        """
+        self._undo_stack.append((self._locations[self.move_count & 1],
+                                 self._occupied, self._hash))
+        self.apply_move(move)
+
+    def pop_move(self):
+        """Undo the most recent move applied with `push_move`. """
+        self.move_count -= 1
+        (self._locations[self.move_count & 1], self._occupied,
+         self._hash) = self._undo_stack.pop()
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+
+    def is_winner(self, player):
+        """ Test whether the specified player has won the game. """
+        return player == self._inactive_player and not self._has_moves()
+
+    def is_loser(self, player):
+        """ Test whether the specified player has lost the game. """
+        return player == self._active_player and not self._has_moves()
+
+    def utility(self, player):
+        """Returns the utility of the current game state from the perspective
+        of the specified player (see `Board.utility`).
+        """
+        if not self._has_moves():
+
+            if player == self._inactive_player:
+                return float("inf")
+
+            if player == self._active_player:
+                return float("-inf")
+
+        return 0.
+
+    def transformed(self, transform):
+        """Return a copy of the current state transformed by the symmetry with
+        index `transform` (see `Board.canonical`).
+        """
+        table = symmetry_table(self.width, self.height)
+        cell_map = table.cell_maps[transform]
+        blocked = self._blocked_indices()
+        new_board = self.copy()
+        new_board._occupied = sum(1 << cell_map[idx] for idx in blocked)
+        new_board._locations = [cell_map[loc] if loc >= 0 else NO_CELL
+                                for loc in self._locations]
+        new_board._hash = self._transformed_hash(
+            table, transform, blocked, self._locations)
+        return new_board
+
+    def _blocked_indices(self):
+        """Return the list of the cell indices of the blocked cells. """
+        return list(compress(range(len(self._table.cells)),
+                             map('1'.__eq__, self._bits(self._occupied))))
+
+    def _cell_chars(self, symbols):
+        """Return the character drawn by `to_string` for every cell index (see
+        `Board._cell_chars`).
+        """
+        chars = [' ' if bit == '0' else '-' for bit in self._bits(self._occupied)]
+        for loc, symbol in zip(self._locations, symbols):
+            if loc >= 0:
+                chars[loc] = symbol
+        return chars
+
+    def _bits(self, mask):
+        """Return the cell bitmask `mask` as a string of '0' and '1'
+        characters, one per cell index, in a single conversion rather than
+        one shift of the whole mask per cell.
+        """
+        return format(mask, "0{}b".format(len(self._table.cells)))[::-1]
+
+    def _location_of(self, player):
+        """Return the cell index of the specified player (default: the active
+        player), or NO_CELL.
+        """
+        if player is None or player == self._active_player:
+            return self._locations[self.move_count & 1]
+        if player == self._inactive_player:
+            return self._locations[(self.move_count & 1) ^ 1]
+        raise RuntimeError(
+            "Invalid player in get_legal_moves: {}".format(player))
+
+    def _has_moves(self):
+        """Test whether the active player has at least one legal move. """
+        loc = self._locations[self.move_count & 1]
+        if loc < 0:
+            return self._occupied != self._table.full
+        return bool(self._table.masks[loc] & ~self._occupied)
@@ -0,0 +1,92 @@
+"""
+This file contains the `Deadline` class, the move timer handed to players by
+`Board.play()`.
+
+A `Deadline` is a drop-in replacement for the `time_left` callable: calling
+it returns the number of milliseconds left in the current turn.  Search
+agents that check the timer at every node can instead call `expired()`,
+which only reads the clock every N calls.  N is calibrated on the fly from
+the measured time between calls, so that the time elapsed between two clock
+reads stays a small fraction of the agent's safety margin.
+"""
+import timeit
+
+# Upper bound on the number of calls to expired() between two clock reads
+MAX_INTERVAL = 1024
+
+
+class Deadline(object):
+    """Countdown timer for a single turn.
+
+    Parameters
+    ----------
+    time_limit : numeric
+        The number of milliseconds until the deadline, starting now.
+
+    max_gap : float (optional)
+        The largest fraction of the safety margin passed to `expired()` that
+        may elapse between two consecutive clock reads.
+    """
+
+    def __init__(self, time_limit, max_gap=0.25):
+        self._end = timeit.default_timer() + time_limit / 1000.
+        self._source = None
+        self._max_gap = max_gap
+        self._interval = 1
+        self._countdown = 1
+        self._last_left = None
+        self._per_call = 0.
+
+    @classmethod
+    def wrap(cls, time_left, max_gap=0.25):
+        """Return a `Deadline` reading the remaining time from an arbitrary
+        `time_left` callable (returned unchanged if it is already a
+        `Deadline`).
+        """
+        if isinstance(time_left, Deadline):
+            return time_left
+        deadline = cls(0, max_gap)
+        deadline._source = time_left
+        return deadline
+
+    def __call__(self):
+        """Return the number of milliseconds left before the deadline. """
+        if self._source is not None:
+            return self._source()
+        return 1000 * (self._end - timeit.default_timer())
+
+    def expired(self, margin):
+        """Test whether less than `margin` milliseconds will be left by the
+        time the clock is read again.
+
+        Only every N-th call reads the clock; the others return False
+        immediately.
+
+        Parameters
+        ----------
+        margin : numeric
+            The safety margin (in milliseconds) the caller needs to return
+            before the deadline.
+
+        Returns
+        -------
+        bool
+            True if the caller should stop and return now.
+        """
+        self._countdown -= 1
+        if self._countdown > 0:
+            return False
+
+        time_left = self()
+        if self._last_left is not None and self._last_left > time_left:
+            self._per_call = (self._last_left - time_left) / self._interval
+        self._last_left = time_left
+
+        # Grow the interval at most twofold per read, so a bad estimate of
+        # the time per call is corrected before it can overshoot the margin
+        interval = self._interval * 2
+        if self._per_call > 0:
+            interval = min(interval, int(self._max_gap * margin / self._per_call))
+        self._interval = self._countdown = max(1, min(interval, MAX_INTERVAL))
+
+        return time_left < margin + self._interval * self._per_call
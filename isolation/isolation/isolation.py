@@ -8,11 +8,63 @@ remain compatible with the defaults provided, and none of your changes will
 be available to project reviewers.
 """
 import random
-import timeit
-from copy import copy
+from functools import reduce
+from itertools import compress
+from operator import xor
+
+from .deadline import Deadline
+from .symmetry import TRANSFORMS, symmetry_table
+from .zobrist import zobrist_keys
 
 TIME_LIMIT_MILLIS = 150
 
+# (row, column) offsets of the eight knight moves
+DIRECTIONS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+              (1, -2), (1, 2), (2, -1), (2, 1)]
+
+# Cell index stored in place of the location of a player that has not moved
+# yet (`Board.NOT_MOVED` in the public interface)
+NO_CELL = -1
+
+# Translation table of `bytes.translate` mapping the cell values of a board
+# state (blank 0, blocked 1) to truth values of blankness
+_BLANK_CELLS = bytes.maketrans(b"\x00\x01", b"\x01\x00")
+
+# Mobility cache of a state whose move counts are not known yet
+_NO_MOBILITY = (None, None)
+
+# Lookup tables shared by every board of the same dimensions, keyed by
+# (width, height)
+_BOARD_TABLES = {}
+
+
+class BoardTables(object):
+    """Lookup tables for a board of fixed dimensions, indexed by cell index
+    like `Board._board_state`.
+
+    Attributes
+    ----------
+    cells : list<(int, int)>
+        The (row, column) coordinate pair of every cell index
+
+    knight_moves : list<list<int>>
+        The cell indices a knight can move to from every cell index
+    """
+    def __init__(self, width, height):
+        self.cells = [(r, c) for c in range(width) for r in range(height)]
+        self.knight_moves = [[r + dr + (c + dc) * height
+                              for dr, dc in DIRECTIONS
+                              if 0 <= r + dr < height and 0 <= c + dc < width]
+                             for r, c in self.cells]
+
+
+def board_tables(width, height):
+    """Return the (cached) `BoardTables` for a board of the given size. """
+    tables = _BOARD_TABLES.get((width, height))
+    if tables is None:
+        tables = _BOARD_TABLES[(width, height)] = BoardTables(width, height)
+    return tables
+
 
 class Board(object):
     """Implement a model for the game Isolation assuming each player moves like
@@ -37,6 +89,13 @@ class Board(object):
     BLANK = 0
     NOT_MOVED = None
 
+    # Millions of boards are created by copy() during a search, so their
+    # attributes are stored in slots rather than in a per-instance dict
+    __slots__ = ("width", "height", "move_count", "_player_1", "_player_2",
+                 "_active_player", "_inactive_player", "_board_state",
+                 "_locations", "_undo_stack", "_mobility", "_blank_count",
+                 "_tables", "_zobrist", "_hash")
+
     def __init__(self, player_1, player_2, width=7, height=7):
         self.width = width
         self.height = height
@@ -46,14 +105,100 @@ class Board(object):
         self._active_player = player_1
         self._inactive_player = player_2
 
-        # The last 3 entries of the board state includes initiative (0 for
-        # player 1, 1 for player 2) player 2 last move, and player 1 last move
-        self._board_state = [Board.BLANK] * (width * height + 3)
-        self._board_state[-1] = Board.NOT_MOVED
-        self._board_state[-2] = Board.NOT_MOVED
+        # One byte per cell index, BLANK or 1 for a blocked cell, and the
+        # cell indices of the last move of player 1 and player 2 (in that
+        # order, NO_CELL if the player has not moved). Both are the whole
+        # state copied by copy(); the locations are an immutable tuple that
+        # copies share until one of them moves.
+        self._board_state = bytearray(width * height)
+        self._locations = (NO_CELL, NO_CELL)
+
+        # Stack of (cell index, previous locations, previous hash) for
+        # pop_move()
+        self._undo_stack = []
+
+        # Number of legal moves of player 1 and player 2 (in that order) in
+        # the current state, computed on demand by mobility() and cleared by
+        # every move, and the number of blank cells, updated by every move
+        self._mobility = _NO_MOBILITY
+        self._blank_count = width * height
+        self._tables = board_tables(width, height)
+
+        # Zobrist key of the current state, updated incrementally by
+        # apply_move() and pop_move()
+        self._zobrist = zobrist_keys(width, height)
+        self._hash = 0
 
     def hash(self):
-        return str(self._board_state).__hash__()
+        return self._hash
+
+    def canonical(self):
+        """Return the canonical key of the current state and the symmetry
+        that maps the state to its canonical form.
+
+        The key is the smallest `hash()` among the copies of the state
+        transformed by every rotation and reflection of the board (see
+        isolation/symmetry.py), so all symmetric positions share it. Moves
+        of this state are mapped to the canonical form with
+        `transform_move(move, transform)` and back with
+        `transform_move(move, transform, inverse=True)`.
+
+        Returns
+        -------
+        (int, int)
+            The canonical key and the index of the symmetry (in
+            `symmetry.TRANSFORMS`) that produces it.
+        """
+        table = symmetry_table(self.width, self.height)
+        blocked = self._blocked_indices()
+        locations = self._locations
+        best_key, best_transform = None, 0
+        for transform in table.transforms:
+            key = self._transformed_hash(table, transform, blocked, locations)
+            if best_key is None or key < best_key:
+                best_key, best_transform = key, transform
+        return best_key, best_transform
+
+    def transform_move(self, move, transform, inverse=False):
+        """Return the image of `move` (or of any cell) under the symmetry with
+        index `transform`, or under its inverse if `inverse` is True.
+        """
+        if inverse:
+            transform = symmetry_table(self.width, self.height).inverse[transform]
+        return TRANSFORMS[transform](move[0], move[1], self.height, self.width)
+
+    def transformed(self, transform):
+        """Return a copy of the current state transformed by the symmetry with
+        index `transform` (see `canonical`).
+        """
+        table = symmetry_table(self.width, self.height)
+        cell_map = table.cell_maps[transform]
+        new_board = self.copy()
+        blocked = self._blocked_indices()
+        state = new_board._board_state = bytearray(len(self._board_state))
+        for idx in blocked:
+            state[cell_map[idx]] = 1
+        new_board._locations = tuple(cell_map[loc] if loc >= 0 else NO_CELL
+                                     for loc in self._locations)
+        new_board._hash = self._transformed_hash(
+            table, transform, blocked, self._locations)
+        return new_board
+
+    def _transformed_hash(self, table, transform, blocked, locations):
+        """Return the hash of the state transformed by a symmetry, given the
+        cell indices of the blocked cells and of the players.
+        """
+        cell_keys = table.cell_keys[transform]
+        key = reduce(xor, map(cell_keys.__getitem__, blocked),
+                     table.side if self.move_count & 1 else 0)
+        for player_keys, loc in zip(table.player_keys[transform], locations):
+            if loc >= 0:
+                key ^= player_keys[loc]
+        return key
+
+    def _blocked_indices(self):
+        """Return the list of the cell indices of the blocked cells. """
+        return list(compress(range(len(self._board_state)), self._board_state))
 
     @property
     def active_player(self):
@@ -92,11 +237,40 @@ class Board(object):
 
     def copy(self):
         """ Return a deep copy of the current board. """
-        new_board = Board(self._player_1, self._player_2, width=self.width, height=self.height)
+        # Bypass __init__, which would build a blank board state only for it
+        # to be replaced; the cells are the only buffer copied, every other
+        # attribute is immutable or shared
+        new_board = Board.__new__(Board)
+        new_board.width = self.width
+        new_board.height = self.height
         new_board.move_count = self.move_count
+        new_board._player_1 = self._player_1
+        new_board._player_2 = self._player_2
         new_board._active_player = self._active_player
         new_board._inactive_player = self._inactive_player
-        new_board._board_state = copy(self._board_state)
+        new_board._board_state = self._board_state[:]
+        new_board._locations = self._locations
+        new_board._undo_stack = []
+        new_board._mobility = self._mobility
+        new_board._blank_count = self._blank_count
+        new_board._tables = self._tables
+        new_board._zobrist = self._zobrist
+        new_board._hash = self._hash
+        return new_board
+
+    def copy_with_players(self, active_player, inactive_player):
+        """Return a copy of the current board where `active_player` and
+        `inactive_player` take the places of the current active and inactive
+        players (e.g., to send the position to another process without
+        pickling the player objects).
+        """
+        new_board = self.copy()
+        if self._active_player == self._player_1:
+            new_board._player_1, new_board._player_2 = active_player, inactive_player
+        else:
+            new_board._player_1, new_board._player_2 = inactive_player, active_player
+        new_board._active_player = active_player
+        new_board._inactive_player = inactive_player
         return new_board
 
     def forecast_move(self, move):
@@ -139,8 +313,10 @@ class Board(object):
     def get_blank_spaces(self):
         """Return a list of the locations that are still available on the board.
         """
-        return [(i, j) for j in range(self.width) for i in range(self.height)
-                if self._board_state[i + j * self.height] == Board.BLANK]
+        # Select the blank cells from the cell index table without a Python
+        # loop
+        return list(compress(self._tables.cells,
+                             self._board_state.translate(_BLANK_CELLS)))
 
     def get_player_location(self, player):
         """Find the current location of the specified player on the board.
@@ -157,19 +333,15 @@ class Board(object):
             if the player has not moved.
         """
         if player == self._player_1:
-            if self._board_state[-1] == Board.NOT_MOVED:
-                return Board.NOT_MOVED
-            idx = self._board_state[-1]
+            idx = self._locations[0]
         elif player == self._player_2:
-            if self._board_state[-2] == Board.NOT_MOVED:
-                return Board.NOT_MOVED
-            idx = self._board_state[-2]
+            idx = self._locations[1]
         else:
             raise RuntimeError(
                 "Invalid player in get_player_location: {}".format(player))
-        w = idx // self.height
-        h = idx % self.height
-        return (h, w)
+        if idx < 0:
+            return Board.NOT_MOVED
+        return self._tables.cells[idx]
 
     def get_legal_moves(self, player=None):
         """Return the list of all legal moves for the specified player.
@@ -190,6 +362,84 @@ class Board(object):
             player = self.active_player
         return self.__get_moves(self.get_player_location(player))
 
+    def mobility(self, player=None):
+        """Return the number of legal moves of the specified player, i.e.,
+        `len(self.get_legal_moves(player))`, without building (and shuffling)
+        the list of moves. The count is cached until the next move, so the
+        terminal tests and the heuristic of a leaf share a single count.
+
+        Parameters
+        ----------
+        player : object (optional)
+            An object registered as a player in the current game. If None,
+            return the mobility of the active player on the board.
+
+        Returns
+        -------
+        int
+            The number of legal moves of the player.
+        """
+        if player is None:
+            player = self._active_player
+        if player == self._player_1:
+            slot = 0
+        elif player == self._player_2:
+            slot = 1
+        else:
+            raise RuntimeError(
+                "Invalid player in mobility: {}".format(player))
+        count = self._mobility[slot]
+        if count is None:
+            idx = self._locations[slot]
+            if idx < 0:
+                count = self._blank_count
+            else:
+                state = self._board_state
+                count = [state[target] for target
+                         in self._tables.knight_moves[idx]].count(Board.BLANK)
+            self._mobility = ((count, self._mobility[1]) if slot == 0
+                              else (self._mobility[0], count))
+        return count
+
+    def get_reachable_cells(self, player):
+        """Return the set of blank cells that the specified player could still
+        reach by a sequence of knight moves through blank cells, ignoring the
+        opponent's future moves.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game.
+
+        Returns
+        -------
+        set<(int, int)>
+            The coordinate pairs (row, column) of all reachable cells; every
+            blank cell if the player has not moved yet.
+        """
+        loc = self.get_player_location(player)
+        if loc == Board.NOT_MOVED:
+            return set(self.get_blank_spaces())
+        reachable = set()
+        frontier = [loc]
+        while frontier:
+            for move in self.__get_moves(frontier.pop()):
+                if move not in reachable:
+                    reachable.add(move)
+                    frontier.append(move)
+        return reachable
+
+    def is_partitioned(self):
+        """Test whether both players have moved and can no longer reach any
+        common cell, i.e., each player is confined to a separate region of
+        the board and the game reduces to a longest-path race.
+        """
+        if (self.get_player_location(self._player_1) == Board.NOT_MOVED or
+                self.get_player_location(self._player_2) == Board.NOT_MOVED):
+            return False
+        return self.get_reachable_cells(self._player_1).isdisjoint(
+            self.get_reachable_cells(self._player_2))
+
     def apply_move(self, move):
         """Move the active player to a specified location.
 
@@ -200,20 +450,51 @@ class Board(object):
             the active player on the board.
         """
         idx = move[0] + move[1] * self.height
-        last_move_idx = int(self.active_player == self._player_2) + 1
-        self._board_state[-last_move_idx] = idx
+        locations = self._locations
+        if self._active_player == self._player_2:
+            self._hash ^= self._zobrist.move_delta(1, locations[1], idx)
+            self._locations = (locations[0], idx)
+        else:
+            self._hash ^= self._zobrist.move_delta(0, locations[0], idx)
+            self._locations = (idx, locations[1])
         self._board_state[idx] = 1
-        self._board_state[-3] ^= 1
         self._active_player, self._inactive_player = self._inactive_player, self._active_player
         self.move_count += 1
+        self._mobility = _NO_MOBILITY
+        self._blank_count -= 1
+
+    def push_move(self, move):
+        """Apply a move in-place like `apply_move`, but remember enough of the
+        previous state that `pop_move` can restore it exactly.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        self._undo_stack.append((move[0] + move[1] * self.height,
+                                 self._locations, self._hash))
+        self.apply_move(move)
+
+    def pop_move(self):
+        """Undo the most recent move applied with `push_move`, restoring the
+        blocked cells, player locations, initiative and move count.
+        """
+        idx, self._locations, self._hash = self._undo_stack.pop()
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self._board_state[idx] = Board.BLANK
+        self.move_count -= 1
+        self._mobility = _NO_MOBILITY
+        self._blank_count += 1
 
     def is_winner(self, player):
         """ Test whether the specified player has won the game. """
-        return player == self._inactive_player and not self.get_legal_moves(self._active_player)
+        return player == self._inactive_player and not self.mobility(self._active_player)
 
     def is_loser(self, player):
         """ Test whether the specified player has lost the game. """
-        return player == self._active_player and not self.get_legal_moves(self._active_player)
+        return player == self._active_player and not self.mobility(self._active_player)
 
     def utility(self, player):
         """Returns the utility of the current game state from the perspective
@@ -237,7 +518,7 @@ class Board(object):
             a value of -inf if the player has lost, and a value of 0
             otherwise.
         """
-        if not self.get_legal_moves(self._active_player):
+        if not self.mobility(self._active_player):
 
             if player == self._inactive_player:
                 return float("inf")
@@ -254,11 +535,11 @@ class Board(object):
         if loc == Board.NOT_MOVED:
             return self.get_blank_spaces()
 
-        r, c = loc
-        directions = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                      (1, -2), (1, 2), (2, -1), (2, 1)]
-        valid_moves = [(r + dr, c + dc) for dr, dc in directions
-                       if self.move_is_legal((r + dr, c + dc))]
+        state = self._board_state
+        cells = self._tables.cells
+        valid_moves = [cells[idx] for idx
+                       in self._tables.knight_moves[loc[0] + loc[1] * self.height]
+                       if state[idx] == Board.BLANK]
         random.shuffle(valid_moves)
         return valid_moves
 
@@ -271,31 +552,31 @@ class Board(object):
         the location of each player and indicating which cells have been
         blocked, and which remain open.
         """
-        p1_loc = self._board_state[-1]
-        p2_loc = self._board_state[-2]
-
+        chars = self._cell_chars(symbols)
         col_margin = len(str(self.height - 1)) + 1
         prefix = "{:<" + "{}".format(col_margin) + "}"
         offset = " " * (col_margin + 3)
-        out = offset + '   '.join(map(str, range(self.width))) + '\n\r'
+
+        # Join the pieces of every row once; repeated string concatenation is
+        # quadratic in the number of cells
+        lines = [offset + '   '.join(map(str, range(self.width)))]
         for i in range(self.height):
-            out += prefix.format(i) + ' | '
-            for j in range(self.width):
-                idx = i + j * self.height
-                if not self._board_state[idx]:
-                    out += ' '
-                elif p1_loc == idx:
-                    out += symbols[0]
-                elif p2_loc == idx:
-                    out += symbols[1]
-                else:
-                    out += '-'
-                out += ' | '
-            out += '\n\r'
-
-        return out
-
-    def play(self, time_limit=TIME_LIMIT_MILLIS):
+            lines.append(prefix.format(i) + ' | ' + ''.join(
+                chars[i + j * self.height] + ' | ' for j in range(self.width)))
+        return '\n\r'.join(lines) + '\n\r'
+
+    def _cell_chars(self, symbols):
+        """Return the character drawn by `to_string` for every cell index:
+        blank, blocked, or the symbol of the player standing on it.
+        """
+        chars = [' ' if value == Board.BLANK else '-'
+                 for value in self._board_state]
+        for loc, symbol in zip(self._locations, symbols):
+            if loc >= 0:
+                chars[loc] = symbol
+        return chars
+
+    def play(self, time_limit=TIME_LIMIT_MILLIS, ponder=False):
         """Execute a match between the players by alternately soliciting them
         to select a move and applying it in the game.
 
@@ -305,6 +586,14 @@ class Board(object):
             The maximum number of milliseconds to allow before timeout
             during each turn.
 
+        ponder : bool (optional)
+            If True, the inactive player is told to ponder during every turn
+            of its opponent: its `ponder(game)` method (if any) is called with
+            a copy of the game before the active player's timer starts, and
+            its `stop_pondering()` method after the active player's move has
+            been timed. Pondering players must search in another process or
+            on another core, so as not to slow down the active player.
+
         Returns
         ----------
         (player, list<[(int, int),]>, str)
@@ -314,18 +603,22 @@ class Board(object):
         """
         move_history = []
 
-        time_millis = lambda: 1000 * timeit.default_timer()
-
         while True:
 
             legal_player_moves = self.get_legal_moves()
             game_copy = self.copy()
 
-            move_start = time_millis()
-            time_left = lambda : time_limit - (time_millis() - move_start)
+            ponderer = self._inactive_player if ponder else None
+            if hasattr(ponderer, "ponder"):
+                ponderer.ponder(self.copy())
+
+            time_left = Deadline(time_limit)
             curr_move = self._active_player.get_move(game_copy, time_left)
             move_end = time_left()
 
+            if hasattr(ponderer, "stop_pondering"):
+                ponderer.stop_pondering()
+
             if curr_move is None:
                 curr_move = Board.NOT_MOVED
 
@@ -0,0 +1,86 @@
+"""
+This file contains the symmetry tables used to canonicalize isolation boards.
+
+Knight moves are preserved by the rotations and reflections of the board, so
+two positions that differ by one of them have the same game-theoretic value
+and symmetric best moves.  A square board has 8 such symmetries (the
+dihedral group of the square); a rectangular board only has the 4 that do not
+swap rows and columns.
+
+The canonical key of a position is the smallest Zobrist hash among all of
+its transformed copies.  Each symmetry permutes the cell indices, so the hash
+of a transformed copy is computed from the blocked cells and player
+locations of the original board with a table of permuted Zobrist keys,
+without building the copy.
+"""
+from .zobrist import zobrist_keys
+
+# The symmetries of a board with the given height and width, as functions
+# mapping a cell (row, column) to its image. The first four preserve the
+# dimensions of any board; the last four swap rows and columns and are only
+# symmetries of square boards.
+TRANSFORMS = [
+    lambda r, c, h, w: (r, c),                  # identity
+    lambda r, c, h, w: (h - 1 - r, c),          # flip rows
+    lambda r, c, h, w: (r, w - 1 - c),          # flip columns
+    lambda r, c, h, w: (h - 1 - r, w - 1 - c),  # rotate 180 degrees
+    lambda r, c, h, w: (c, r),                  # transpose
+    lambda r, c, h, w: (c, h - 1 - r),          # rotate 90 degrees
+    lambda r, c, h, w: (w - 1 - c, r),          # rotate 270 degrees
+    lambda r, c, h, w: (w - 1 - c, h - 1 - r),  # anti-transpose
+]
+
+# Tables shared by every board of the same dimensions, keyed by
+# (width, height)
+_SYMMETRY_TABLES = {}
+
+
+class SymmetryTable(object):
+    """Cell permutations and permuted Zobrist keys of the symmetries of a
+    board of fixed dimensions. Cells are indexed like `Board._board_state`.
+
+    Attributes
+    ----------
+    transforms : list<int>
+        The indices in `TRANSFORMS` of the symmetries of the board
+
+    cell_maps : dict<int, list<int>>
+        The image of every cell index under each symmetry
+
+    inverse : dict<int, int>
+        The symmetry undoing each symmetry
+
+    cell_keys, player_keys : dict<int, list<int>>
+        The Zobrist keys of the blocked cells and of the player locations
+        (player 1, then player 2) of the transformed board, indexed by the
+        cell indices of the original board
+    """
+    def __init__(self, width, height):
+        cells = [(r, c) for c in range(width) for r in range(height)]
+        self.transforms = list(range(8 if width == height else 4))
+        self.cell_maps = {}
+        for t in self.transforms:
+            self.cell_maps[t] = [r + c * height for r, c in
+                                 (TRANSFORMS[t](r, c, height, width)
+                                  for r, c in cells)]
+        identity = self.cell_maps[0]
+        self.inverse = {t: next(u for u in self.transforms
+                                if [self.cell_maps[u][idx] for idx
+                                    in self.cell_maps[t]] == identity)
+                        for t in self.transforms}
+
+        keys = zobrist_keys(width, height)
+        self.cell_keys = {t: [keys.cells[idx] for idx in cell_map]
+                          for t, cell_map in self.cell_maps.items()}
+        self.player_keys = {t: [[player_keys[idx] for idx in cell_map]
+                                for player_keys in keys.players]
+                            for t, cell_map in self.cell_maps.items()}
+        self.side = keys.side
+
+
+def symmetry_table(width, height):
+    """Return the (cached) `SymmetryTable` for a board of the given size. """
+    table = _SYMMETRY_TABLES.get((width, height))
+    if table is None:
+        table = _SYMMETRY_TABLES[(width, height)] = SymmetryTable(width, height)
+    return table
@@ -0,0 +1,59 @@
+"""
+This file contains the Zobrist keys used to hash isolation boards.
+
+A position is hashed as the XOR of one random 64-bit key per blocked cell,
+one key per (player, location) pair and one key when the second player holds
+the initiative.  Applying or undoing a move only toggles a handful of keys,
+so boards can maintain their hash incrementally in O(1).
+
+The keys are drawn from a generator seeded with the board dimensions, which
+makes hashes reproducible across processes and runs (e.g., for tables that
+are saved to disk).
+"""
+import random
+
+# Keys shared by every board of the same dimensions, keyed by (width, height)
+_ZOBRIST_KEYS = {}
+
+
+class ZobristKeys(object):
+    """Random 64-bit keys for every hashed feature of a board of fixed
+    dimensions. Cells are indexed like `Board._board_state`.
+
+    Attributes
+    ----------
+    cells : list<int>
+        The key toggled when each cell index becomes blocked
+
+    players : [list<int>, list<int>]
+        The keys toggled when player 1 (resp. player 2) arrives at or leaves
+        each cell index
+
+    side : int
+        The key toggled every time the initiative changes hands
+    """
+    def __init__(self, width, height):
+        rng = random.Random((width << 16) | height)
+        size = width * height
+        self.cells = [rng.getrandbits(64) for _ in range(size)]
+        self.players = [[rng.getrandbits(64) for _ in range(size)],
+                        [rng.getrandbits(64) for _ in range(size)]]
+        self.side = rng.getrandbits(64)
+
+    def move_delta(self, player_idx, from_idx, to_idx):
+        """Return the XOR delta applied to a hash when the player with index
+        `player_idx` (0 or 1) moves from cell `from_idx` (negative if the
+        player has not moved yet) to cell `to_idx`.
+        """
+        delta = self.side ^ self.cells[to_idx] ^ self.players[player_idx][to_idx]
+        if from_idx >= 0:
+            delta ^= self.players[player_idx][from_idx]
+        return delta
+
+
+def zobrist_keys(width, height):
+    """Return the (cached) `ZobristKeys` for a board of the given size. """
+    keys = _ZOBRIST_KEYS.get((width, height))
+    if keys is None:
+        keys = _ZOBRIST_KEYS[(width, height)] = ZobristKeys(width, height)
+    return keys
@@ -0,0 +1,425 @@
+"""Local match server playing many isolation games concurrently, with every
+agent running in persistent worker subprocesses.
+
+`Board.play()` calls `get_move()` in the process that runs the game, so a
+tournament plays one game at a time per process, and an agent that hangs
+stalls the whole tournament. A `MatchServer` instead keeps the authoritative
+`Board` of every game in an asyncio event loop and asks agents for their
+moves over pipes:
+
+- Every agent is pickled once into each of its worker processes (started
+  with `python match_server.py --worker`), which keep it -- and its
+  transposition table, move ordering history, etc. -- across moves and
+  games. A game checks out one worker per seat, so games run on as many
+  cores as there are concurrent games.
+
+- Messages are frames of a 9-byte header (kind, game id, payload length)
+  and a binary payload. A move request carries the time limit and only the
+  moves (as 16-bit cell indices) the worker has not seen yet; the worker
+  keeps its own copy of the board of every game it plays.
+
+- The time limit is enforced on the wall clock of the server: a worker
+  that has not answered `grace` milliseconds after the time limit (an
+  allowance for the pipe transport) loses the game by timeout and is
+  killed, and a fresh worker replaces it in later games.
+
+Games end like `Board.play()` games, by "timeout", "forfeit" (an illegal
+move while legal moves remain) or "illegal move" (no legal move left), or by
+"error" if the agent raised an exception or its worker died.
+"""
+import argparse
+import asyncio
+import os
+import pickle
+import random
+import struct
+import sys
+import traceback
+import warnings
+
+from array import array
+from collections import namedtuple
+
+from isolation import Board, Deadline
+from isolation.isolation import TIME_LIMIT_MILLIS
+
+# Frame header: message kind, game id and payload length
+HEADER = struct.Struct("<BII")
+
+# Message kinds. PLAYER (server to worker) carries the pickled agent and is
+# answered by READY; NEW_GAME carries NEW_GAME_FORMAT; MOVE carries
+# MOVE_FORMAT followed by int16 cell indices, and is answered by a MOVE
+# carrying REPLY_FORMAT; END_GAME is answered by an END_GAME carrying the
+# pickled `StatsSummary` of the agent for the game (or None); ERROR (worker
+# to server) carries a traceback
+PLAYER, READY, NEW_GAME, MOVE, END_GAME, ERROR = range(1, 7)
+
+# Width, height, seat of the agent (0 moves first) and random seed
+NEW_GAME_FORMAT = struct.Struct("<HHBI")
+
+# Time limit (milliseconds) of a move request, and cell index of a move
+# (-1 for no move)
+MOVE_FORMAT = struct.Struct("<f")
+REPLY_FORMAT = struct.Struct("<h")
+
+# Milliseconds allowed for the transport of a move on top of the time limit
+GRACE = 10.
+
+# Seconds allowed for a worker to start (importing the agent's modules) and
+# to answer the other messages
+STARTUP_TIMEOUT = 60.
+REPLY_TIMEOUT = 5.
+
+WORKER_SCRIPT = os.path.abspath(__file__)
+
+# The outcome of a game: the index of the winner (0 for the player who moved
+# first), the moves played after the opening, the termination reason and the
+# `StatsSummary` of each player for the game (None if unavailable)
+MatchResult = namedtuple("MatchResult",
+                         ["winner", "history", "termination", "summaries"])
+
+
+class AgentError(Exception):
+    """Raised when a worker answers with an error or an unexpected message,
+    or dies.
+    """
+
+
+class Worker:
+    """A worker subprocess hosting one copy of an agent. """
+
+    def __init__(self, process):
+        self.process = process
+
+    @classmethod
+    async def start(cls, player):
+        """Start a worker process for `player` and wait until it is ready.
+
+        Raises `AgentError` (and kills the process) if the agent cannot be
+        sent to the worker or loaded by it in time.
+        """
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_SCRIPT, "--worker",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+        worker = cls(process)
+        try:
+            await worker.send(PLAYER, 0, pickle.dumps(player))
+            await worker.expect(READY, STARTUP_TIMEOUT)
+        except asyncio.TimeoutError as error:
+            await worker.kill()
+            raise AgentError("the worker did not start in time") from error
+        except Exception as error:
+            await worker.kill()
+            if isinstance(error, AgentError):
+                raise
+            raise AgentError("the agent could not be sent to the worker: "
+                             "{!r}".format(error)) from error
+        return worker
+
+    @property
+    def alive(self):
+        return self.process.returncode is None
+
+    async def send(self, kind, game_id, payload=b""):
+        """Send a message to the worker. """
+        self.process.stdin.write(HEADER.pack(kind, game_id, len(payload)) +
+                                 payload)
+        await self.process.stdin.drain()
+
+    async def receive(self):
+        """Return the (kind, game id, payload) of the next message of the
+        worker.
+        """
+        stdout = self.process.stdout
+        kind, game_id, length = HEADER.unpack(
+            await stdout.readexactly(HEADER.size))
+        return kind, game_id, await stdout.readexactly(length)
+
+    async def expect(self, kind, timeout):
+        """Return the payload of the next message of the worker, which must
+        be of the given kind and arrive within `timeout` seconds; raises
+        `AgentError` otherwise (and `asyncio.TimeoutError` on timeout).
+        """
+        try:
+            received, _, payload = await asyncio.wait_for(self.receive(),
+                                                          timeout)
+        except (asyncio.IncompleteReadError, ConnectionError) as error:
+            raise AgentError("the worker process died") from error
+        if received == ERROR:
+            raise AgentError(payload.decode("utf-8", "replace"))
+        if received != kind:
+            raise AgentError("unexpected message kind {}".format(received))
+        return payload
+
+    async def kill(self):
+        """Kill the worker process. """
+        if self.alive:
+            self.process.kill()
+        await self.process.wait()
+
+    async def close(self):
+        """Let the worker process exit after its current message. """
+        if self.alive:
+            self.process.stdin.close()
+        await self.process.wait()
+
+
+class MatchServer:
+    """Plays games between agents hosted in worker processes.
+
+    Use as an asynchronous context manager (or call `close()`), so that the
+    worker processes are shut down.
+
+    Parameters
+    ----------
+    time_limit : numeric (optional)
+        The milliseconds allowed for every move.
+
+    max_games : int (optional)
+        The largest number of games played at the same time; by default the
+        number of CPUs.
+
+    grace : numeric (optional)
+        The milliseconds allowed for the transport of every move on top of
+        `time_limit`.
+    """
+
+    def __init__(self, time_limit=TIME_LIMIT_MILLIS, max_games=None,
+                 grace=GRACE):
+        self.time_limit = time_limit
+        self.grace = grace
+        self._slots = asyncio.Semaphore(max_games or os.cpu_count() or 1)
+        # Idle workers of every agent, keyed by the id() of the agent
+        self._idle = {}
+        self._players = {}
+        self._next_game = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def acquire(self, player):
+        """Return an idle worker of `player`, starting one if there is none. """
+        idle = self._idle.setdefault(id(player), [])
+        self._players[id(player)] = player
+        if idle:
+            return idle.pop()
+        return await Worker.start(player)
+
+    def release(self, player, worker):
+        """Return a worker to the idle workers of `player`, unless it died. """
+        if worker is not None and worker.alive:
+            self._idle[id(player)].append(worker)
+
+    async def close(self):
+        """Shut down every idle worker. """
+        for idle in self._idle.values():
+            await asyncio.gather(*(worker.close() for worker in idle))
+            idle.clear()
+
+    async def play(self, player_1, player_2, opening=(), seed=0, width=7,
+                   height=7):
+        """Play a game between two agents (`player_1` moves first), starting
+        from the `opening` moves, and return its `MatchResult`.
+
+        `seed` seeds the random number generator of both agents' workers for
+        the game. An agent whose worker cannot be started loses the game by
+        "error".
+        """
+        async with self._slots:
+            players = (player_1, player_2)
+            workers = [None, None]
+            try:
+                for seat, player in enumerate(players):
+                    try:
+                        workers[seat] = await self.acquire(player)
+                    except AgentError as error:
+                        warnings.warn("Agent in seat {} failed to start: "
+                                      "{}".format(seat + 1, error))
+                        return MatchResult(1 - seat, [], "error",
+                                           (None, None))
+                return await self._play(workers, opening, seed, width, height)
+            finally:
+                for player, worker in zip(players, workers):
+                    self.release(player, worker)
+
+    async def play_tasks(self, tasks):
+        """Play the games of `tournament.GameTask`s concurrently and return
+        the (winner index, termination, summaries) of every game, in order,
+        like `tournament.play_game()`.
+        """
+        results = await asyncio.gather(*(
+            self.play(task.player_1, task.player_2, task.opening, task.seed)
+            for task in tasks))
+        return [(result.winner, result.termination, result.summaries)
+                for result in results]
+
+    async def _play(self, workers, opening, seed, width, height):
+        """Play a game with the given worker of each seat. """
+        game_id = self._next_game = self._next_game + 1
+        seats = ("player 1", "player 2")
+        game = Board(seats[0], seats[1], width, height)
+        unseen = []
+        for move in opening:
+            game.apply_move(move)
+            unseen.append(move[0] + move[1] * height)
+        unseen = [unseen, list(unseen)]
+        for seat, worker in enumerate(workers):
+            await worker.send(NEW_GAME, game_id, NEW_GAME_FORMAT.pack(
+                width, height, seat, seed & 0xFFFFFFFF))
+
+        loop = asyncio.get_running_loop()
+        history = []
+        while True:
+            seat = seats.index(game.active_player)
+            legal_moves = game.get_legal_moves()
+            if not legal_moves:
+                termination = "illegal move"
+                break
+
+            worker = workers[seat]
+            payload = (MOVE_FORMAT.pack(self.time_limit) +
+                       array("h", unseen[seat]).tobytes())
+            unseen[seat] = []
+            start = loop.time()
+            try:
+                await worker.send(MOVE, game_id, payload)
+                reply = await worker.expect(
+                    MOVE, (self.time_limit + self.grace) / 1000.)
+            except asyncio.TimeoutError:
+                await worker.kill()
+                termination = "timeout"
+                break
+            except (AgentError, ConnectionError) as error:
+                warnings.warn("Agent in seat {} failed: {}".format(
+                    seat + 1, error))
+                await worker.kill()
+                termination = "error"
+                break
+            if 1000 * (loop.time() - start) > self.time_limit + self.grace:
+                termination = "timeout"
+                break
+
+            idx, = REPLY_FORMAT.unpack(reply)
+            move = (idx % height, idx // height) if idx >= 0 else None
+            if move not in legal_moves:
+                termination = "forfeit"
+                break
+            game.apply_move(move)
+            history.append(list(move))
+            unseen[0].append(idx)
+            unseen[1].append(idx)
+
+        summaries = []
+        for worker in workers:
+            summary = None
+            if worker.alive:
+                try:
+                    await worker.send(END_GAME, game_id)
+                    summary = pickle.loads(await worker.expect(
+                        END_GAME, REPLY_TIMEOUT))
+                except (asyncio.TimeoutError, AgentError, ConnectionError):
+                    await worker.kill()
+            summaries.append(summary)
+        return MatchResult(1 - seat, history, termination, tuple(summaries))
+
+
+class MatchRunner:
+    """Synchronous front end of a `MatchServer` with its own event loop, for
+    scripts such as tournament.py. Call `close()` when done.
+    """
+
+    def __init__(self, time_limit=TIME_LIMIT_MILLIS, max_games=None,
+                 grace=GRACE):
+        self._loop = asyncio.new_event_loop()
+        self.server = MatchServer(time_limit, max_games, grace)
+
+    def play_tasks(self, tasks):
+        """Play `tournament.GameTask`s (see `MatchServer.play_tasks`). """
+        return self._loop.run_until_complete(self.server.play_tasks(tasks))
+
+    def close(self):
+        """Shut down the worker processes and the event loop. """
+        self._loop.run_until_complete(self.server.close())
+        self._loop.close()
+
+
+def read_message(stream):
+    """Return the (kind, game id, payload) of the next message on a binary
+    stream, or None at the end of the stream.
+    """
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    kind, game_id, length = HEADER.unpack(header)
+    return kind, game_id, stream.read(length)
+
+
+def write_message(stream, kind, game_id, payload=b""):
+    """Write a message to a binary stream. """
+    stream.write(HEADER.pack(kind, game_id, len(payload)) + payload)
+    stream.flush()
+
+
+def run_worker(requests, replies):
+    """Serve the agent sent by the server over the binary streams
+    `requests` and `replies` until the server closes `requests`.
+    """
+    player = None
+    games = {}
+    while True:
+        message = read_message(requests)
+        if message is None:
+            return
+        kind, game_id, payload = message
+        try:
+            if kind == PLAYER:
+                player = pickle.loads(payload)
+                write_message(replies, READY, 0)
+            elif kind == NEW_GAME:
+                width, height, seat, seed = NEW_GAME_FORMAT.unpack(payload)
+                random.seed(seed)
+                if hasattr(player, "stats_summary"):
+                    player.stats_summary = type(player.stats_summary)()
+                seats = [player, "opponent"] if seat == 0 else ["opponent", player]
+                games[game_id] = Board(seats[0], seats[1], width, height)
+            elif kind == MOVE:
+                game = games[game_id]
+                time_limit, = MOVE_FORMAT.unpack_from(payload)
+                for idx in array("h", payload[MOVE_FORMAT.size:]):
+                    game.apply_move((idx % game.height, idx // game.height))
+                move = player.get_move(game.copy(), Deadline(time_limit))
+                idx = -1
+                if (isinstance(move, tuple) and len(move) == 2 and
+                        0 <= move[0] < game.height and 0 <= move[1] < game.width):
+                    idx = move[0] + move[1] * game.height
+                write_message(replies, MOVE, game_id, REPLY_FORMAT.pack(idx))
+            elif kind == END_GAME:
+                games.pop(game_id, None)
+                write_message(replies, END_GAME, game_id, pickle.dumps(
+                    getattr(player, "stats_summary", None)))
+        except Exception:
+            write_message(replies, ERROR, game_id,
+                          traceback.format_exc().encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--worker", action="store_true",
+                        help="serve an agent over standard input and output "
+                             "(started by the server)")
+    args = parser.parse_args()
+    if args.worker:
+        # Keep the real standard output for replies, and send whatever the
+        # agent prints to standard error so that it cannot corrupt them
+        replies = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        run_worker(sys.stdin.buffer, replies)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Move ordering for the alpha-beta agents in game_agent.py.
+
+Alpha-beta search prunes the most when the best move at every node is
+searched first.  `MoveOrderer` ranks the legal moves at each node by:
+
+    1. the principal variation (PV) move found by the previous iteration of
+       iterative deepening for this exact position,
+    2. the best move stored in the transposition table (if any),
+    3. killer moves, i.e., moves that recently caused a cutoff at the same
+       ply in a sibling subtree,
+    4. the history heuristic, i.e., how much each move has contributed to
+       cutoffs anywhere in the tree so far, and finally
+    5. an optional static order computed from the position itself.
+"""
+
+
+class MoveOrderer:
+    """Rank the legal moves of each node of an alpha-beta search.
+
+    Parameters
+    ----------
+    pv : bool (optional)
+        Search the principal variation move from the previous iteration
+        first.
+
+    killers : int (optional)
+        The number of killer moves remembered per ply; zero disables the
+        killer heuristic.
+
+    history : bool (optional)
+        Rank the remaining moves by the history heuristic.
+
+    static : str or None (optional)
+        Static order used to break the remaining ties. "mobility" prefers
+        moves that leave the opponent with the fewest legal moves; None keeps
+        the order produced by `Board.get_legal_moves()`.
+    """
+    STATIC_ORDERS = (None, "mobility")
+
+    def __init__(self, pv=True, killers=2, history=True, static=None):
+        if static not in self.STATIC_ORDERS:
+            raise ValueError("Unknown static move order: {}".format(static))
+        self.pv = pv
+        self.killers = killers
+        self.history = history
+        self.static = static
+        self._pv_line = []
+        self._pv_moves = {}
+        self._pv_table = []
+        self._killer_moves = []
+        self._history_table = {}
+
+    def new_search(self):
+        """Reset the per-move state before searching a new position. Killer
+        moves are forgotten and the history scores are aged, so that stale
+        statistics from earlier moves of the game fade out.
+        """
+        self._killer_moves = []
+        self._history_table = {key: score // 2 for key, score
+                               in self._history_table.items() if score > 1}
+
+    def start_node(self, ply):
+        """Clear the principal variation collected below `ply`; must be called
+        when entering every node of the search, including leaves.
+        """
+        table = self._pv_table
+        while len(table) <= ply + 1:
+            table.append([])
+        table[ply] = []
+
+    def update_pv(self, ply, key, move):
+        """Record that `move` is the best move so far of the node with hash
+        `key` at `ply`, extending it with the variation found below it.
+        """
+        self._pv_table[ply] = [(key, move)] + self._pv_table[ply + 1]
+
+    def end_iteration(self):
+        """Adopt the principal variation of the completed iteration, so the
+        next (deeper) iteration searches it first.
+        """
+        if self._pv_table:
+            self._pv_line = self._pv_table[0]
+            self._pv_moves = dict(self._pv_line)
+
+    @property
+    def principal_variation(self):
+        """The moves of the principal variation of the last completed
+        iteration.
+        """
+        return [move for _, move in self._pv_line]
+
+    def record_cutoff(self, move, ply, depth, maximizing):
+        """Update the killer and history tables after `move` caused an
+        alpha-beta cutoff at `ply` with `depth` plies left to search.
+        """
+        if self.killers:
+            while len(self._killer_moves) <= ply:
+                self._killer_moves.append([])
+            killers = self._killer_moves[ply]
+            if move not in killers:
+                killers.insert(0, move)
+                del killers[self.killers:]
+        if self.history:
+            key = (maximizing, move)
+            self._history_table[key] = self._history_table.get(key, 0) + depth * depth
+
+    def order(self, game, legal_moves, ply, tt_move=None, maximizing=True):
+        """Return the legal moves of `game` sorted from most to least
+        promising.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            The position being searched.
+
+        legal_moves : list<(int, int)>
+            The legal moves of the active player in `game`; sorted in place.
+
+        ply : int
+            The distance of `game` from the root of the search.
+
+        tt_move : (int, int) (optional)
+            The best move stored in the transposition table for `game`.
+
+        maximizing : bool (optional)
+            True if the searching player is the active player in `game`.
+        """
+        pv_move = self._pv_moves.get(game.hash()) if self.pv else None
+        killers = (self._killer_moves[ply] if self.killers and
+                   ply < len(self._killer_moves) else ())
+        history = self._history_table
+
+        opp_moves = ()
+        if self.static == "mobility":
+            opp_moves = game.get_legal_moves(game.inactive_player)
+            if game.get_player_location(game.inactive_player) is None:
+                opp_moves = ()
+
+        def rank(move):
+            if move == pv_move:
+                priority = 4
+            elif move == tt_move:
+                priority = 3
+            elif move in killers:
+                priority = 2 - killers.index(move) / len(killers)
+            else:
+                priority = 0
+            return (priority, history.get((maximizing, move), 0),
+                    move in opp_moves)
+
+        legal_moves.sort(key=rank, reverse=True)
+        return legal_moves
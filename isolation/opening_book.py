@@ -0,0 +1,199 @@
+"""Precomputed opening book for the isolation agents.
+
+The first plies of a game have the widest branching (a player that has not
+moved yet may move to any blank cell), so they are the most expensive to
+search live.  The book stores the best move of every position near the start
+of the game, found offline by a deep alpha-beta search, in a compact binary
+file that is memory-mapped at load time so lookups need no parsing.
+
+Positions are stored once per class of symmetric positions: the key of a
+record is the canonical key of the position (see `Board.canonical`), and its
+move is the best move of the canonical form of the position, which lookups
+map back through the symmetry relating the two. This shrinks the book up to
+8 times on square boards.
+
+File layout (little-endian):
+
+    header   magic (8 bytes), board width (uint16), board height (uint16),
+             number of slots (uint32, a power of two)
+    slots    one record per slot: position hash (uint64), move (uint16)
+
+The key of a record is a canonical key and its move is stored as 1 + the cell
+index of the canonical move (as in `Board._board_state`), so that zero marks
+an empty slot.  Records are found
+by open addressing: the slot of a position is its hash modulo the number of
+slots, probing linearly until a matching hash or an empty slot.
+
+Build a book for the default 7x7 board with e.g.
+
+    python opening_book.py -o book.bin --plies 2 --depth 6
+"""
+import argparse
+import mmap
+import struct
+
+from isolation import Board
+
+# Version 2: records are keyed by canonical key rather than by hash
+MAGIC = b"ISOBOOK\x02"
+HEADER = struct.Struct("<8sHHI")
+RECORD = struct.Struct("<QH")
+
+
+class OpeningBook:
+    """Read-only opening book backed by a memory-mapped book file.
+
+    Parameters
+    ----------
+    path : str
+        The path of a file written by `write_book()`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as book_file:
+            self._map = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.width, self.height, self.num_slots = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError("Not an opening book file: {}".format(path))
+
+    def __getstate__(self):
+        """Pickle the book by path (e.g., to play games in worker processes);
+        the copy maps the file again when it is unpickled.
+        """
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def __len__(self):
+        return sum(1 for slot in range(self.num_slots)
+                   if self._record(slot)[1])
+
+    def close(self):
+        """Unmap the book file. """
+        self._map.close()
+
+    def _record(self, slot):
+        return RECORD.unpack_from(self._map, HEADER.size + slot * RECORD.size)
+
+    def lookup(self, game):
+        """Return the book move for the current position of `game`, or None
+        if the position is not in the book (or `game` has a different size).
+        """
+        if (game.width, game.height) != (self.width, self.height):
+            return None
+        key, transform = game.canonical()
+        mask = self.num_slots - 1
+        slot = key & mask
+        while True:
+            slot_key, move = self._record(slot)
+            if not move:
+                return None
+            if slot_key == key:
+                move = (move - 1) % self.height, (move - 1) // self.height
+                return game.transform_move(move, transform, inverse=True)
+            slot = (slot + 1) & mask
+
+
+def write_book(path, entries, width, height):
+    """Write an opening book file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file to write.
+
+    entries : dict
+        The book move (row, column) of the canonical form of each position,
+        keyed by `Board.canonical()` key (as returned by `build_book()`).
+
+    width, height : int
+        The dimensions of the board the positions belong to.
+    """
+    num_slots = 1
+    while num_slots < 2 * len(entries):
+        num_slots *= 2
+    mask = num_slots - 1
+
+    slots = [None] * num_slots
+    for key, (row, col) in entries.items():
+        slot = key & mask
+        while slots[slot] is not None:
+            slot = (slot + 1) & mask
+        slots[slot] = (key, 1 + row + col * height)
+
+    with open(path, "wb") as book_file:
+        book_file.write(HEADER.pack(MAGIC, width, height, num_slots))
+        for record in slots:
+            book_file.write(RECORD.pack(*(record or (0, 0))))
+
+
+def build_book(player, opponent, depth, plies=2, width=7, height=7):
+    """Search every position reachable in fewer than `plies` plies from the
+    empty board and return the best move of each, keyed by canonical key.
+    Only one position of each class of symmetric positions is searched, and
+    its best move is stored in the frame of the canonical form.
+
+    Parameters
+    ----------
+    player : `game_agent.AlphaBetaPlayer`
+        The agent used to search the positions; it plays as whichever player
+        is to move.
+
+    opponent : object
+        Any other player object, used to fill the other seat of the boards.
+
+    depth : int
+        The depth of the alpha-beta search of each position.
+
+    plies : int (optional)
+        Positions after this many plies are no longer included.
+    """
+    player.time_left = lambda: float("inf")
+    player.TIMER_THRESHOLD = 0
+
+    entries = {}
+    frontier = [[]]
+    for ply in range(plies):
+        next_frontier = []
+        for moves in frontier:
+            players = (player, opponent) if ply % 2 == 0 else (opponent, player)
+            game = Board(*players, width=width, height=height)
+            for move in moves:
+                game.apply_move(move)
+            key, transform = game.canonical()
+            if key in entries or not game.get_legal_moves():
+                continue
+            if player.tt is not None:
+                player.tt.new_search()
+            if player.move_ordering is not None:
+                player.move_ordering.new_search()
+            entries[key] = game.transform_move(player.alphabeta(game, depth),
+                                               transform)
+            next_frontier.extend(moves + [move] for move in game.get_legal_moves())
+        frontier = next_frontier
+    return entries
+
+
+if __name__ == "__main__":
+    from game_agent import AlphaBetaPlayer
+    from sample_players import GreedyPlayer
+
+    parser = argparse.ArgumentParser(description="Build an opening book.")
+    parser.add_argument("-o", "--output", default="book.bin",
+                        help="path of the book file to write")
+    parser.add_argument("--plies", type=int, default=2,
+                        help="number of plies from the empty board to cover")
+    parser.add_argument("--depth", type=int, default=6,
+                        help="search depth of each book position")
+    parser.add_argument("--size", type=int, default=7,
+                        help="width and height of the board")
+    args = parser.parse_args()
+
+    agent = AlphaBetaPlayer(tt_size=2**18)
+    book = build_book(agent, GreedyPlayer(), args.depth, args.plies,
+                      args.size, args.size)
+    write_book(args.output, book, args.size, args.size)
+    print("Wrote {} positions to {}".format(len(book), args.output))
@@ -0,0 +1,471 @@
+"""Exact retrograde solver for isolation on small boards.
+
+This generalizes the exhaustive minimax of gamestate.py (a 3x2 board with
+queen moves) to any small board, with knight or queen moves and optional
+cells blocked from the start. Instead of searching the game tree, the solver
+works on the graph of reachable states:
+
+1. Forward pass: every move blocks exactly one cell, so the states reachable
+   after k moves form a layer. The layers are enumerated breadth first, and
+   each layer is stored as a sorted array of compact integer keys.
+
+2. Backward pass: the value of a state only depends on the states of the
+   next layer. The layers are solved from the last one to the first, and
+   each child is found by binary search in the next layer.
+
+A state is encoded from the point of view of the player to move as
+
+    key = mover << (n + b) | other << n | blocked
+
+where n is the number of cells, `blocked` is the bitmask of blocked cells
+(including the cells of both players), `mover` and `other` are the cell
+indices of the player to move and of its opponent (n if the player has not
+moved yet), and b is the number of bits of n. Symmetric positions (see
+isolation/symmetry.py) are stored once, under the smallest key among their
+transformed copies.
+
+The value of a state is its distance: the number of plies until the game
+ends when the winner wins as fast as possible and the loser loses as slowly
+as possible. The player to move loses when it has no legal moves, so it
+wins exactly when the distance is odd.
+
+The tables of knight games give the exact value and optimal moves of any
+`isolation.Board` of their size: `RetrogradePlayer` plays perfectly from a
+table, and `heuristic_accuracy()` measures how often the move preferred by a
+heuristic preserves a win.
+
+Solve the 5x5 knight game, write its table to disk and check the heuristics
+against it with e.g.
+
+    python retrograde.py --size 5 -o knight5x5.bin --validate
+"""
+import argparse
+import random
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+from isolation import Board
+from isolation.symmetry import symmetry_table
+
+MAGIC = b"ISORETRO"
+HEADER = struct.Struct("<8sHHBxQI")
+LAYER = struct.Struct("<Q")
+
+MOVE_TYPES = ["knight", "queen"]
+
+KNIGHT_DIRECTIONS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                     (1, -2), (1, 2), (2, -1), (2, 1)]
+QUEEN_DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1), (0, -1),
+                    (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+class Geometry:
+    """Move generation, symmetries and state encoding of a board.
+
+    Parameters
+    ----------
+    width, height : int
+        The dimensions of the board.
+
+    moves : str (optional)
+        "knight" for knight moves, or "queen" for queen moves that slide
+        until the edge of the board or a blocked cell.
+
+    initial : int (optional)
+        The bitmask of the cells blocked before the first move. Only the
+        symmetries of the board that preserve these cells are used.
+    """
+
+    def __init__(self, width, height, moves="knight", initial=0):
+        if moves not in MOVE_TYPES:
+            raise ValueError("Unknown move type: {}".format(moves))
+        self.width = width
+        self.height = height
+        self.moves = moves
+        self.initial = initial
+        self.size = n = width * height
+        self.loc_bits = n.bit_length()
+        self.loc_mask = (1 << self.loc_bits) - 1
+        self.blocked_mask = (1 << n) - 1
+
+        # Cells reachable from every cell index; for queen moves, the cells
+        # along each ray in order of distance
+        cells = [(r, c) for c in range(width) for r in range(height)]
+        if moves == "knight":
+            self.rays = [[[r + dr + (c + dc) * height]
+                          for dr, dc in KNIGHT_DIRECTIONS
+                          if 0 <= r + dr < height and 0 <= c + dc < width]
+                         for r, c in cells]
+        else:
+            self.rays = []
+            for r, c in cells:
+                rays = []
+                for dr, dc in QUEEN_DIRECTIONS:
+                    ray = []
+                    rr, cc = r + dr, c + dc
+                    while 0 <= rr < height and 0 <= cc < width:
+                        ray.append(rr + cc * height)
+                        rr, cc = rr + dr, cc + dc
+                    if ray:
+                        rays.append(ray)
+                self.rays.append(rays)
+
+        # Cell maps of the symmetries that preserve the initial cells, with
+        # the "not moved" location n mapped to itself, and tables permuting
+        # the bits of a blocked mask 8 bits at a time
+        table = symmetry_table(width, height)
+        self.cell_maps = []
+        self.chunk_tables = []
+        for transform in table.transforms:
+            cell_map = table.cell_maps[transform]
+            if self.permute(initial, cell_map) != initial:
+                continue
+            self.cell_maps.append(cell_map + [n])
+            self.chunk_tables.append([
+                [self.permute(value << shift, cell_map) for value in range(256)]
+                for shift in range(0, n, 8)])
+
+    @staticmethod
+    def permute(mask, cell_map):
+        """Return the image of the cell bitmask `mask` under `cell_map`. """
+        image = 0
+        for idx, target in enumerate(cell_map):
+            if mask >> idx & 1:
+                image |= 1 << target
+        return image
+
+    def legal_moves(self, blocked, loc):
+        """Return the list of the cell indices a player at the cell index
+        `loc` (n if it has not moved yet) can move to.
+        """
+        if loc == self.size:
+            return [idx for idx in range(self.size) if not blocked >> idx & 1]
+        moves = []
+        for ray in self.rays[loc]:
+            for idx in ray:
+                if blocked >> idx & 1:
+                    break
+                moves.append(idx)
+        return moves
+
+    def encode(self, blocked, mover, other):
+        """Return the canonical key of a state. """
+        n = self.size
+        # The mover's location is the most significant part of the key, so
+        # only the symmetries mapping it to its smallest image can produce
+        # the smallest key
+        mover_image = min(cell_map[mover] for cell_map in self.cell_maps)
+        best = None
+        for cell_map, chunk_tables in zip(self.cell_maps, self.chunk_tables):
+            if cell_map[mover] != mover_image:
+                continue
+            image = 0
+            shift = 0
+            for chunk_table in chunk_tables:
+                image |= chunk_table[blocked >> shift & 255]
+                shift += 8
+            key = (((mover_image << self.loc_bits) | cell_map[other]) << n) | image
+            if best is None or key < best:
+                best = key
+        return best
+
+    def decode(self, key):
+        """Return the (blocked, mover, other) triple of a key. """
+        n = self.size
+        return (key & self.blocked_mask, key >> (n + self.loc_bits),
+                key >> n & self.loc_mask)
+
+    def children(self, key):
+        """Return the keys of the states reached by every legal move of the
+        player to move in the state `key`.
+        """
+        blocked, mover, other = self.decode(key)
+        return [self.encode(blocked | 1 << idx, other, idx)
+                for idx in self.legal_moves(blocked, mover)]
+
+
+def distance(child_distances):
+    """Return the distance of a state given the distances of its children
+    (from the point of view of the opponent): win as fast as possible if a
+    child is lost for the opponent, or else lose as slowly as possible.
+    """
+    if not child_distances:
+        return 0
+    losses = [d for d in child_distances if not d & 1]
+    if losses:
+        return 1 + min(losses)
+    return 1 + max(child_distances)
+
+
+class RetrogradeTable:
+    """Distances of every reachable state of a small board.
+
+    Parameters
+    ----------
+    geometry : `Geometry`
+        The board the table belongs to.
+
+    layers : list<(array<int>, array<int>)>
+        The sorted keys ('Q' array) and distances ('B' array) of the states
+        after each number of moves.
+    """
+
+    def __init__(self, geometry, layers):
+        self.geometry = geometry
+        self.layers = layers
+
+    def __len__(self):
+        return sum(len(keys) for keys, _ in self.layers)
+
+    def distance(self, blocked, mover, other):
+        """Return the distance of a state given by the bitmask of blocked
+        cells and the cell indices of the player to move and of its opponent
+        (n for a player that has not moved), or None if it is unreachable.
+        """
+        geometry = self.geometry
+        depth = bin(blocked).count("1") - bin(geometry.initial).count("1")
+        if not 0 <= depth < len(self.layers):
+            return None
+        keys, distances = self.layers[depth]
+        key = geometry.encode(blocked, mover, other)
+        idx = bisect_left(keys, key)
+        if idx == len(keys) or keys[idx] != key:
+            return None
+        return distances[idx]
+
+    def _state(self, game):
+        """Return the (blocked, mover, other) triple of an `isolation.Board`,
+        or None if the table belongs to a different game.
+        """
+        geometry = self.geometry
+        if ((game.width, game.height) != (geometry.width, geometry.height) or
+                geometry.moves != "knight" or geometry.initial):
+            return None
+        height = game.height
+        blocked = geometry.blocked_mask
+        for r, c in game.get_blank_spaces():
+            blocked ^= 1 << (r + c * height)
+        locations = []
+        for player in (game.active_player, game.inactive_player):
+            loc = game.get_player_location(player)
+            locations.append(geometry.size if loc is None
+                             else loc[0] + loc[1] * height)
+        return blocked, locations[0], locations[1]
+
+    def lookup(self, game):
+        """Return the distance of the current state of an `isolation.Board`
+        for the active player (who wins iff it is odd), or None if the game
+        is not covered by the table.
+        """
+        state = self._state(game)
+        if state is None:
+            return None
+        return self.distance(*state)
+
+    def best_move(self, game):
+        """Return an optimal move of the active player of an
+        `isolation.Board` -- the fastest win, or else the slowest loss -- or
+        None if the game is not covered by the table or is over.
+        """
+        state = self._state(game)
+        if state is None:
+            return None
+        blocked, mover, other = state
+        height = game.height
+        best_move, best_distance = None, None
+        for idx in self.geometry.legal_moves(blocked, mover):
+            child = self.distance(blocked | 1 << idx, other, idx)
+            if child is None:
+                return None
+            if (best_distance is None or
+                    (not child & 1 and (best_distance & 1 or child < best_distance)) or
+                    (child & 1 and best_distance & 1 and child > best_distance)):
+                best_move, best_distance = (idx % height, idx // height), child
+        return best_move
+
+    def save(self, path):
+        """Write the table to a file. """
+        geometry = self.geometry
+        with open(path, "wb") as table_file:
+            table_file.write(HEADER.pack(
+                MAGIC, geometry.width, geometry.height,
+                MOVE_TYPES.index(geometry.moves), geometry.initial,
+                len(self.layers)))
+            for keys, distances in self.layers:
+                table_file.write(LAYER.pack(len(keys)))
+                if sys.byteorder == "big":
+                    keys = array("Q", keys)
+                    keys.byteswap()
+                keys.tofile(table_file)
+                distances.tofile(table_file)
+
+    @classmethod
+    def load(cls, path):
+        """Read a table written by `save()`. """
+        with open(path, "rb") as table_file:
+            magic, width, height, moves, initial, num_layers = HEADER.unpack(
+                table_file.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("Not a retrograde table file: {}".format(path))
+            layers = []
+            for _ in range(num_layers):
+                count, = LAYER.unpack(table_file.read(LAYER.size))
+                keys = array("Q")
+                keys.fromfile(table_file, count)
+                if sys.byteorder == "big":
+                    keys.byteswap()
+                distances = array("B")
+                distances.fromfile(table_file, count)
+                layers.append((keys, distances))
+        geometry = Geometry(width, height, MOVE_TYPES[moves], initial)
+        return cls(geometry, layers)
+
+
+class RetrogradePlayer:
+    """Player that plays the optimal moves of a `RetrogradeTable`, and the
+    first legal move in positions the table does not cover.
+
+    Parameters
+    ----------
+    table : `RetrogradeTable` or str
+        The table, or the path of a table file.
+    """
+
+    def __init__(self, table):
+        if isinstance(table, str):
+            table = RetrogradeTable.load(table)
+        self.table = table
+
+    def get_move(self, game, time_left):
+        legal_moves = game.get_legal_moves()
+        if not legal_moves:
+            return (-1, -1)
+        move = self.table.best_move(game)
+        return move if move is not None else legal_moves[0]
+
+
+def heuristic_accuracy(table, score_fn, num_games=100, seed=None):
+    """Return the fraction of the won positions (for the player to move) in
+    which the move with the highest `score_fn` value is a winning move, over
+    every position of `num_games` random games on the board of a knight
+    move `table`.
+
+    Raises `ValueError` for tables of queen moves or with cells blocked
+    before the first move, whose positions are not `isolation.Board`
+    positions.
+    """
+    geometry = table.geometry
+    if geometry.moves != "knight" or geometry.initial:
+        raise ValueError("Only tables of the knight game without blocked "
+                         "cells cover isolation.Board positions")
+    rng = random.Random(seed)
+    won = kept = 0
+    for _ in range(num_games):
+        game = Board("Player1", "Player2", geometry.width, geometry.height)
+        while True:
+            moves = sorted(game.get_legal_moves())
+            if not moves:
+                break
+            if table.lookup(game) & 1:
+                player = game.active_player
+                choice = max(moves, key=lambda move: score_fn(
+                    game.forecast_move(move), player))
+                won += 1
+                kept += not table.lookup(game.forecast_move(choice)) & 1
+            game.apply_move(rng.choice(moves))
+    return kept / won if won else 1.
+
+
+def solve(width, height, moves="knight", blocked=(), verbose=False):
+    """Solve every reachable state of a board.
+
+    Parameters
+    ----------
+    width, height : int
+        The dimensions of the board.
+
+    moves : str (optional)
+        "knight" or "queen".
+
+    blocked : list<(int, int)> (optional)
+        The (row, column) cells blocked before the first move.
+
+    verbose : bool (optional)
+        Print the number of states of every layer.
+
+    Returns
+    -------
+    `RetrogradeTable`
+    """
+    initial = 0
+    for r, c in blocked:
+        initial |= 1 << (r + c * height)
+    geometry = Geometry(width, height, moves, initial)
+    n = geometry.size
+
+    # Forward pass
+    layer_keys = []
+    frontier = {geometry.encode(initial, n, n)}
+    while frontier:
+        keys = array("Q", sorted(frontier))
+        layer_keys.append(keys)
+        if verbose:
+            print("layer {:>3}: {:>10} states".format(len(layer_keys) - 1,
+                                                      len(keys)), flush=True)
+        frontier = set()
+        for key in keys:
+            frontier.update(geometry.children(key))
+
+    # Backward pass
+    layers = [None] * len(layer_keys)
+    next_keys, next_distances = array("Q"), array("B")
+    for depth in reversed(range(len(layer_keys))):
+        keys = layer_keys[depth]
+        distances = array("B")
+        for key in keys:
+            distances.append(distance([
+                next_distances[bisect_left(next_keys, child)]
+                for child in geometry.children(key)]))
+        layers[depth] = (keys, distances)
+        next_keys, next_distances = keys, distances
+    return RetrogradeTable(geometry, layers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Solve isolation on a small board by retrograde analysis.")
+    parser.add_argument("-o", "--output",
+                        help="path of the table file to write")
+    parser.add_argument("--size", type=int, default=4,
+                        help="width and height of the board")
+    parser.add_argument("--width", type=int,
+                        help="width of the board (default: --size)")
+    parser.add_argument("--height", type=int,
+                        help="height of the board (default: --size)")
+    parser.add_argument("--moves", choices=MOVE_TYPES, default="knight",
+                        help="how the players move")
+    parser.add_argument("--validate", action="store_true",
+                        help="report how often each heuristic picks a "
+                             "winning move (knight moves only)")
+    args = parser.parse_args()
+
+    table = solve(args.width or args.size, args.height or args.size,
+                  args.moves, verbose=True)
+    root = table.layers[0][1][0]
+    print("{} states; the first player {} in {} plies".format(
+        len(table), "wins" if root & 1 else "loses", root))
+    if args.output:
+        table.save(args.output)
+        print("Wrote the table to {}".format(args.output))
+
+    if args.validate and args.moves == "knight":
+        from game_agent import custom_score, custom_score_2, custom_score_3
+        from sample_players import (open_move_score, improved_score,
+                                    center_score)
+        for score_fn in [open_move_score, improved_score, center_score,
+                         custom_score, custom_score_2, custom_score_3]:
+            print("{:>16}: {:.1%} of won positions kept".format(
+                score_fn.__name__,
+                heuristic_accuracy(table, score_fn, seed=0)))
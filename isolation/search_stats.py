@@ -0,0 +1,164 @@
+"""Per-move search statistics of the agents in game_agent.py.
+
+Every call to `get_move()` of a `MinimaxPlayer` or `AlphaBetaPlayer` fills a
+`SearchStats` record (available as `player.last_stats` afterwards), and the
+records of all the moves of a player are accumulated in a `StatsSummary`
+(`player.stats_summary`), which `tournament.py` reports per agent.
+"""
+
+
+class SearchStats:
+    """Statistics of the search for a single move.
+
+    Parameters
+    ----------
+    time_budget : float (optional)
+        The number of milliseconds left when the search started.
+
+    Attributes
+    ----------
+    source : str
+        How the move was chosen: "search", "book" (opening book), "endgame"
+        (exact endgame solver), "ponder" (pondered during the opponent's
+        turn) or "none" (no legal moves)
+
+    depth : int
+        The depth of the deepest completed iteration
+
+    nodes : int
+        The number of nodes visited (including those of unfinished
+        iterations)
+
+    iteration_nodes : list<int>
+        The number of nodes visited by each completed iteration
+
+    cutoffs : int
+        The number of alpha-beta cutoffs
+
+    timed_out : bool
+        True if the last iteration was aborted by the timer
+
+    time_used, time_left : float
+        The milliseconds spent on the move and left over when it was returned
+    """
+
+    def __init__(self, time_budget=0.):
+        self.time_budget = time_budget
+        self.source = "search"
+        self.depth = 0
+        self.nodes = 0
+        self.iteration_nodes = []
+        self.cutoffs = 0
+        self.timed_out = False
+        self.time_used = 0.
+        self.time_left = time_budget
+        self._iteration_start = 0
+
+    def end_iteration(self, depth):
+        """Record the completion of the iteration searching to `depth`. """
+        self.depth = depth
+        self.iteration_nodes.append(self.nodes - self._iteration_start)
+        self._iteration_start = self.nodes
+
+    def absorb(self, other):
+        """Copy the search counters of `other` (e.g., the statistics of a
+        search run in another process).
+        """
+        self.depth = other.depth
+        self.nodes = other.nodes
+        self.iteration_nodes = list(other.iteration_nodes)
+        self.cutoffs = other.cutoffs
+        self.timed_out = other.timed_out
+
+    def finish(self, time_left, source=None):
+        """Record the time left when the move is returned. """
+        if source is not None:
+            self.source = source
+        self.time_left = time_left
+        self.time_used = self.time_budget - time_left
+
+    @property
+    def nodes_per_second(self):
+        """The number of nodes visited per second of the move. """
+        return 1000. * self.nodes / self.time_used if self.time_used > 0 else 0.
+
+    @property
+    def branching_factor(self):
+        """The effective branching factor: the ratio of the node counts of
+        the last two completed iterations (or the depth-th root of the node
+        count after a single iteration); zero without a completed iteration.
+        """
+        counts = [count for count in self.iteration_nodes if count]
+        if len(counts) >= 2:
+            return counts[-1] / counts[-2]
+        if counts and self.depth:
+            return counts[0] ** (1. / self.depth)
+        return 0.
+
+    @property
+    def cutoff_rate(self):
+        """The fraction of the visited nodes that caused a cutoff. """
+        return self.cutoffs / self.nodes if self.nodes else 0.
+
+    def as_dict(self):
+        """Return the statistics as a dict of plain values. """
+        return {"source": self.source, "depth": self.depth,
+                "nodes": self.nodes, "iteration_nodes": self.iteration_nodes,
+                "cutoffs": self.cutoffs, "cutoff_rate": self.cutoff_rate,
+                "branching_factor": self.branching_factor,
+                "timed_out": self.timed_out, "time_used": self.time_used,
+                "time_left": self.time_left,
+                "nodes_per_second": self.nodes_per_second}
+
+
+class StatsSummary:
+    """Running totals of the `SearchStats` of many moves.
+
+    Only moves chosen by searching count towards the depth and throughput
+    averages; moves from the opening book, endgame solver or pondering are
+    only counted in `sources`.
+    """
+
+    def __init__(self):
+        self.moves = 0
+        self.searched = 0
+        self.depth = 0
+        self.nodes = 0
+        self.cutoffs = 0
+        self.time_used = 0.
+        self.min_time_left = float("inf")
+        self.sources = {}
+
+    def add(self, stats):
+        """Add the statistics of one move. """
+        self.moves += 1
+        self.sources[stats.source] = self.sources.get(stats.source, 0) + 1
+        self.min_time_left = min(self.min_time_left, stats.time_left)
+        if stats.source == "search":
+            self.searched += 1
+            self.depth += stats.depth
+            self.nodes += stats.nodes
+            self.cutoffs += stats.cutoffs
+            self.time_used += stats.time_used
+
+    def merge(self, other):
+        """Add the totals of another summary. """
+        self.moves += other.moves
+        self.searched += other.searched
+        self.depth += other.depth
+        self.nodes += other.nodes
+        self.cutoffs += other.cutoffs
+        self.time_used += other.time_used
+        self.min_time_left = min(self.min_time_left, other.min_time_left)
+        for source, count in other.sources.items():
+            self.sources[source] = self.sources.get(source, 0) + count
+
+    @property
+    def average_depth(self):
+        """The average depth of the completed iterations of searched moves. """
+        return self.depth / self.searched if self.searched else 0.
+
+    @property
+    def nodes_per_second(self):
+        """The number of nodes visited per second of search. """
+        return 1000. * self.nodes / self.time_used if self.time_used > 0 else 0.
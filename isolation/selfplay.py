@@ -0,0 +1,302 @@
+"""Vectorized self-play of the cheap agents in sample_players.py.
+
+Games against `RandomPlayer` and `GreedyPlayer` spend most of their time in
+the Python overhead of `Board.play()` -- copying the board, building a
+timer and listing the legal moves at every ply -- rather than in the agents
+themselves. A `GameBatch` instead advances thousands of games at once: the
+games are the rows of NumPy arrays of blocked cells and player locations,
+and a ply of every game is a handful of array operations (the mobility of a
+knight on every cell of every board is a single product with the knight
+move matrix of batch_eval.py).
+
+The policies are
+
+    random      a uniformly random legal move (`RandomPlayer`)
+    open_move   the best move by `open_move_score` (`GreedyPlayer`)
+    improved    the best move by `improved_score` (`GreedyPlayer`)
+
+The greedy policies choose exactly the moves of `GreedyPlayer`, including
+its tie-breaking on the largest (row, column) pair, so every game of a batch
+can be replayed move for move on an `isolation.Board`.
+
+Measure the win rates of every pair of policies over fair pairs of games
+from random openings (as in tournament.py) and save the games with e.g.
+
+    python selfplay.py --pairs 10000 -o games.npz
+"""
+import argparse
+import timeit
+
+import numpy as np
+
+from batch_eval import move_matrix
+
+POLICIES = ["random", "open_move", "improved"]
+
+# Number of random moves played before the policies take over, as in the
+# openings of tournament.py
+OPENING_PLIES = 2
+
+
+class GameBatch:
+    """Many games on boards of the same size, advanced one ply at a time in
+    lockstep. Cells are indexed like `Board._board_state`.
+
+    Parameters
+    ----------
+    num_games : int
+        The number of games, all starting from the empty board.
+
+    width, height : int (optional)
+        The dimensions of the boards.
+
+    Attributes
+    ----------
+    blocked : numpy.ndarray<bool>
+        Array of shape (num_games, width * height) flagging the blocked cells
+        of each game
+
+    locations : numpy.ndarray<int>
+        Array of shape (num_games, 2) of the cell indices of player 1 and
+        player 2 in each game; -1 for a player that has not moved yet
+
+    winners : numpy.ndarray<int>
+        The winner of each game (0 for player 1, 1 for player 2), or -1
+        while the game goes on
+
+    moves : numpy.ndarray<int>
+        Array of shape (num_games, width * height) of the cell index of the
+        move of every ply of each game; -1 after the end of the game
+
+    ply : int
+        The number of plies played; player 1 moves at even plies
+    """
+
+    def __init__(self, num_games, width=7, height=7):
+        size = width * height
+        self.width = width
+        self.height = height
+        self.blocked = np.zeros((num_games, size), dtype=bool)
+        self.locations = np.full((num_games, 2), -1, dtype=np.intp)
+        self.winners = np.full(num_games, -1, dtype=np.int8)
+        self.moves = np.full((num_games, size), -1, dtype=np.int16)
+        self.ply = 0
+
+    def __len__(self):
+        return len(self.winners)
+
+    def copy(self):
+        """Return an independent copy of the batch. """
+        new_batch = GameBatch.__new__(GameBatch)
+        new_batch.width = self.width
+        new_batch.height = self.height
+        new_batch.blocked = self.blocked.copy()
+        new_batch.locations = self.locations.copy()
+        new_batch.winners = self.winners.copy()
+        new_batch.moves = self.moves.copy()
+        new_batch.ply = self.ply
+        return new_batch
+
+    @classmethod
+    def concatenate(cls, batches):
+        """Return a batch holding the games of several batches of boards of
+        the same size, in order.
+        """
+        new_batch = GameBatch.__new__(GameBatch)
+        new_batch.width = batches[0].width
+        new_batch.height = batches[0].height
+        for name in ("blocked", "locations", "winners", "moves"):
+            setattr(new_batch, name, np.concatenate(
+                [getattr(batch, name) for batch in batches]))
+        new_batch.ply = max(batch.ply for batch in batches)
+        return new_batch
+
+    @property
+    def wins(self):
+        """The number of games won by player 1 and by player 2. """
+        return np.bincount(self.winners[self.winners >= 0], minlength=2)
+
+    @property
+    def lengths(self):
+        """The number of plies of each game. """
+        return (self.moves >= 0).sum(axis=1)
+
+    def step(self, policy, rng):
+        """Play one ply of every unfinished game, choosing the moves of the
+        player to move with `policy` (one of `POLICIES`); games where that
+        player has no legal move are lost by it.
+
+        Parameters
+        ----------
+        policy : str
+            The name of the policy of the player to move.
+
+        rng : numpy.random.Generator
+            The source of the random moves.
+        """
+        if policy not in POLICIES:
+            raise ValueError("Unknown policy: {}".format(policy))
+        player = self.ply & 1
+        games = np.flatnonzero(self.winners < 0)
+        free = ~self.blocked[games]
+        locs = self.locations[games, player]
+        moved = locs >= 0
+        candidates = free.copy()
+        candidates[moved] &= move_matrix(self.width, self.height)[locs[moved]]
+
+        stuck = ~candidates.any(axis=1)
+        self.winners[games[stuck]] = 1 - player
+        games, free, candidates = games[~stuck], free[~stuck], candidates[~stuck]
+
+        if len(games):
+            if policy == "random":
+                scores = rng.random(candidates.shape)
+            else:
+                scores = self.greedy_scores(policy, games, free, player)
+            moves = self.select(scores, candidates)
+            self.blocked[games, moves] = True
+            self.locations[games, player] = moves
+            self.moves[games, self.ply] = moves
+        self.ply += 1
+
+    def greedy_scores(self, policy, games, free, player):
+        """Return the score of every cell of the given games for `player`, as
+        the score function of `policy` would rate the position after
+        `player` moves there.
+        """
+        matrix = move_matrix(self.width, self.height)
+        weights = matrix.astype(np.float32)
+
+        # Mobility of a knight on every cell; the cell a player moves to is
+        # not one of its own knight moves, so blocking it changes nothing
+        own_moves = free.astype(np.float32) @ weights
+        opp_locs = self.locations[games, 1 - player]
+        opp_moved = opp_locs >= 0
+        opp_moves = np.repeat(free.sum(axis=1, keepdims=True) - 1.,
+                              free.shape[1], axis=1)
+        if opp_moved.any():
+            attacks = weights[opp_locs[opp_moved]]
+            opp_moves[opp_moved] = (
+                (attacks * free[opp_moved]).sum(axis=1, keepdims=True) -
+                attacks)
+
+        if policy == "open_move":
+            scores = own_moves.astype(float)
+        else:
+            scores = own_moves - opp_moves
+        scores[opp_moves == 0] = float("inf")
+        return scores
+
+    def select(self, scores, candidates):
+        """Return the index of the candidate cell with the highest score in
+        every row, breaking ties in favour of the largest (row, column) pair
+        like `max()` over (score, move) tuples in `GreedyPlayer`.
+        """
+        scores = np.where(candidates, scores, float("-inf"))
+        ties = candidates & (scores == scores.max(axis=1, keepdims=True))
+        size = self.width * self.height
+        cells = np.arange(size)
+        rank = (cells % self.height) * self.width + cells // self.height
+        return np.where(ties, rank, -1).argmax(axis=1)
+
+    def play(self, policy_1, policy_2, rng):
+        """Play every game to the end, with the policy `policy_1` for player
+        1 and `policy_2` for player 2.
+        """
+        policies = (policy_1, policy_2)
+        while (self.winners < 0).any():
+            self.step(policies[self.ply & 1], rng)
+
+    def save(self, path, **arrays):
+        """Write the dimensions, moves and winners of the games, and any
+        extra named `arrays`, to a compressed NumPy archive.
+        """
+        np.savez_compressed(path, width=self.width, height=self.height,
+                            moves=self.moves, winners=self.winners, **arrays)
+
+
+def simulate(policy_1, policy_2, num_games, width=7, height=7,
+             opening_plies=OPENING_PLIES, seed=None):
+    """Return the finished `GameBatch` of `num_games` games between two
+    policies, each starting with `opening_plies` random moves.
+    """
+    rng = np.random.default_rng(seed)
+    batch = GameBatch(num_games, width, height)
+    for _ in range(opening_plies):
+        batch.step("random", rng)
+    batch.play(policy_1, policy_2, rng)
+    return batch
+
+
+def fair_games(policy, opponent, num_pairs, width=7, height=7,
+               opening_plies=OPENING_PLIES, seed=None):
+    """Play `num_pairs` pairs of games between `policy` and `opponent`; the
+    games of a pair start from the same random opening, with `policy`
+    moving first in one and second in the other (as in tournament.py).
+
+    Returns
+    -------
+    (float, `GameBatch`, `GameBatch`)
+        The fraction of the games won by `policy`, the games where it moved
+        first and those where it moved second.
+    """
+    rng = np.random.default_rng(seed)
+    first = GameBatch(num_pairs, width, height)
+    for _ in range(opening_plies):
+        first.step("random", rng)
+    second = first.copy()
+    first.play(policy, opponent, rng)
+    second.play(opponent, policy, rng)
+    win_rate = (first.wins[0] + second.wins[1]) / (2. * num_pairs)
+    return win_rate, first, second
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play the cheap agents against each other in batches.")
+    parser.add_argument("--pairs", type=int, default=1000,
+                        help="number of fair game pairs per pair of policies")
+    parser.add_argument("--size", type=int, default=7,
+                        help="width and height of the board")
+    parser.add_argument("--policies", nargs="+", choices=POLICIES,
+                        default=POLICIES, help="policies to compare")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the random moves")
+    parser.add_argument("-o", "--output",
+                        help="save every game to this .npz file")
+    args = parser.parse_args()
+
+    print("Win rate of the row policy against the column policy "
+          "({} game pairs each)".format(args.pairs))
+    print(" " * 10 + "".join("{:>11}".format(name) for name in args.policies))
+    rng = np.random.default_rng(args.seed)
+    games = []
+    start = timeit.default_timer()
+    for policy in args.policies:
+        row = []
+        for opponent in args.policies:
+            win_rate, first, second = fair_games(
+                policy, opponent, args.pairs, args.size, args.size,
+                seed=rng.integers(2**32))
+            row.append(win_rate)
+            games.append((policy, opponent, first))
+            games.append((opponent, policy, second))
+        print("{:>10}".format(policy) +
+              "".join("{:>11.1%}".format(rate) for rate in row))
+    elapsed = timeit.default_timer() - start
+    num_games = 2 * args.pairs * len(args.policies) ** 2
+    print("{} games in {:.1f}s ({:.0f} games/s)".format(
+        num_games, elapsed, num_games / elapsed))
+
+    if args.output:
+        GameBatch.concatenate([batch for _, _, batch in games]).save(
+            args.output, policies=np.array(POLICIES),
+            players=np.concatenate([
+                np.tile([POLICIES.index(policy_1), POLICIES.index(policy_2)],
+                        (len(batch), 1))
+                for policy_1, policy_2, batch in games]))
+        print("Wrote the games to {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Time management of the iterative deepening search in game_agent.py.
+
+A `TimeManager` decides two things for every move of an `AlphaBetaPlayer`:
+
+1. Whether to start the next iteration. The duration of every completed
+   iteration is recorded, and the duration of the next one is predicted by
+   multiplying the last duration by the effective branching factor (the
+   ratio of the node counts of the last two iterations). An iteration that
+   cannot finish before the deadline is not started, since its result would
+   be thrown away. Skipping an iteration that would have finished costs a
+   ply of search, while starting one that is aborted only costs time the
+   move had anyway, so the prediction is discounted by PREDICTION_DISCOUNT.
+
+2. The safety margin (`TIMER_THRESHOLD`) at which a running iteration is
+   aborted. Instead of a fixed 100 ms, the margin is calibrated from the
+   measured scheduling jitter of the process and from how far below the
+   margin the time left has dropped by the end of earlier moves.
+"""
+import math
+import time
+import timeit
+
+# Smallest safety margin (milliseconds) ever used
+MIN_MARGIN = 20.
+
+# The calibrated margin is the measured jitter plus this multiple of the
+# largest margin consumption observed in the last HISTORY moves
+LATENCY_FACTOR = 2.
+HISTORY = 32
+
+# Bounds of the effective branching factor used for predictions
+MIN_EBF = 1.
+MAX_EBF = 16.
+
+# An iteration is only skipped if the time left is less than this fraction of
+# its predicted duration; about one iteration in ten finishes in half of its
+# predicted time
+PREDICTION_DISCOUNT = 0.5
+
+# Number of 1 ms sleeps timed to measure the scheduling jitter
+JITTER_SAMPLES = 20
+
+# Jitter of this process, measured on first use
+_jitter = None
+
+
+def measure_jitter(samples=JITTER_SAMPLES):
+    """Return the largest delay (in milliseconds) by which a 1 ms sleep
+    overshot in `samples` tries, an estimate of how late the process may be
+    scheduled when its timer fires. The result is cached per process.
+    """
+    global _jitter
+    if _jitter is None:
+        overshoot = 0.
+        for _ in range(samples):
+            start = timeit.default_timer()
+            time.sleep(0.001)
+            elapsed = 1000 * (timeit.default_timer() - start)
+            overshoot = max(overshoot, elapsed - 1.)
+        _jitter = overshoot
+    return _jitter
+
+
+class TimeManager:
+    """Per-move iteration timing and safety margin of an iterative deepening
+    search.
+
+    Parameters
+    ----------
+    margin : float (optional)
+        A fixed safety margin in milliseconds; None (the default) calibrates
+        the margin from the measured jitter and latency.
+
+    predict : bool (optional)
+        If True, `should_start()` refuses to start iterations that are
+        predicted to overrun the deadline; if False, iterative deepening
+        always continues until the timer fires.
+
+    Attributes
+    ----------
+    durations : list<float>
+        The milliseconds spent on each completed iteration of the current
+        move
+
+    nodes : list<int>
+        The number of nodes visited by each completed iteration
+
+    latencies : list<float>
+        The milliseconds of the margin consumed by the end of each of the
+        last `HISTORY` moves with a finite time budget (negative if the move
+        ended before the margin was reached)
+    """
+
+    def __init__(self, margin=None, predict=True):
+        self.fixed_margin = margin
+        self.predict = predict
+        self.durations = []
+        self.nodes = []
+        self.latencies = []
+        self.skipped = 0
+        self._time_left = None
+        self._budget = 0.
+        self._iteration_start = 0.
+        self.calibrate()
+
+    def __getstate__(self):
+        """Drop the timer of the current move when pickling (see
+        `IsolationPlayer.__getstate__`).
+        """
+        state = self.__dict__.copy()
+        state["_time_left"] = None
+        return state
+
+    def __setstate__(self, state):
+        """Calibrate the copy in the process that unpickles it, e.g. a worker
+        process, before its first move.
+        """
+        self.__dict__.update(state)
+        self.calibrate()
+
+    def calibrate(self):
+        """Measure the jitter of this process now unless the margin is fixed,
+        so that the measurement (about 20 ms, once per process) is not made
+        during the first timed move.
+        """
+        if self.fixed_margin is None:
+            measure_jitter()
+
+    @property
+    def margin(self):
+        """The safety margin in milliseconds. """
+        if self.fixed_margin is not None:
+            return self.fixed_margin
+        latency = max(self.latencies) if self.latencies else 0.
+        return max(MIN_MARGIN, measure_jitter() + LATENCY_FACTOR * latency)
+
+    def start(self, time_left):
+        """Start timing a new move whose timer is the callable `time_left`
+        (milliseconds left).
+        """
+        self._time_left = time_left
+        self._budget = self._iteration_start = time_left()
+        self.durations = []
+        self.nodes = []
+
+    def end_iteration(self, nodes):
+        """Record the completion of an iteration that visited `nodes`
+        nodes.
+        """
+        now = self._time_left()
+        self.durations.append(self._iteration_start - now)
+        self.nodes.append(nodes)
+        self._iteration_start = now
+
+    @property
+    def branching_factor(self):
+        """The effective branching factor of the last two iterations, or
+        None before the second iteration.
+        """
+        if len(self.nodes) < 2 or not self.nodes[-2]:
+            return None
+        return min(MAX_EBF, max(MIN_EBF, self.nodes[-1] / self.nodes[-2]))
+
+    def predicted_duration(self):
+        """Return the predicted milliseconds of the next iteration, or None
+        if there is not enough history to predict it (or the timer is
+        infinite, as when pondering, so durations cannot be measured).
+        """
+        ebf = self.branching_factor
+        if ebf is None or not math.isfinite(self.durations[-1]):
+            return None
+        return self.durations[-1] * ebf
+
+    def should_start(self):
+        """Test whether the next iteration may finish before the safety margin
+        is reached, i.e., whether the time left is at least the discounted
+        prediction of its duration.
+        """
+        if not self.predict:
+            return True
+        predicted = self.predicted_duration()
+        if (predicted is None or self._time_left() - self.margin >
+                PREDICTION_DISCOUNT * predicted):
+            return True
+        self.skipped += 1
+        return False
+
+    def finish(self):
+        """Complete the timing of the move, recording how much of the margin
+        was consumed.
+        """
+        if self._budget < float("inf"):
+            self.latencies.append(self.margin - self._time_left())
+            del self.latencies[:-HISTORY]
@@ -10,18 +10,33 @@ The matches are fair because the board is initialized randomly for both
 players, and the players play each match twice -- once as the first player and
 once as the second player.  Randomizing the openings and switching the player
 order corrects for imbalances due to both starting position and initiative.
+
+With --sprt the script instead compares two of the test agents head to head,
+playing fair game pairs between them until a sequential probability ratio
+test decides whether the first agent wins at least a given fraction of the
+games, which usually takes far fewer games than a full tournament.
+
+With --server the games are played by the match server of match_server.py,
+with every agent running in persistent worker processes and the time limit
+enforced on the wall clock; --workers then sets the number of games played
+at the same time.
 """
+import argparse
 import itertools
+import math
 import random
 import warnings
 
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 from isolation import Board
+from match_server import MatchRunner
 from sample_players import (RandomPlayer, open_move_score,
                             improved_score, center_score)
 from game_agent import (MinimaxPlayer, AlphaBetaPlayer, custom_score,
                         custom_score_2, custom_score_3)
+from search_stats import StatsSummary
 
 NUM_MATCHES = 5  # number of matches against each opponent
 TIME_LIMIT = 150  # number of milliseconds before timeout
@@ -36,39 +51,97 @@ game_agent.py.
 
 Agent = namedtuple("Agent", ["player", "name"])
 
+# A single game to play: the two players (in order of initiative), the
+# opening moves applied before the players take over, and the seed for the
+# random number generator used while playing the game
+GameTask = namedtuple("GameTask", ["player_1", "player_2", "opening", "seed"])
 
-def play_round(cpu_agent, test_agents, win_counts, num_matches):
-    """Compare the test agents to the cpu agent in "fair" matches.
 
-    "Fair" matches use random starting locations and force the agents to
-    play as both first and second player to control for advantages resulting
-    from choosing better opening moves or having first initiative to move.
+def schedule_round(cpu_agent, test_agents, num_matches, rng=random):
+    """Return the list of `GameTask`s for the "fair" matches between the test
+    agents and the cpu agent, drawing the openings and seeds from `rng`.
     """
-    timeout_count = 0
-    forfeit_count = 0
+    tasks = []
     for _ in range(num_matches):
 
-        games = sum([[Board(cpu_agent.player, agent.player),
-                      Board(agent.player, cpu_agent.player)]
-                    for agent in test_agents], [])
-
         # initialize all games with a random move and response
+        game = Board(cpu_agent.player, test_agents[0].player)
+        opening = []
         for _ in range(2):
-            move = random.choice(games[0].get_legal_moves())
-            for game in games:
-                game.apply_move(move)
+            opening.append(rng.choice(game.get_legal_moves()))
+            game.apply_move(opening[-1])
+
+        for agent in test_agents:
+            tasks.append(GameTask(cpu_agent.player, agent.player, opening,
+                                  rng.getrandbits(32)))
+            tasks.append(GameTask(agent.player, cpu_agent.player, opening,
+                                  rng.getrandbits(32)))
+    return tasks
+
+
+def play_game(task):
+    """Play the game described by a `GameTask` and return the index of the
+    winner (0 for `task.player_1`, 1 for `task.player_2`), the termination
+    reason, and the `StatsSummary` of the search statistics of each player in
+    the game (None for players that do not record them). This runs in a
+    worker process when the tournament is played in parallel, so the players
+    are copies of the originals.
+
+    The players and the board draw from the global random number generator,
+    which is seeded with `task.seed` for the game and restored afterwards,
+    so that the random state of the caller is left untouched.
+    """
+    state = random.getstate()
+    random.seed(task.seed)
+    players = (task.player_1, task.player_2)
+    for player in players:
+        if hasattr(player, "stats_summary"):
+            player.stats_summary = StatsSummary()
+    game = Board(task.player_1, task.player_2)
+    for move in task.opening:
+        game.apply_move(move)
+    try:
+        winner, _, termination = game.play(time_limit=TIME_LIMIT)
+    finally:
+        random.setstate(state)
+    summaries = tuple(getattr(player, "stats_summary", None)
+                      for player in players)
+    return int(winner is task.player_2), termination, summaries
+
+
+def tally_round(tasks, results, win_counts, search_stats=None):
+    """Add the results of the games in a round to `win_counts` and return the
+    number of games lost by timeout and by forfeit. The search statistics of
+    the players that are keys of `search_stats` (a dict of `StatsSummary`)
+    are merged into their summaries.
+    """
+    timeout_count = 0
+    forfeit_count = 0
+    for task, (winner_idx, termination, summaries) in zip(tasks, results):
+        players = (task.player_1, task.player_2)
+        win_counts[players[winner_idx]] += 1
+        if search_stats is not None:
+            for player, summary in zip(players, summaries):
+                if player in search_stats and summary is not None:
+                    search_stats[player].merge(summary)
+
+        if termination == "timeout":
+            timeout_count += 1
+        elif termination == "forfeit":
+            forfeit_count += 1
 
-        # play all games and tally the results
-        for game in games:
-            winner, _, termination = game.play(time_limit=TIME_LIMIT)
-            win_counts[winner] += 1
+    return timeout_count, forfeit_count
 
-            if termination == "timeout":
-                timeout_count += 1
-            elif termination == "forfeit":
-                forfeit_count += 1
 
-    return timeout_count, forfeit_count
+def play_round(cpu_agent, test_agents, win_counts, num_matches, rng=random):
+    """Compare the test agents to the cpu agent in "fair" matches.
+
+    "Fair" matches use random starting locations and force the agents to
+    play as both first and second player to control for advantages resulting
+    from choosing better opening moves or having first initiative to move.
+    """
+    tasks = schedule_round(cpu_agent, test_agents, num_matches, rng)
+    return tally_round(tasks, map(play_game, tasks), win_counts)
 
 
 def update(total_wins, wins):
@@ -77,9 +150,182 @@ def update(total_wins, wins):
     return total_wins
 
 
-def play_matches(cpu_agents, test_agents, num_matches):
-    """Play matches between the test agent and each cpu_agent individually. """
+class SPRT:
+    """Sequential probability ratio test of the probability p that one agent
+    wins a game against another, H0: p = p0 against H1: p = p1 (p1 > p0).
+
+    Every game adds log(p1 / p0) to the log-likelihood ratio if the agent won
+    and log((1 - p1) / (1 - p0)) if it lost. The test accepts H1 once the
+    ratio reaches log((1 - beta) / alpha) and H0 once it falls to
+    log(beta / (1 - alpha)), so that it wrongly accepts H1 with probability
+    at most `alpha` and wrongly accepts H0 with probability at most `beta`.
+
+    Parameters
+    ----------
+    p0, p1 : float
+        The win probabilities of the null and alternative hypotheses.
+
+    alpha, beta : float
+        The error rates of the test.
+    """
+
+    def __init__(self, p0=0.5, p1=0.6, alpha=0.05, beta=0.05):
+        if not 0 < p0 < p1 < 1:
+            raise ValueError("The win probabilities must satisfy "
+                             "0 < p0 < p1 < 1")
+        if not (0 < alpha < 1 and 0 < beta < 1):
+            raise ValueError("The error rates must be between 0 and 1")
+        self.win_llr = math.log(p1 / p0)
+        self.loss_llr = math.log((1 - p1) / (1 - p0))
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.wins = 0
+        self.losses = 0
+
+    @property
+    def games(self):
+        return self.wins + self.losses
+
+    @property
+    def llr(self):
+        """The log-likelihood ratio of H1 to H0 after the games so far. """
+        return self.wins * self.win_llr + self.losses * self.loss_llr
+
+    @property
+    def decision(self):
+        """"H1" or "H0" once the test has accepted a hypothesis, else None. """
+        llr = self.llr
+        if llr >= self.upper:
+            return "H1"
+        if llr <= self.lower:
+            return "H0"
+        return None
+
+    def add(self, won):
+        """Record the result of one game of the agent. """
+        if won:
+            self.wins += 1
+        else:
+            self.losses += 1
+
+
+def play_sprt(agent, opponent, sprt, max_games=2000, num_workers=1,
+              seed=None, server=False):
+    """Play fair game pairs between `agent` and `opponent` (each agent moves
+    first in one game of every pair) until `sprt` accepts a hypothesis about
+    the win probability of `agent` or `max_games` games have been played,
+    printing the progress after every pair. Returns the decision of the test
+    (None if it is still undecided).
+
+    With `server`, the games are played by a `MatchServer` with
+    `num_workers` concurrent games (see `play_matches`).
+    """
+    rng = random.Random(seed)
+    runner = MatchRunner(TIME_LIMIT, num_workers) if server else None
+    executor = (ProcessPoolExecutor(num_workers)
+                if num_workers > 1 and runner is None else None)
+    timeout_count = 0
+    forfeit_count = 0
+
+    print("\nSPRT {} vs {}: accept H1 at LLR >= {:.2f}, H0 at LLR <= {:.2f}".format(
+        agent.name, opponent.name, sprt.upper, sprt.lower))
+    print("{:>7}{:>7}{:>7}{:>10}{:>9}".format(
+        "Games", "Won", "Lost", "Win Rate", "LLR"))
+
+    try:
+        while sprt.decision is None and sprt.games < max_games:
+            # Schedule one pair per worker so that every worker stays busy
+            tasks = schedule_round(opponent, [agent],
+                                   max(1, num_workers), rng)
+            if runner is not None:
+                results = runner.play_tasks(tasks)
+            elif executor is None:
+                results = map(play_game, tasks)
+            else:
+                futures = [executor.submit(play_game, task) for task in tasks]
+                results = (future.result() for future in futures)
+            for idx, (task, result) in enumerate(zip(tasks, results)):
+                winner_idx, termination, _ = result
+                winner = (task.player_1, task.player_2)[winner_idx]
+                sprt.add(winner is agent.player)
+                if termination == "timeout":
+                    timeout_count += 1
+                elif termination == "forfeit":
+                    forfeit_count += 1
+                if idx % 2:
+                    print("{:>7}{:>7}{:>7}{:>10.1%}{:>9.2f}".format(
+                        sprt.games, sprt.wins, sprt.losses,
+                        sprt.wins / sprt.games, sprt.llr), flush=True)
+                    if sprt.decision is not None or sprt.games >= max_games:
+                        break
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if runner is not None:
+            runner.close()
+
+    if sprt.decision == "H1":
+        print("\nH1 accepted: {} is stronger than {}.".format(
+            agent.name, opponent.name))
+    elif sprt.decision == "H0":
+        print("\nH0 accepted: {} is not stronger than {}.".format(
+            agent.name, opponent.name))
+    else:
+        print("\nNo decision after {} games.".format(sprt.games))
+    if timeout_count:
+        print("There were {} timeouts.".format(timeout_count))
+    if forfeit_count:
+        print("There were {} forfeits.".format(forfeit_count))
+    return sprt.decision
+
+
+def play_matches(cpu_agents, test_agents, num_matches, num_workers=1,
+                 seed=None, server=False):
+    """Play matches between the test agent and each cpu_agent individually.
+
+    Parameters
+    ----------
+    num_workers : int (optional)
+        The number of worker processes used to play games concurrently; with
+        one worker (the default) every game is played in this process.
+
+    seed : int (optional)
+        Seed for the openings and for the random number generator of every
+        game, which makes the tournament reproducible for agents whose moves
+        do not depend on timing.
+
+    server : bool (optional)
+        If True, play every game through a `MatchServer` (see
+        match_server.py), with `num_workers` games played at the same time
+        and each agent kept warm in its own worker processes.
+    """
+    rng = random.Random(seed)
+    runner = MatchRunner(TIME_LIMIT, num_workers) if server else None
+    executor = (ProcessPoolExecutor(num_workers)
+                if num_workers > 1 and runner is None else None)
+
+    # Schedule every round up front so that the worker pool stays busy while
+    # the results of earlier rounds are printed
+    rounds = []
+    for agent in cpu_agents:
+        tasks = schedule_round(agent, test_agents, num_matches, rng)
+        if executor is None:
+            results = map(play_game, tasks)
+        else:
+            results = [executor.submit(play_game, task) for task in tasks]
+        rounds.append((tasks, results))
+    if runner is not None:
+        # The match server plays the whole tournament concurrently
+        try:
+            results = iter(runner.play_tasks(
+                [task for tasks, _ in rounds for task in tasks]))
+        finally:
+            runner.close()
+        rounds = [(tasks, [next(results) for _ in tasks])
+                  for tasks, _ in rounds]
+
     total_wins = {agent.player: 0 for agent in test_agents}
+    search_stats = {agent.player: StatsSummary() for agent in test_agents}
     total_timeouts = 0.
     total_forfeits = 0.
     total_matches = 2 * num_matches * len(cpu_agents)
@@ -93,7 +339,10 @@ def play_matches(cpu_agents, test_agents, num_matches):
 
         print("{!s:^9}{:^13}".format(idx + 1, agent.name), end="", flush=True)
 
-        counts = play_round(agent, test_agents, wins, num_matches)
+        tasks, results = rounds[idx]
+        if executor is not None:
+            results = [future.result() for future in results]
+        counts = tally_round(tasks, results, wins, search_stats)
         total_timeouts += counts[0]
         total_forfeits += counts[1]
         total_wins = update(total_wins, wins)
@@ -113,6 +362,12 @@ def play_matches(cpu_agents, test_agents, num_matches):
                 "{:.1f}%".format(100 * total_wins[x[1].player] / total_matches)
             ) for x in enumerate(test_agents)
     ]))
+    print('{:^9}{:^13}'.format("", "Avg Depth:") + ''.join([
+        '{:^13.1f}'.format(search_stats[agent.player].average_depth)
+        for agent in test_agents]))
+    print('{:^9}{:^13}'.format("", "Nodes/s:") + ''.join([
+        '{:^13.0f}'.format(search_stats[agent.player].nodes_per_second)
+        for agent in test_agents]))
 
     if total_timeouts:
         print(("\nThere were {} timeouts during the tournament -- make sure " +
@@ -123,8 +378,35 @@ def play_matches(cpu_agents, test_agents, num_matches):
         print(("\nYour agents forfeited {} games while there were still " +
                "legal moves available to play.\n").format(total_forfeits))
 
+    if executor is not None:
+        executor.shutdown()
+
 
 def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="number of processes used to play games (with "
+                             "--server, number of concurrent games)")
+    parser.add_argument("--server", action="store_true",
+                        help="play the games through the match server, with "
+                             "the agents in persistent worker processes")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for openings and per-game random state")
+    parser.add_argument("--sprt", nargs=2, metavar=("AGENT", "OPPONENT"),
+                        help="instead of the tournament, test whether AGENT "
+                             "beats OPPONENT (both test agents) with "
+                             "sequential early stopping")
+    parser.add_argument("--p0", type=float, default=0.5,
+                        help="win probability of AGENT under H0")
+    parser.add_argument("--p1", type=float, default=0.6,
+                        help="win probability of AGENT under H1")
+    parser.add_argument("--alpha", type=float, default=0.05,
+                        help="probability of wrongly accepting H1")
+    parser.add_argument("--beta", type=float, default=0.05,
+                        help="probability of wrongly accepting H0")
+    parser.add_argument("--max-games", type=int, default=2000,
+                        help="stop an undecided SPRT after this many games")
+    args = parser.parse_args()
 
     # Define two agents to compare -- these agents will play from the same
     # starting position against the same adversaries in the tournament
@@ -146,11 +428,28 @@ def main():
         Agent(AlphaBetaPlayer(score_fn=improved_score), "AB_Improved")
     ]
 
+    if args.sprt:
+        agents = {agent.name: agent for agent in test_agents}
+        for name in args.sprt:
+            if name not in agents:
+                parser.error("unknown test agent {!r} (choose from {})".format(
+                    name, ", ".join(agents)))
+        if args.sprt[0] == args.sprt[1]:
+            parser.error("an agent cannot be tested against itself")
+        try:
+            sprt = SPRT(args.p0, args.p1, args.alpha, args.beta)
+        except ValueError as error:
+            parser.error(str(error))
+        play_sprt(agents[args.sprt[0]], agents[args.sprt[1]], sprt,
+                  args.max_games, args.workers, args.seed, args.server)
+        return
+
     print(DESCRIPTION)
     print("{:^74}".format("*************************"))
     print("{:^74}".format("Playing Matches"))
     print("{:^74}".format("*************************"))
-    play_matches(cpu_agents, test_agents, NUM_MATCHES)
+    play_matches(cpu_agents, test_agents, NUM_MATCHES, args.workers,
+                 args.seed, args.server)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+"""Bounded transposition table for the iterative deepening alpha-beta agents
+in game_agent.py.
+
+Each entry records the value of a searched position together with the depth
+it was searched to, whether the value is exact or only a lower/upper bound
+(because the search was cut off by the alpha-beta window), and the best move
+found.  Entries are stored in a fixed number of slots indexed by the position
+hash, so the memory used by the table never grows during a game.
+"""
+from collections import namedtuple
+
+# Bound types stored with each value
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+TTEntry = namedtuple("TTEntry", ["key", "depth", "value", "flag", "move",
+                                 "generation"])
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results keyed by position hash.
+
+    Parameters
+    ----------
+    size : int (optional)
+        The number of buckets in the table.
+
+    replacement : str (optional)
+        The replacement scheme used when a bucket is already occupied:
+
+        "depth"
+            Each bucket holds one entry, which is only replaced by results
+            from a search at least as deep, or by any result once the entry
+            is left over from the search for an earlier move.
+
+        "two-tier"
+            Each bucket holds a depth-preferred entry (as above) and an
+            always-replace entry, so shallow results near the leaves are kept
+            without evicting expensive deep results.
+    """
+    REPLACEMENT_SCHEMES = ("depth", "two-tier")
+
+    def __init__(self, size=2**16, replacement="depth"):
+        if replacement not in self.REPLACEMENT_SCHEMES:
+            raise ValueError("Unknown replacement scheme: {}".format(replacement))
+        self.size = size
+        self.replacement = replacement
+        self._depth_slots = [None] * size
+        self._recent_slots = [None] * size if replacement == "two-tier" else None
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    @property
+    def hit_rate(self):
+        """The fraction of probes that found an entry for the position. """
+        return self.hits / self.probes if self.probes else 0.
+
+    def new_search(self):
+        """Mark all current entries as belonging to a previous search, so they
+        can be replaced regardless of depth.
+        """
+        self.generation += 1
+
+    def clear(self):
+        """Remove all entries and reset the hit statistics. """
+        self.__init__(self.size, self.replacement)
+
+    def probe(self, key):
+        """Return the `TTEntry` stored for the position hash `key`, or None if
+        the position is not in the table.
+        """
+        self.probes += 1
+        idx = key % self.size
+        entry = self._depth_slots[idx]
+        if (entry is None or entry.key != key) and self._recent_slots is not None:
+            entry = self._recent_slots[idx]
+        if entry is None or entry.key != key:
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, value, flag, move):
+        """Record the result of searching the position hash `key` to `depth`
+        plies, subject to the replacement scheme.
+        """
+        self.stores += 1
+        idx = key % self.size
+        entry = TTEntry(key, depth, value, flag, move, self.generation)
+        current = self._depth_slots[idx]
+        if (current is None or depth >= current.depth or
+                current.generation != self.generation):
+            self._depth_slots[idx] = entry
+        elif self._recent_slots is not None:
+            self._recent_slots[idx] = entry
+
+    def stats(self):
+        """Return a dict summarizing the table usage. """
+        return {"probes": self.probes, "hits": self.hits,
+                "hit_rate": self.hit_rate, "stores": self.stores}